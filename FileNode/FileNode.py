@@ -1,77 +1,347 @@
+# The window. Everything it runs lives in the headless modules beside it.
+
+import time
 import os
+import sys
 import threading
-import time
-import tempfile
-from tkinter import filedialog
+import json
+from collections import OrderedDict
+from tkinter import filedialog, Canvas
 from customtkinter import (
-    CTk, CTkFrame, CTkLabel, CTkButton, CTkProgressBar, CTkScrollableFrame, CTkEntry, CTkImage
+    CTk, CTkFrame, CTkLabel, CTkButton, CTkProgressBar, CTkScrollableFrame, CTkEntry, CTkImage, CTkScrollbar,
+    CTkOptionMenu, CTkCheckBox
 )
-from PIL import Image
-from PyPDF2 import PdfMerger, PdfReader, PdfWriter
-from docx2pdf import convert as docx2pdf_convert
-from fpdf import FPDF
-from docx import Document
-
-# --- Logic Classes ---
-
-class PDFTools:
-    def merge_pdfs(self, file_list, output_path="merged_output.pdf"):
-        merger = PdfMerger()
-        for pdf in file_list:
-            merger.append(pdf)
-        merger.write(output_path)
-        merger.close()
-        return output_path
-
-    def split_pdf(self, input_path, start_page, end_page, output_path="split_output.pdf"):
-        reader = PdfReader(input_path)
-        writer = PdfWriter()
-        for i in range(start_page - 1, end_page):
-            writer.add_page(reader.pages[i])
-        with open(output_path, "wb") as f:
-            writer.write(f)
-        return output_path
-
-    def convert_pdf_to_word(self, input_path, output_path="converted_output.docx"):
-        # Simple text extraction (not formatting)
-        reader = PdfReader(input_path)
-        doc = Document()
-        for page in reader.pages:
-            text = page.extract_text()
-            if text:
-                doc.add_paragraph(text)
-        doc.save(output_path)
-        return output_path
-
-class WordTools:
-    def convert_docx_to_pdf(self, input_path, output_path="converted_output.pdf"):
-        docx2pdf_convert(input_path, output_path)
-        return output_path
-
-class ImageTools:
-    def reduce_image_size(self, input_path, output_path, quality=70):
-        img = Image.open(input_path)
-        img.save(output_path, quality=int(quality), optimize=True)
-        return output_path
-
-    def convert_image_format(self, input_path, output_path):
-        img = Image.open(input_path)
-        img.save(output_path)
-        return output_path
-
-class TextTools:
-    def convert_text_to_pdf(self, input_path, output_path="converted_text.pdf"):
-        with open(input_path, "r", encoding="utf-8") as f:
-            lines = f.readlines()
-        pdf = FPDF()
-        pdf.add_page()
-        pdf.set_font("Arial", size=12)
-        for line in lines:
-            pdf.cell(200, 10, txt=line.strip(), ln=1)
-        pdf.output(output_path)
-        return output_path
-
-# --- GUI ---
+from PIL import ImageTk
+
+from FileNode.deps import DEPENDENCIES, require
+from FileNode.files import write_atomic
+from FileNode.tracing import start_trace, stop_trace, tracer
+from FileNode.jobs import JobScheduler, PRIORITY_BULK, PRIORITY_INTERACTIVE
+from FileNode.workspace import WorkspaceManager, save_output
+from FileNode.documents import open_pdf
+from FileNode.office import docx_backend, docx_converter_pool
+from FileNode.images import available_image_formats, load_image
+from FileNode.tools import ImageTools, PDFTools, TextTools, WordTools
+from FileNode.cache import ThumbnailStore, default_result_cache, file_digest
+from FileNode.pipeline import PIPELINE_STEPS, Pipeline, PipelineTools, pipeline_kind
+
+class UiDispatcher:
+    # Worker threads never touch widgets themselves: they post() a call, and the
+    # Tk thread runs everything posted since its last pass, one pass every
+    # `interval` ms. A call posted under a key that is still waiting replaces the
+    # earlier one, so a job reporting progress thousands of times a second costs
+    # one redraw per pass however many jobs are running.
+    def __init__(self, root, interval=33):
+        self.root = root
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.pending = OrderedDict()
+        root.after(interval, self.drain)
+
+    def post(self, key, func, *args):
+        # Safe from any thread; key=None never replaces anything
+        with self.lock:
+            self.pending[object() if key is None else key] = (func, args)
+
+    def drain(self):
+        with self.lock:
+            calls, self.pending = self.pending, OrderedDict()
+        for func, args in calls.values():
+            try:
+                func(*args)
+            except Exception:
+                # One failing update (a widget destroyed meanwhile) must not drop the rest
+                self.root.report_callback_exception(*sys.exc_info())
+        self.root.after(self.interval, self.drain)
+
+class ThumbnailCache:
+    # In-memory LRU of rendered thumbnails, bounded by decoded bitmap size
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            img = self.items.get(key)
+            if img is not None:
+                self.items.move_to_end(key)
+            return img
+
+    def put(self, key, img):
+        nbytes = img.width * img.height * len(img.getbands())
+        with self.lock:
+            old = self.items.pop(key, None)
+            if old is not None:
+                self.size -= old.width * old.height * len(old.getbands())
+            self.items[key] = img
+            self.size += nbytes
+            while self.size > self.max_bytes and len(self.items) > 1:
+                _, evicted = self.items.popitem(last=False)
+                self.size -= evicted.width * evicted.height * len(evicted.getbands())
+
+def consecutive_runs(pages):
+    # [1, 2, 3, 7, 8] -> [[1, 2, 3], [7, 8]], for one poppler call per run
+    runs = []
+    for page in pages:
+        if runs and page == runs[-1][-1] + 1:
+            runs[-1].append(page)
+        else:
+            runs.append([page])
+    return runs
+
+class PdfThumbnailView(CTkFrame):
+    # Virtualized page list: only rows near the viewport exist on the canvas and
+    # pages are rendered on a background thread, visible rows first. Finished
+    # pages reach the canvas through the window's UiDispatcher.
+    def __init__(self, master, pdf_path, cache, font, ui, store=None, prefetch=4, max_width=350, batch_size=8):
+        super().__init__(master, fg_color="#181A20")
+        self.pdf_path = pdf_path
+        self.cache = cache
+        self.ui = ui
+        self.store = store
+        self.digest = None
+        self.font = font
+        self.prefetch = prefetch
+        self.max_width = max_width
+        self.batch_size = batch_size
+        self.version = os.path.getmtime(pdf_path)
+        # No rows until render_worker has opened the document and sent its page
+        # count, so a large file never stalls the window while it is parsed
+        self.page_count = 0
+        self.aspect = 1.414
+        self.thumb_width = 0
+        self.row_height = 1
+        self.drawn = {}
+        self.wanted = []
+        self.closed = False
+        self.error_shown = False
+        self.condition = threading.Condition()
+
+        self.canvas = Canvas(self, bg="#181A20", highlightthickness=0)
+        self.scrollbar = CTkScrollbar(self, command=self.canvas.yview)
+        self.scrollbar.pack(side="right", fill="y")
+        self.canvas.pack(side="left", fill="both", expand=True)
+        self.canvas.configure(yscrollcommand=self.on_scroll)
+        self.canvas.bind("<Configure>", self.on_resize)
+        self.canvas.bind("<Enter>", lambda e: self.canvas.bind_all("<MouseWheel>", self.on_wheel))
+        self.canvas.bind("<Leave>", lambda e: self.canvas.unbind_all("<MouseWheel>"))
+        self.canvas.bind("<Button-4>", lambda e: self.canvas.yview_scroll(-1, "units"))
+        self.canvas.bind("<Button-5>", lambda e: self.canvas.yview_scroll(1, "units"))
+
+        threading.Thread(target=self.render_worker, daemon=True).start()
+
+    def cache_key(self, page, width):
+        return (self.pdf_path, self.version, page, width)
+
+    def on_wheel(self, event):
+        self.canvas.yview_scroll(int(-event.delta / 120), "units")
+
+    def on_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        self.refresh()
+
+    def on_resize(self, event):
+        thumb_width = max(60, min(event.width - 20, self.max_width))
+        if thumb_width != self.thumb_width:
+            # New resolution: drop what is on screen and render again at the new width
+            self.thumb_width = thumb_width
+            self.layout(event.width)
+        self.refresh()
+
+    def layout(self, canvas_width):
+        self.row_height = int(self.thumb_width * self.aspect) + 40
+        self.canvas.delete("all")
+        self.drawn = {}
+        self.canvas.configure(
+            scrollregion=(0, 0, canvas_width, self.row_height * self.page_count),
+            yscrollincrement=self.row_height // 4,
+        )
+
+    def set_pages(self, page_count, aspect):
+        if self.closed:
+            return
+        self.page_count = page_count
+        self.aspect = aspect
+        if self.thumb_width:
+            self.layout(self.canvas.winfo_width())
+        self.refresh()
+
+    def refresh(self):
+        if not self.thumb_width:
+            return
+        top = self.canvas.canvasy(0)
+        bottom = top + self.canvas.winfo_height()
+        first = max(0, int(top // self.row_height))
+        last = min(self.page_count - 1, int(bottom // self.row_height))
+        window_first = max(0, first - self.prefetch)
+        window_last = min(self.page_count - 1, last + self.prefetch)
+        for page in list(self.drawn):
+            if page < window_first or page > window_last:
+                for item in self.drawn.pop(page)["items"]:
+                    self.canvas.delete(item)
+        wanted = []
+        for page in list(range(first, last + 1)) + list(range(window_first, first)) + list(range(last + 1, window_last + 1)):
+            if page not in self.drawn:
+                self.draw_row(page)
+            if self.drawn[page]["photo"] is None:
+                img = self.cache.get(self.cache_key(page, self.thumb_width))
+                if img is not None:
+                    self.draw_image(page, img)
+                else:
+                    wanted.append(page)
+        with self.condition:
+            self.wanted = wanted
+            self.condition.notify()
+
+    def draw_row(self, page):
+        y = page * self.row_height
+        x = self.canvas.winfo_width() // 2
+        label = self.canvas.create_text(x, y + self.row_height - 20, text=f"Page {page + 1}", fill="#F7F8FA", font=self.font)
+        self.drawn[page] = {"items": [label], "photo": None}
+
+    def draw_image(self, page, img):
+        photo = ImageTk.PhotoImage(img)
+        x = self.canvas.winfo_width() // 2
+        y = page * self.row_height + 10
+        item = self.canvas.create_image(x, y, image=photo, anchor="n")
+        self.drawn[page]["items"].append(item)
+        self.drawn[page]["photo"] = photo
+
+    def render_worker(self):
+        # Page count and size come from the document the tools will share
+        try:
+            with open_pdf(self.pdf_path) as doc:
+                page_count = doc.page_count
+                aspect = 1.414
+                if page_count:
+                    width, height = doc.page_size(0)
+                    if width > 0 and height > 0:
+                        aspect = height / width
+        except Exception as e:
+            self.ui.post((self, "error"), self.show_error, e)
+            return
+        self.ui.post((self, "pages"), self.set_pages, page_count, aspect)
+        from pdf2image import convert_from_path
+        while True:
+            with self.condition:
+                while not self.wanted and not self.closed:
+                    self.condition.wait()
+                if self.closed:
+                    return
+                # Render runs of consecutive pages in one poppler call
+                run = [self.wanted.pop(0)]
+                while self.wanted and len(run) < self.batch_size and self.wanted[0] == run[-1] + 1:
+                    run.append(self.wanted.pop(0))
+                width = self.thumb_width
+                box_height = int(width * self.aspect)
+            try:
+                runs = [run]
+                if self.store is not None:
+                    if self.digest is None:
+                        self.digest = file_digest(self.pdf_path)
+                    # Serve what the disk store already has and only render the rest
+                    missing = []
+                    for page in run:
+                        img = self.store.get(self.digest, page, (width, None))
+                        if img is None:
+                            missing.append(page)
+                        else:
+                            self.cache.put(self.cache_key(page, width), img)
+                            self.ui.post((self, page, width), self.show_page, page, width)
+                    runs = consecutive_runs(missing)
+                rendered = []
+                for run in runs:
+                    images = convert_from_path(self.pdf_path, first_page=run[0] + 1, last_page=run[-1] + 1, size=(width, None))
+                    rendered.extend(zip(run, images))
+            except Exception as e:
+                self.ui.post((self, "error"), self.show_error, e)
+                continue
+            for page, img in rendered:
+                if img.height > box_height:
+                    img.thumbnail((width, box_height))
+                self.cache.put(self.cache_key(page, width), img)
+                if self.store is not None:
+                    self.store.put(self.digest, page, (width, None), img)
+                self.ui.post((self, page, width), self.show_page, page, width)
+
+    def show_page(self, page, width):
+        if self.closed:
+            return
+        if width == self.thumb_width and page in self.drawn and self.drawn[page]["photo"] is None:
+            img = self.cache.get(self.cache_key(page, width))
+            if img is not None:
+                self.draw_image(page, img)
+
+    def show_error(self, error):
+        if self.closed or self.error_shown:
+            return
+        self.error_shown = True
+        self.canvas.create_text(
+            self.canvas.winfo_width() // 2, self.canvas.canvasy(0) + 20,
+            text=f"Preview error: {error}", fill="#F7F8FA", font=self.font, width=self.thumb_width,
+        )
+
+    def destroy(self):
+        with self.condition:
+            self.closed = True
+            self.wanted = []
+            self.condition.notify()
+        self.canvas.unbind_all("<MouseWheel>")
+        super().destroy()
+
+class JobProgress:
+    # Receives a tool's ProgressEvents on its worker thread and posts them to the
+    # window's UiDispatcher under this job's key, so only the latest one is drawn.
+    # on_done runs on the Tk thread once the worker calls done().
+    def __init__(self, window, progress_bar, on_done):
+        self.window = window
+        self.progress_bar = progress_bar
+        self.on_done = on_done
+        self.error = None
+        self.cache_hit = False
+        self.finished = threading.Event()
+
+    def __call__(self, event):
+        if not self.finished.is_set():
+            self.window.ui.post(self, self.show, event)
+
+    def done(self, error=None):
+        self.error = error
+        self.finished.set()
+        # Takes the place of any progress still waiting to be drawn
+        self.window.ui.post(self, self.finish)
+
+    def show(self, event):
+        if self.progress_bar.winfo_exists():
+            self.progress_bar.set(event.fraction)
+            self.window.status_label.configure(text=event.describe())
+
+    def finish(self):
+        if not self.progress_bar.winfo_exists():
+            # The tool was closed or cancelled
+            return
+        if self.error is not None:
+            self.window.status_label.configure(text=f"❌ Error: {self.error}")
+            self.window.show_cache_stats()
+        else:
+            self.progress_bar.set(1.0)
+            self.on_done()
+            self.window.show_cache_stats(self.cache_hit)
+
+# tool -> (menu section, dependencies, upload button text, upload method, prompt)
+TOOLS = {
+    "Merge PDF": ("PDF Tools", ("pdf",), "Upload PDF Files", "upload_file_for_merge", "Please upload 2 or more PDF files to merge."),
+    "Split PDF": ("PDF Tools", ("pdf",), "Upload PDF File", "upload_file_for_split", "Please upload a PDF file to split."),
+    "PDF to Word": ("PDF Tools", ("pdf", "docx"), "Upload PDF File", "upload_file_for_pdf_to_word", "Please upload a PDF file to convert to Word."),
+    "Optimize PDF": ("PDF Tools", ("pdf",), "Upload PDF File", "upload_file_for_pdf_optimize", "Please upload a PDF file to optimize."),
+    "Docs to PDF": ("Word Tools", (), "Upload DOCX File", "upload_file_for_docs_to_pdf", "Please upload a DOCX file to convert to PDF."),
+    "Image Size Reducer": ("Image Tools", ("image",), "Upload Image File", "upload_file_for_image_size_reducer", "Please upload an image file to reduce size."),
+    "Image Format Converter": ("Image Tools", ("image",), "Upload Image File", "upload_file_for_image_format_converter", "Please upload an image file to convert format."),
+    "Text to PDF": ("Text Tools", ("pdf",), "Upload Text File", "upload_file_for_text_to_pdf", "Please upload a text file to convert to PDF."),
+    "Recipe Builder": ("Pipelines", ("pdf",), "Add Input Files", "upload_files_for_recipe", "Add input files, then chain steps into a recipe."),
+}
 
 class MainWindow(CTk):
     def __init__(self):
@@ -90,6 +360,18 @@ class MainWindow(CTk):
         self.progress_bar = None
         self.upload_button = None
         self.save_button = None
+        self.ui = UiDispatcher(self)
+        self.thumbnail_cache = ThumbnailCache()
+        self.thumbnail_store = ThumbnailStore()
+        self.result_cache = default_result_cache()
+        self.scheduler = JobScheduler(workers=2)
+        self.active_jobs = []
+        self.workspace_manager = WorkspaceManager()
+        self.workspaces = []
+        self.direct_outputs = set()
+        self.recipe = None
+        self.recipe_files = {}
+        self.recipe_job = None
 
         self.create_menu()
         self.create_main_area()
@@ -103,12 +385,9 @@ class MainWindow(CTk):
 
         self.tool_buttons = {}
 
-        tools = {
-            "PDF Tools": ["Merge PDF", "Split PDF", "PDF to Word"],
-            "Word Tools": ["Docs to PDF"],
-            "Image Tools": ["Image Size Reducer", "Image Format Converter"],
-            "Text Tools": ["Text to PDF"],
-        }
+        tools = {}
+        for tool, (section, *_) in TOOLS.items():
+            tools.setdefault(section, []).append(tool)
 
         for section, tool_list in tools.items():
             section_label = CTkLabel(
@@ -136,6 +415,21 @@ class MainWindow(CTk):
                 btn.pack(pady=(0, 10), padx=8, anchor="center")
                 self.tool_buttons[tool] = btn
 
+        # Tools write straight to the chosen destination instead of a temporary output
+        self.save_first_box = CTkCheckBox(self.menu_frame, text="Choose destination first", font=self.button_font, text_color="#f5f6fa")
+        self.save_first_box.pack(pady=(18, 6), padx=8, anchor="center")
+
+        # For support: record what the next jobs do and save it as a trace file
+        self.trace_box = CTkCheckBox(self.menu_frame, text="Record trace", font=self.button_font, text_color="#f5f6fa", command=self.toggle_trace)
+        self.trace_box.pack(pady=(6, 6), padx=8, anchor="center")
+        self.profile_box = CTkCheckBox(self.menu_frame, text="Sample stacks", font=self.button_font, text_color="#f5f6fa")
+        self.profile_box.pack(pady=(0, 6), padx=8, anchor="center")
+        if tracer.enabled:
+            self.trace_box.select()
+
+        self.cache_label = CTkLabel(self.menu_frame, text="", font=self.button_font, text_color="#a4b0be")
+        self.cache_label.pack(pady=(6, 6), padx=8, anchor="center")
+
     def create_main_area(self):
         self.workspace_frame = CTkFrame(self, fg_color="#1A1C23", corner_radius=22)
         self.workspace_frame.pack(side="left", fill="both", expand=True)
@@ -162,6 +456,7 @@ class MainWindow(CTk):
         self.status_label.place(relx=1.0, rely=1.0, anchor="se", x=-10, y=-10)
 
     def select_tool(self, tool):
+        self.cancel_jobs()
         self.selected_tool = tool
         self.uploaded_files = []
         self.info_label.configure(text=f"Selected Tool: {tool}")
@@ -193,43 +488,159 @@ class MainWindow(CTk):
         for widget in self.button_row.winfo_children():
             widget.destroy()
 
-        if tool == "Merge PDF":
-            self.upload_button = CTkButton(self.button_row, text="Upload PDF Files", font=self.button_font, command=self.upload_file_for_merge)
-            self.upload_button.pack(side="left", padx=5)
-            self.status_label.configure(text="Please upload 2 PDF files to merge.")
-        elif tool == "Split PDF":
-            self.upload_button = CTkButton(self.button_row, text="Upload PDF File", font=self.button_font, command=self.upload_file_for_split)
-            self.upload_button.pack(side="left", padx=5)
-            self.status_label.configure(text="Please upload a PDF file to split.")
-        elif tool == "PDF to Word":
-            self.upload_button = CTkButton(self.button_row, text="Upload PDF File", font=self.button_font, command=self.upload_file_for_pdf_to_word)
-            self.upload_button.pack(side="left", padx=5)
-            self.status_label.configure(text="Please upload a PDF file to convert to Word.")
-        elif tool == "Docs to PDF":
-            self.upload_button = CTkButton(self.button_row, text="Upload DOCX File", font=self.button_font, command=self.upload_file_for_docs_to_pdf)
-            self.upload_button.pack(side="left", padx=5)
-            self.status_label.configure(text="Please upload a DOCX file to convert to PDF.")
-        elif tool == "Image Size Reducer":
-            self.upload_button = CTkButton(self.button_row, text="Upload Image File", font=self.button_font, command=self.upload_file_for_image_size_reducer)
-            self.upload_button.pack(side="left", padx=5)
-            self.status_label.configure(text="Please upload an image file to reduce size.")
-        elif tool == "Image Format Converter":
-            self.upload_button = CTkButton(self.button_row, text="Upload Image File", font=self.button_font, command=self.upload_file_for_image_format_converter)
-            self.upload_button.pack(side="left", padx=5)
-            self.status_label.configure(text="Please upload an image file to convert format.")
-        elif tool == "Text to PDF":
-            self.upload_button = CTkButton(self.button_row, text="Upload Text File", font=self.button_font, command=self.upload_file_for_text_to_pdf)
-            self.upload_button.pack(side="left", padx=5)
-            self.status_label.configure(text="Please upload a text file to convert to PDF.")
+        _, dependencies, upload_text, upload_method, prompt = TOOLS[tool]
+        self.upload_button = CTkButton(self.button_row, text=upload_text, font=self.button_font, command=getattr(self, upload_method))
+        self.upload_button.pack(side="left", padx=5)
+        self.status_label.configure(text=prompt)
+        # Import the tool's libraries while the user picks files
+        threading.Thread(target=require, args=dependencies, daemon=True).start()
+        if tool == "Docs to PDF":
+            # and start the converter, which can take seconds
+            try:
+                docx_converter_pool().warm()
+            except ValueError:
+                pass
 
         self.cancel_button = CTkButton(self.button_row, text="Cancel", font=self.button_font, command=self.cancel_operation)
         self.cancel_button.pack(side="left", padx=5)
         self.cancel_button.configure(state="disabled")
+        if tool == "Recipe Builder":
+            # Shown before any file is added, so a saved recipe can be loaded first
+            self.recipe = Pipeline()
+            self.recipe_files = {}
+            self.show_recipe_builder()
+
+    def report_startup(self, started):
+        # For startup-bench: runs once the first frame is drawn. Pillow is left
+        # out, since customtkinter draws with it.
+        loaded = [module for name, (_, module) in DEPENDENCIES.items() if name != "image" and module in sys.modules]
+        print(f"FILENODE_PAINTED {(time.perf_counter() - started) * 1000:.1f} {','.join(loaded) or '-'}", flush=True)
+        self.destroy()
+
+    def toggle_trace(self):
+        if self.trace_box.get():
+            start_trace(bool(self.profile_box.get()))
+            self.profile_box.configure(state="disabled")
+            self.status_label.configure(text="Recording trace. Run the slow job, then untick Record trace.")
+            return
+        self.profile_box.configure(state="normal")
+        path = filedialog.asksaveasfilename(
+            defaultextension=".json",
+            initialfile=time.strftime("filenode-trace-%Y%m%d-%H%M%S.json"),
+            filetypes=[("Chrome trace", "*.json")],
+        )
+        stop_trace(path or None)
+        if path:
+            self.status_label.configure(text=f"Trace saved to {path}")
+        else:
+            self.status_label.configure(text="Trace discarded.")
+
+    def cached(self, progress, operation, inputs, options, output_path, compute):
+        # Runs compute() unless the result cache already holds this operation's output
+        result, progress.cache_hit = self.result_cache.run(operation, inputs, options, output_path, compute)
+        return result
+
+    def show_cache_stats(self, hit=False):
+        cache = self.result_cache
+        total = cache.hits + cache.misses
+        if total:
+            self.cache_label.configure(text=f"Reused results: {cache.hits}/{total} ({cache.hits / total:.0%})")
+        if hit:
+            self.status_label.configure(text=self.status_label.cget("text") + " (reused earlier result)")
+
+    # --- Jobs ---
+    def track_progress(self, on_done):
+        return JobProgress(self, self.progress_bar, on_done)
+
+    def run_job(self, func, *args, priority=PRIORITY_INTERACTIVE):
+        self.active_jobs = [job for job in self.active_jobs if not job.finished.is_set()]
+        job = self.scheduler.submit(func, *args, priority=priority, name=func.__name__)
+        self.active_jobs.append(job)
+        return job
+
+    def cancel_jobs(self):
+        # Running tools stop at their next page or chunk and remove partial outputs;
+        # the tool's workspaces go once its jobs have stopped.
+        jobs, self.active_jobs = self.active_jobs, []
+        for job in jobs:
+            job.cancel()
+        workspaces, self.workspaces = self.workspaces, []
+        if workspaces:
+            self.release_when_done(jobs, workspaces)
+
+    def release_when_done(self, jobs, workspaces):
+        if any(not job.finished.is_set() for job in jobs):
+            self.after(200, self.release_when_done, jobs, workspaces)
+            return
+        for workspace in workspaces:
+            self.workspace_manager.release(workspace)
+
+    # --- Outputs ---
+    def choose_output(self, name, defaultextension=None, folder=False):
+        # name inside a fresh workspace for this job, or with "Choose destination
+        # first" ticked the path the user picks now. None means the dialog was cancelled.
+        if not self.save_first_box.get():
+            workspace = self.workspace_manager.create()
+            self.workspaces.append(workspace)
+            return workspace.path_for(name)
+        if folder:
+            path = filedialog.askdirectory()
+        else:
+            path = filedialog.asksaveasfilename(defaultextension=defaultextension)
+        if not path:
+            self.status_label.configure(text="No destination chosen.")
+            return None
+        self.direct_outputs.add(os.path.abspath(path))
+        return path
+
+    def user_owned(self, path):
+        # Paths the user picked (or files inside a folder they picked) are never moved away
+        path = os.path.abspath(path)
+        return path in self.direct_outputs or os.path.dirname(path) in self.direct_outputs
+
+    def saved_directly(self, output_path):
+        paths = output_path if isinstance(output_path, list) else [output_path]
+        return bool(paths) and all(self.user_owned(path) for path in paths)
+
+    def show_saved_directly(self, output_path):
+        if isinstance(output_path, list):
+            self.info_label.configure(text=f"{len(output_path)} files saved to {os.path.dirname(output_path[0])}")
+        else:
+            self.info_label.configure(text=f"Saved to {output_path}")
+
+    def save_to(self, output_path, save_path):
+        # Returns the output's new location, or the old one if the save failed
+        try:
+            new_path = save_output(output_path, save_path, move=not self.user_owned(output_path))
+            self.direct_outputs.add(os.path.abspath(new_path))
+        except OSError as e:
+            self.status_label.configure(text=f"❌ Could not save: {e}")
+            return output_path
+        self.status_label.configure(text=f"File saved: {os.path.basename(save_path)}")
+        self.info_label.configure(text="File saved successfully!")
+        return new_path
+
+    def save_all_to(self, output_paths, save_dir):
+        saved = []
+        try:
+            for output_path in output_paths:
+                save_path = os.path.join(save_dir, os.path.basename(output_path))
+                saved.append(save_output(output_path, save_path, move=not self.user_owned(output_path)))
+                self.direct_outputs.add(os.path.abspath(save_path))
+        except OSError as e:
+            self.status_label.configure(text=f"❌ Could not save: {e}")
+            return saved + output_paths[len(saved):]
+        self.status_label.configure(text=f"{len(output_paths)} files saved to {os.path.basename(save_dir)}")
+        self.info_label.configure(text="Files saved successfully!")
+        return saved
 
     # --- PDF Merge ---
     def upload_file_for_merge(self):
         file_paths = filedialog.askopenfilenames(filetypes=[("PDF Files", "*.pdf")])
-        if file_paths and len(file_paths) == 2:
+        if file_paths and len(file_paths) >= 2:
+            output_path = self.choose_output("merged_output.pdf", ".pdf")
+            if output_path is None:
+                return
             self.uploaded_files = list(file_paths)
             self.info_label.configure(text="Files uploaded. Processing...")
             self.upload_button.configure(state="disabled")
@@ -237,41 +648,47 @@ class MainWindow(CTk):
             self.progress_bar = CTkProgressBar(self.input_panel, width=200)
             self.progress_bar.pack(pady=10)
             self.progress_bar.set(0)
-            self.merge_ready = False
-            threading.Thread(target=self.start_merge_process, daemon=True).start()
-            threading.Thread(target=self.animate_progress, daemon=True).start()
+            progress = self.track_progress(self.finish_merge)
+            self.run_job(self.start_merge_process, output_path, progress, priority=PRIORITY_BULK)
         else:
-            self.status_label.configure(text="Please select exactly 2 PDF files.")
-
-    def start_merge_process(self):
-        pdf_tools = PDFTools()
-        output_path = pdf_tools.merge_pdfs(self.uploaded_files)
-        self.merged_output_path = output_path
-        self.merge_ready = True
-
-    def animate_progress(self):
-        val = 0
-        while val < 1.0:
-            val += 0.01
-            self.progress_bar.set(val)
-            time.sleep(0.03)
-        self.progress_bar.set(1.0)
-        while not getattr(self, "merge_ready", False):
-            time.sleep(0.05)
+            self.status_label.configure(text="Please select 2 or more PDF files.")
+
+    def start_merge_process(self, job, output_path, progress):
+        pdf_tools = PDFTools(progress, job.token)
+        try:
+            inputs = self.uploaded_files
+            self.merge_report = self.cached(
+                progress, "merge", inputs, {"page_specs": [None] * len(inputs)}, output_path,
+                lambda: pdf_tools.merge_pdfs_streaming(inputs, output_path),
+            )
+            self.merged_output_path = output_path
+            progress.done()
+        except Exception as e:
+            progress.done(e)
+
+    def finish_merge(self):
+        report = self.merge_report
+        total_pages = sum(item["pages"] for item in report)
+        total_seconds = sum(item["seconds"] for item in report)
+        slowest = sorted(report, key=lambda item: item["seconds"], reverse=True)[:3]
+        self.status_label.configure(text=f"PDFs merged successfully! {total_pages} pages in {total_seconds:.2f}s")
+        self.info_label.configure(text="Merge complete. You can now save the file.\n" + "\n".join(
+            f"{os.path.basename(item['input'])}: {item['seconds']:.2f}s, {self.format_size(item['bytes_written'])}"
+            for item in slowest
+        ))
         self.show_save_button(self.merged_output_path)
-        self.status_label.configure(text="PDFs merged successfully!")
-        self.info_label.configure(text="Merge complete. You can now save the file.")
 
     def show_save_button(self, output_path):
+        if self.saved_directly(output_path):
+            self.show_saved_directly(output_path)
+            return
         if self.save_button and self.save_button.winfo_exists():
             self.save_button.destroy()
         def save_file():
+            nonlocal output_path
             save_path = filedialog.asksaveasfilename(defaultextension=".pdf")
             if save_path:
-                with open(output_path, "rb") as fsrc, open(save_path, "wb") as fdst:
-                    fdst.write(fsrc.read())
-                self.status_label.configure(text=f"File saved: {os.path.basename(save_path)}")
-                self.info_label.configure(text="File saved successfully!")
+                output_path = self.save_to(output_path, save_path)
         self.save_button = CTkButton(self.input_panel, text="Save PDF", font=self.button_font, command=save_file)
         self.save_button.pack(pady=10)
 
@@ -292,15 +709,8 @@ class MainWindow(CTk):
         for widget in self.thumbnail_panel.winfo_children():
             widget.destroy()
         try:
-            from pdf2image import convert_from_path
-            pages = convert_from_path(pdf_path, size=(120, 160))
-            for idx, img in enumerate(pages, 1):
-                pil_img = img
-                pil_img.thumbnail((350, 500))
-                ctk_img = CTkImage(light_image=pil_img, size=pil_img.size)
-                lbl = CTkLabel(self.thumbnail_panel, image=ctk_img, text=f"Page {idx}", font=self.universal_font)
-                lbl.image = ctk_img
-                lbl.pack(pady=10)
+            view = PdfThumbnailView(self.thumbnail_panel, pdf_path, self.thumbnail_cache, self.universal_font, self.ui, self.thumbnail_store)
+            view.pack(fill="both", expand=True)
         except Exception as e:
             CTkLabel(self.thumbnail_panel, text=f"Preview error: {e}", font=self.universal_font).pack(pady=5)
 
@@ -309,21 +719,51 @@ class MainWindow(CTk):
             if widget not in [self.info_label, self.button_row]:
                 widget.destroy()
         CTkLabel(self.input_panel, text=f"Selected PDF: {os.path.basename(file_path)}", font=self.universal_font).pack(pady=5)
-        CTkLabel(self.input_panel, text="Enter page range (e.g., 1-5):", font=self.universal_font).pack(pady=5)
+        CTkLabel(self.input_panel, text="Enter page range (e.g., 1-5 or 1-5; 6-10):", font=self.universal_font).pack(pady=5)
         self.page_range_entry = CTkEntry(self.input_panel, width=200, font=self.universal_font)
         self.page_range_entry.pack(pady=5)
+        CTkLabel(self.input_panel, text="Or split every N pages:", font=self.universal_font).pack(pady=5)
+        self.burst_entry = CTkEntry(self.input_panel, width=200, font=self.universal_font)
+        self.burst_entry.pack(pady=5)
         self.split_btn = CTkButton(self.input_panel, text="Split PDF", font=self.button_font, command=lambda: self.start_split_pdf(file_path))
         self.split_btn.pack(pady=10)
         self.split_save_btn = None
 
     def start_split_pdf(self, file_path):
         page_range = self.page_range_entry.get().strip()
-        try:
-            start_page, end_page = map(int, page_range.split("-"))
-            if start_page > end_page:
-                raise ValueError("Start page must be less than or equal to end page.")
-        except Exception:
-            self.status_label.configure(text="❌ Invalid page range. Use the format: start-end (e.g., 1-5).")
+        burst = self.burst_entry.get().strip()
+        ranges = [spec.strip() for spec in page_range.split(";") if spec.strip()]
+        if burst:
+            try:
+                pages_per_file = int(burst)
+                if pages_per_file < 1:
+                    raise ValueError("Burst size must be at least 1.")
+            except ValueError:
+                self.status_label.configure(text="❌ Invalid burst size. Enter a whole number of pages.")
+                return
+            target, args = self.split_pdf_multi_process, (file_path, None, pages_per_file)
+            priority = PRIORITY_BULK
+        elif len(ranges) > 1:
+            if not all(c.isdigit() or c in ",- " for spec in ranges for c in spec):
+                self.status_label.configure(text="❌ Invalid page range. Use the format: start-end (e.g., 1-5; 6-10).")
+                return
+            target, args = self.split_pdf_multi_process, (file_path, ranges, None)
+            priority = PRIORITY_BULK
+        else:
+            try:
+                start_page, end_page = map(int, page_range.split("-"))
+                if start_page > end_page:
+                    raise ValueError("Start page must be less than or equal to end page.")
+            except Exception:
+                self.status_label.configure(text="❌ Invalid page range. Use the format: start-end (e.g., 1-5).")
+                return
+            target, args = self.split_pdf_process, (file_path, start_page, end_page)
+            priority = PRIORITY_INTERACTIVE
+        if target == self.split_pdf_multi_process:
+            output_path = self.choose_output("split_output", folder=True)
+        else:
+            output_path = self.choose_output("split_output.pdf", ".pdf")
+        if output_path is None:
             return
         self.status_label.configure(text="Splitting PDF, please wait...")
         self.progress_bar = CTkProgressBar(self.input_panel, width=200)
@@ -331,50 +771,79 @@ class MainWindow(CTk):
         self.progress_bar.set(0)
         if hasattr(self, "split_save_btn") and self.split_save_btn and self.split_save_btn.winfo_exists():
             self.split_save_btn.destroy()
-        self.split_ready = False
-        threading.Thread(target=self.split_pdf_process, args=(file_path, start_page, end_page), daemon=True).start()
-        threading.Thread(target=self.animate_split_progress, daemon=True).start()
-
-    def animate_split_progress(self):
-        val = 0
-        while val < 1.0:
-            val += 0.01
-            self.progress_bar.set(val)
-            time.sleep(0.03)
-        self.progress_bar.set(1.0)
-        while not getattr(self, "split_ready", False):
-            time.sleep(0.05)
+        progress = self.track_progress(self.finish_split)
+        self.run_job(target, *args, output_path, progress, priority=priority)
+
+    def finish_split(self):
+        if isinstance(self.split_output_path, list):
+            self.status_label.configure(text=f"PDF split into {len(self.split_output_path)} files!")
+            self.info_label.configure(text="Split complete. You can now save the files.")
+        else:
+            self.status_label.configure(text="PDF split successfully!")
+            self.info_label.configure(text="Split complete. You can now save the file.")
         self.show_save_button_split(self.split_output_path)
 
-    def split_pdf_process(self, file_path, start_page, end_page):
-        pdf_tools = PDFTools()
-        output_path = "split_output.pdf"
+    def split_pdf_process(self, job, file_path, start_page, end_page, output_path, progress):
+        pdf_tools = PDFTools(progress, job.token)
         try:
-            pdf_tools.split_pdf(file_path, start_page, end_page, output_path)
+            options = {"ranges": [f"{start_page}-{end_page}"], "start_page": start_page, "end_page": end_page}
+            self.cached(
+                progress, "split", [file_path], options, output_path,
+                lambda: pdf_tools.split_pdf(file_path, start_page, end_page, output_path),
+            )
             self.split_output_path = output_path
-            self.split_ready = True
-            self.status_label.configure(text="PDF split successfully!")
-            self.info_label.configure(text="Split complete. You can now save the file.")
+            progress.done()
         except Exception as e:
-            self.status_label.configure(text=f"❌ Error: {e}")
+            progress.done(e)
+
+    def split_pdf_multi_process(self, job, file_path, ranges, pages_per_file, output_dir, progress):
+        pdf_tools = PDFTools(progress, job.token)
+        try:
+            output_paths = self.cached(
+                progress, "split", [file_path], {"ranges": ranges, "pages_per_file": pages_per_file}, output_dir,
+                lambda: pdf_tools.split_pdf_multi(file_path, ranges, pages_per_file, output_dir=output_dir, workers=os.cpu_count() or 1),
+            )
+            self.split_output_path = output_paths
+            progress.done()
+        except Exception as e:
+            progress.done(e)
 
     def show_save_button_split(self, output_path):
+        if self.saved_directly(output_path):
+            self.show_saved_directly(output_path)
+            return
         if hasattr(self, "split_save_btn") and self.split_save_btn and self.split_save_btn.winfo_exists():
             self.split_save_btn.destroy()
+        if isinstance(output_path, list):
+            self.show_save_button_split_folder(output_path)
+            return
         def save_file():
+            nonlocal output_path
             save_path = filedialog.asksaveasfilename(defaultextension=".pdf")
             if save_path:
-                with open(output_path, "rb") as fsrc, open(save_path, "wb") as fdst:
-                    fdst.write(fsrc.read())
-                self.status_label.configure(text=f"File saved: {os.path.basename(save_path)}")
-                self.info_label.configure(text="File saved successfully!")
+                output_path = self.save_to(output_path, save_path)
         self.split_save_btn = CTkButton(self.input_panel, text="Save Split PDF", font=self.button_font, command=save_file)
         self.split_save_btn.pack(pady=10)
 
+    def show_save_button_split_folder(self, output_paths, text="Save Split PDFs"):
+        if self.saved_directly(output_paths):
+            self.show_saved_directly(output_paths)
+            return
+        def save_files():
+            nonlocal output_paths
+            save_dir = filedialog.askdirectory()
+            if save_dir:
+                output_paths = self.save_all_to(output_paths, save_dir)
+        self.split_save_btn = CTkButton(self.input_panel, text=text, font=self.button_font, command=save_files)
+        self.split_save_btn.pack(pady=10)
+
     # --- PDF to Word ---
     def upload_file_for_pdf_to_word(self):
         file_path = filedialog.askopenfilename(filetypes=[("PDF Files", "*.pdf")])
         if file_path:
+            output_path = self.choose_output("converted_output.docx", ".docx")
+            if output_path is None:
+                return
             self.uploaded_files = [file_path]
             self.info_label.configure(text="PDF uploaded. Converting to Word...")
             self.upload_button.configure(state="disabled")
@@ -383,52 +852,137 @@ class MainWindow(CTk):
             self.progress_bar = CTkProgressBar(self.input_panel, width=200)
             self.progress_bar.pack(pady=10)
             self.progress_bar.set(0)
-            self.pdf_to_word_ready = False
-            threading.Thread(target=self.start_pdf_to_word_process, args=(file_path,), daemon=True).start()
-            threading.Thread(target=self.animate_pdf_to_word_progress, daemon=True).start()
+            progress = self.track_progress(self.finish_pdf_to_word)
+            self.run_job(self.start_pdf_to_word_process, file_path, output_path, progress, priority=PRIORITY_BULK)
         else:
             self.status_label.configure(text="Please select a PDF file.")
 
-    def start_pdf_to_word_process(self, file_path):
-        pdf_tools = PDFTools()
-        output_path = "converted_output.docx"
+    def start_pdf_to_word_process(self, job, file_path, output_path, progress):
+        pdf_tools = PDFTools(progress, job.token)
         try:
-            pdf_tools.convert_pdf_to_word(file_path, output_path)
+            self.cached(
+                progress, "pdf-to-word", [file_path], {}, output_path,
+                lambda: pdf_tools.convert_pdf_to_word(file_path, output_path, workers=os.cpu_count() or 1),
+            )
             self.converted_word_path = output_path
-            self.pdf_to_word_ready = True
-            self.status_label.configure(text="PDF converted successfully!")
+            progress.done()
         except Exception as e:
-            self.status_label.configure(text=f"❌ Error: {e}")
-
-    def animate_pdf_to_word_progress(self):
-        val = 0
-        while val < 1.0:
-            val += 0.01
-            self.progress_bar.set(val)
-            time.sleep(0.03)
-        self.progress_bar.set(1.0)
-        while not getattr(self, "pdf_to_word_ready", False):
-            time.sleep(0.05)
+            progress.done(e)
+
+    def finish_pdf_to_word(self):
+        self.status_label.configure(text="PDF converted successfully!")
         self.info_label.configure(text="Conversion complete. You can now save the Word file.")
         self.show_save_button_word(self.converted_word_path)
 
     def show_save_button_word(self, output_path):
+        if self.saved_directly(output_path):
+            self.show_saved_directly(output_path)
+            return
         if hasattr(self, "save_button") and self.save_button and self.save_button.winfo_exists():
             self.save_button.destroy()
         def save_file():
+            nonlocal output_path
             save_path = filedialog.asksaveasfilename(defaultextension=".docx")
             if save_path:
-                with open(output_path, "rb") as fsrc, open(save_path, "wb") as fd:
-                    fd.write(fsrc.read())
-                self.status_label.configure(text=f"File saved: {os.path.basename(save_path)}")
-                self.info_label.configure(text="File saved successfully!")
+                output_path = self.save_to(output_path, save_path)
         self.save_button = CTkButton(self.input_panel, text="Save Word File", font=self.button_font, command=save_file)
         self.save_button.pack(pady=10)
 
+    # --- Optimize PDF ---
+    def upload_file_for_pdf_optimize(self):
+        file_path = filedialog.askopenfilename(filetypes=[("PDF Files", "*.pdf")])
+        if file_path:
+            self.uploaded_files = [file_path]
+            self.info_label.configure(text=f"PDF uploaded: {os.path.basename(file_path)}")
+            self.upload_button.configure(state="disabled")
+            self.cancel_button.configure(state="normal")
+            self.show_pdf_pages_left(file_path)
+            for widget in self.input_panel.winfo_children():
+                if widget not in [self.info_label, self.button_row]:
+                    widget.destroy()
+            self.size_info_label = CTkLabel(self.input_panel, text=f"Original size: {self.format_size(os.path.getsize(file_path))}", font=self.universal_font, text_color="#F7F8FA")
+            self.size_info_label.pack(pady=(10, 0))
+            self.optimize_options_frame = CTkFrame(self.input_panel, fg_color="#232A34")
+            self.optimize_options_frame.pack(pady=(10, 0))
+            CTkLabel(self.optimize_options_frame, text="Image quality (1-95):", font=self.universal_font, text_color="#F7F8FA").grid(row=0, column=0, padx=5, pady=2, sticky="e")
+            self.optimize_quality_entry = CTkEntry(self.optimize_options_frame, width=90, font=self.universal_font)
+            self.optimize_quality_entry.insert(0, "75")
+            self.optimize_quality_entry.grid(row=0, column=1, padx=5, pady=2)
+            CTkLabel(self.optimize_options_frame, text="Max image DPI:", font=self.universal_font, text_color="#F7F8FA").grid(row=1, column=0, padx=5, pady=2, sticky="e")
+            self.optimize_dpi_entry = CTkEntry(self.optimize_options_frame, width=90, font=self.universal_font)
+            self.optimize_dpi_entry.insert(0, "150")
+            self.optimize_dpi_entry.grid(row=1, column=1, padx=5, pady=2)
+            self.keep_images_box = CTkCheckBox(self.optimize_options_frame, text="Keep images as they are", font=self.universal_font)
+            self.keep_images_box.grid(row=2, column=0, columnspan=2, padx=5, pady=6)
+            self.optimize_button = CTkButton(self.input_panel, text="Optimize", font=self.button_font, command=lambda: self.start_pdf_optimize(file_path))
+            self.optimize_button.pack(pady=10)
+        else:
+            self.status_label.configure(text="Please select a PDF file.")
+
+    def start_pdf_optimize(self, file_path):
+        image_quality = None
+        if not self.keep_images_box.get():
+            try:
+                image_quality = int(self.optimize_quality_entry.get().strip())
+                max_dpi = int(self.optimize_dpi_entry.get().strip())
+                if not 1 <= image_quality <= 95 or max_dpi < 1:
+                    raise ValueError("Out of range.")
+            except ValueError:
+                self.status_label.configure(text="❌ Enter an image quality from 1 to 95 and a DPI above 0 (e.g., 75 and 150).")
+                return
+        else:
+            max_dpi = 150
+        output_path = self.choose_output("optimized_output.pdf", ".pdf")
+        if output_path is None:
+            return
+        self.optimize_options_frame.destroy()
+        self.optimize_button.destroy()
+        self.status_label.configure(text="Optimizing PDF, please wait...")
+        self.progress_bar = CTkProgressBar(self.input_panel, width=200)
+        self.progress_bar.pack(pady=10)
+        self.progress_bar.set(0)
+        progress = self.track_progress(self.finish_pdf_optimize)
+        self.run_job(self.start_pdf_optimize_process, file_path, image_quality, max_dpi, output_path, progress, priority=PRIORITY_BULK)
+
+    def start_pdf_optimize_process(self, job, file_path, image_quality, max_dpi, output_path, progress):
+        pdf_tools = PDFTools(progress, job.token)
+        try:
+            options = {"quality": image_quality, "max_dpi": max_dpi, "keep_images": image_quality is None}
+            self.optimize_report = self.cached(
+                progress, "optimize", [file_path], options, output_path,
+                lambda: pdf_tools.optimize_pdf(file_path, output_path, image_quality, max_dpi, workers=os.cpu_count() or 1),
+            )
+            progress.done()
+        except Exception as e:
+            progress.done(e)
+
+    def finish_pdf_optimize(self):
+        report = self.optimize_report
+        before, after = report["bytes_before"], report["bytes_after"]
+        self.status_label.configure(text="PDF optimized successfully!")
+        if hasattr(self, "size_info_label") and self.size_info_label and self.size_info_label.winfo_exists():
+            self.size_info_label.destroy()
+        text = (
+            f"Original size: {self.format_size(before)}\n"
+            f"Optimized size: {self.format_size(after)}\n"
+            f"Size reduced: {100 - after / before * 100 if before else 0:.1f}%\n"
+            f"{report['duplicates']} duplicate objects removed, "
+            f"{report['images_recompressed']} of {report['images']} images recompressed"
+        )
+        if report["kept_original"]:
+            text += "\nThe file was already as small as this tool can make it; kept the original."
+        self.size_info_label = CTkLabel(self.input_panel, text=text, font=self.universal_font, text_color="#F7F8FA")
+        self.size_info_label.pack(pady=(10, 0))
+        self.show_save_button(report["output"])
+        self.show_upload_again_button(self.upload_file_for_pdf_optimize, "Upload PDF File")
+
     # --- Docs to PDF ---
     def upload_file_for_docs_to_pdf(self):
         file_path = filedialog.askopenfilename(filetypes=[("Word Documents", "*.docx")])
         if file_path:
+            output_path = self.choose_output("converted_output.pdf", ".pdf")
+            if output_path is None:
+                return
             self.uploaded_files = [file_path]
             self.info_label.configure(text="DOCX uploaded. Converting to PDF...")
             self.upload_button.configure(state="disabled")
@@ -436,32 +990,26 @@ class MainWindow(CTk):
             self.progress_bar = CTkProgressBar(self.input_panel, width=200)
             self.progress_bar.pack(pady=10)
             self.progress_bar.set(0)
-            self.docs_to_pdf_ready = False
-            threading.Thread(target=self.start_docs_to_pdf_process, args=(file_path,), daemon=True).start()
-            threading.Thread(target=self.animate_docs_to_pdf_progress, daemon=True).start()
+            progress = self.track_progress(self.finish_docs_to_pdf)
+            self.run_job(self.start_docs_to_pdf_process, file_path, output_path, progress, priority=PRIORITY_INTERACTIVE)
         else:
             self.status_label.configure(text="Please select a DOCX file.")
 
-    def start_docs_to_pdf_process(self, file_path):
-        word_tools = WordTools()
-        output_path = "converted_output.pdf"
+    def start_docs_to_pdf_process(self, job, file_path, output_path, progress):
+        word_tools = WordTools(progress, job.token)
         try:
-            word_tools.convert_docx_to_pdf(file_path, output_path)
+            backend = docx_backend().name
+            self.cached(
+                progress, "docx-to-pdf", [file_path], {"docx_backend": backend}, output_path,
+                lambda: word_tools.convert_docx_to_pdf(file_path, output_path, backend),
+            )
             self.converted_pdf_path = output_path
-            self.docs_to_pdf_ready = True
-            self.status_label.configure(text="DOCX converted successfully!")
+            progress.done()
         except Exception as e:
-            self.status_label.configure(text=f"❌ Error: {e}")
-
-    def animate_docs_to_pdf_progress(self):
-        val = 0
-        while val < 1.0:
-            val += 0.01
-            self.progress_bar.set(val)
-            time.sleep(0.03)
-        self.progress_bar.set(1.0)
-        while not getattr(self, "docs_to_pdf_ready", False):
-            time.sleep(0.05)
+            progress.done(e)
+
+    def finish_docs_to_pdf(self):
+        self.status_label.configure(text="DOCX converted successfully!")
         self.info_label.configure(text="Conversion complete. You can now save the PDF file.")
         self.show_save_button(self.converted_pdf_path)
 
@@ -492,8 +1040,7 @@ class MainWindow(CTk):
             # Show thumbnail
             for widget in self.thumbnail_panel.winfo_children():
                 widget.destroy()
-            pil_img = Image.open(file_path)
-            pil_img.thumbnail((320, 320))
+            pil_img = self.load_image_thumbnail(file_path, (320, 320))
             ctk_img = CTkImage(light_image=pil_img, size=pil_img.size)
             lbl = CTkLabel(self.thumbnail_panel, image=ctk_img, text="")
             lbl.image = ctk_img
@@ -510,17 +1057,70 @@ class MainWindow(CTk):
             # Show original size info below buttons
             self.size_info_label = CTkLabel(self.input_panel, text=f"Original size: {formatted_size}", font=self.universal_font, text_color="#F7F8FA")
             self.size_info_label.pack(pady=(10, 0))
+            # Optional size budget
+            if hasattr(self, "reduce_options_frame") and self.reduce_options_frame and self.reduce_options_frame.winfo_exists():
+                self.reduce_options_frame.destroy()
+            self.reduce_options_frame = CTkFrame(self.input_panel, fg_color="#232A34")
+            self.reduce_options_frame.pack(pady=(10, 0))
+            CTkLabel(self.reduce_options_frame, text="Target size in KB (optional):", font=self.universal_font, text_color="#F7F8FA").grid(row=0, column=0, padx=5, pady=2, sticky="e")
+            self.target_size_entry = CTkEntry(self.reduce_options_frame, width=90, font=self.universal_font)
+            self.target_size_entry.grid(row=0, column=1, padx=5, pady=2)
+            CTkLabel(self.reduce_options_frame, text="Max width/height in px (optional):", font=self.universal_font, text_color="#F7F8FA").grid(row=1, column=0, padx=5, pady=2, sticky="e")
+            self.max_dimension_entry = CTkEntry(self.reduce_options_frame, width=90, font=self.universal_font)
+            self.max_dimension_entry.grid(row=1, column=1, padx=5, pady=2)
             # Add Reduce button
             self.reduce_button = CTkButton(self.input_panel, text="Reduce", font=self.button_font, command=lambda: self.start_image_size_reduce_process(file_path, file_size))
             self.reduce_button.pack(pady=10)
         else:
             self.status_label.configure(text="Please select an image file.")
 
+    def load_image_thumbnail(self, file_path, size):
+        try:
+            digest = file_digest(file_path)
+        except OSError:
+            digest = None
+        if digest:
+            pil_img = self.thumbnail_store.get(digest, 0, size)
+            if pil_img is not None:
+                return pil_img
+        pil_img = load_image(file_path, max(size))
+        pil_img.thumbnail(size)
+        if digest:
+            try:
+                self.thumbnail_store.put(digest, 0, size, pil_img)
+            except OSError:
+                pass
+        return pil_img
+
     def start_image_size_reduce_process(self, file_path, original_size):
+        target_text = self.target_size_entry.get().strip()
+        target_bytes = None
+        if target_text:
+            try:
+                target_bytes = int(float(target_text) * 1000)
+                if target_bytes <= 0:
+                    raise ValueError("Target size must be positive.")
+            except ValueError:
+                self.status_label.configure(text="❌ Invalid target size. Enter a number of KB (e.g., 200).")
+                return
+        max_dimension_text = self.max_dimension_entry.get().strip()
+        max_dimension = None
+        if max_dimension_text:
+            try:
+                max_dimension = int(max_dimension_text)
+                if max_dimension <= 0:
+                    raise ValueError("Max dimension must be positive.")
+            except ValueError:
+                self.status_label.configure(text="❌ Invalid max width/height. Enter a number of pixels (e.g., 1920).")
+                return
+        output_path = self.choose_output("reduced_image.jpg", ".jpg")
+        if output_path is None:
+            return
+        if hasattr(self, "reduce_options_frame") and self.reduce_options_frame and self.reduce_options_frame.winfo_exists():
+            self.reduce_options_frame.destroy()
         self.progress_bar = CTkProgressBar(self.input_panel, width=200)
         self.progress_bar.pack(pady=10)
         self.progress_bar.set(0)
-        self.image_reduce_ready = False
         self.original_image_size = original_size
         self.current_image_path = file_path
         # Remove previous save button if exists
@@ -529,29 +1129,31 @@ class MainWindow(CTk):
         # Remove reduce button after click
         if hasattr(self, "reduce_button") and self.reduce_button and self.reduce_button.winfo_exists():
             self.reduce_button.destroy()
-        threading.Thread(target=self._reduce_image_thread, args=(file_path,), daemon=True).start()
-        threading.Thread(target=self.animate_image_reduce_progress, daemon=True).start()
+        progress = self.track_progress(self.finish_image_reduce)
+        self.run_job(self._reduce_image_thread, file_path, output_path, progress, target_bytes, max_dimension, priority=PRIORITY_INTERACTIVE)
 
-    def _reduce_image_thread(self, file_path):
-        image_tools = ImageTools()
-        output_path = "reduced_image.jpg"
+    def _reduce_image_thread(self, job, file_path, output_path, progress, target_bytes=None, max_dimension=None):
+        image_tools = ImageTools(progress, job.token)
         try:
-            image_tools.reduce_image_size(file_path, output_path)
+            self.reduce_report = None
+            options = {"target_bytes": target_bytes, "max_dimension": max_dimension}
+            if target_bytes:
+                self.reduce_report = self.cached(
+                    progress, "reduce-image", [file_path], options, output_path,
+                    lambda: image_tools.reduce_image_to_size(file_path, output_path, target_bytes, max_dimension=max_dimension),
+                )
+            else:
+                self.cached(
+                    progress, "reduce-image", [file_path], options, output_path,
+                    lambda: image_tools.reduce_image_size(file_path, output_path, max_dimension=max_dimension),
+                )
             self.reduced_image_path = output_path
-            self.image_reduce_ready = True
-            self.status_label.configure(text="Image size reduced successfully!")
+            progress.done()
         except Exception as e:
-            self.status_label.configure(text=f"❌ Error: {e}")
-
-    def animate_image_reduce_progress(self):
-        val = 0
-        while val < 1.0:
-            val += 0.01
-            self.progress_bar.set(val)
-            time.sleep(0.03)
-        self.progress_bar.set(1.0)
-        while not getattr(self, "image_reduce_ready", False):
-            time.sleep(0.05)
+            progress.done(e)
+
+    def finish_image_reduce(self):
+        self.status_label.configure(text="Image size reduced successfully!")
         # Show reduced file size, original file size, and percentage reduced below the buttons
         reduced_size = os.path.getsize(self.reduced_image_path)
         original_size = getattr(self, "original_image_size", 0)
@@ -567,6 +1169,7 @@ class MainWindow(CTk):
                 f"Original size: {self.format_size(original_size)}\n"
                 f"Reduced size: {self.format_size(reduced_size)}\n"
                 f"Size reduced: {percent_reduced:.1f}%"
+                + self.format_target_report(self.reduce_report)
             ),
             font=self.universal_font,
             text_color="#F7F8FA"
@@ -575,113 +1178,412 @@ class MainWindow(CTk):
         self.show_save_button_image(self.reduced_image_path)
         self.show_upload_again_button()
 
+    def format_target_report(self, report):
+        if not report:
+            return ""
+        text = f"\nTarget: {self.format_size(report['target'])} (quality {report['quality']}"
+        if report["scale"] < 1.0:
+            text += f", scaled to {report['scale'] * 100:.0f}%"
+        text += ")"
+        if not report["met"]:
+            text += "\nCould not reach the target; kept the smallest result."
+        return text
+
     def show_save_button_image(self, output_path):
+        if self.saved_directly(output_path):
+            self.show_saved_directly(output_path)
+            return
         if hasattr(self, "save_button") and self.save_button and self.save_button.winfo_exists():
             self.save_button.destroy()
         def save_file():
-            save_path = filedialog.asksaveasfilename(defaultextension=".jpg")
+            nonlocal output_path
+            save_path = filedialog.asksaveasfilename(defaultextension=os.path.splitext(output_path)[1])
             if save_path:
-                with open(output_path, "rb") as fsrc, open(save_path, "wb") as fdst:
-                    fdst.write(fsrc.read())
-                self.status_label.configure(text=f"File saved: {os.path.basename(save_path)}")
-                self.info_label.configure(text="File saved successfully!")
+                output_path = self.save_to(output_path, save_path)
         self.save_button = CTkButton(self.input_panel, text="Save Image", font=self.button_font, command=save_file)
         self.save_button.pack(pady=10)
 
-    def show_upload_again_button(self):
+    def show_save_button_image_folder(self, output_paths):
+        if self.saved_directly(output_paths):
+            self.show_saved_directly(output_paths)
+            return
+        if hasattr(self, "save_button") and self.save_button and self.save_button.winfo_exists():
+            self.save_button.destroy()
+        def save_files():
+            nonlocal output_paths
+            save_dir = filedialog.askdirectory()
+            if save_dir:
+                output_paths = self.save_all_to(output_paths, save_dir)
+        self.save_button = CTkButton(self.input_panel, text="Save Images", font=self.button_font, command=save_files)
+        self.save_button.pack(pady=10)
+
+    def show_upload_again_button(self, command=None, text="Upload Image File"):
         if hasattr(self, "upload_again_button") and self.upload_again_button and self.upload_again_button.winfo_exists():
             self.upload_again_button.destroy()
         self.upload_again_button = CTkButton(
             self.input_panel,
-            text="Upload Image File",
+            text=text,
             font=self.button_font,
-            command=self.upload_file_for_image_size_reducer
+            command=command or self.upload_file_for_image_size_reducer
         )
         self.upload_again_button.pack(pady=10)
 
     # --- Image Format Converter ---
     def upload_file_for_image_format_converter(self):
-        file_path = filedialog.askopenfilename(filetypes=[("Image Files", "*.png;*.jpg;*.jpeg;*.bmp")])
-        if file_path:
-            self.uploaded_files = [file_path]
-            self.info_label.configure(text="Image uploaded. Converting format...")
+        file_paths = filedialog.askopenfilenames(filetypes=[("Image Files", "*.png;*.jpg;*.jpeg;*.bmp;*.webp;*.avif;*.tif;*.tiff;*.gif")])
+        if file_paths:
+            self.uploaded_files = list(file_paths)
+            if len(file_paths) == 1:
+                self.info_label.configure(text=f"Image uploaded: {os.path.basename(file_paths[0])}")
+            else:
+                self.info_label.configure(text=f"{len(file_paths)} images uploaded.")
             self.upload_button.configure(state="disabled")
             self.cancel_button.configure(state="normal")
-            self.progress_bar = CTkProgressBar(self.input_panel, width=200)
-            self.progress_bar.pack(pady=10)
-            self.progress_bar.set(0)
-            self.image_convert_ready = False
-            threading.Thread(target=self.start_image_format_convert_process, args=(file_path,), daemon=True).start()
-            threading.Thread(target=self.animate_image_convert_progress, daemon=True).start()
+            for widget in self.thumbnail_panel.winfo_children():
+                widget.destroy()
+            pil_img = self.load_image_thumbnail(file_paths[0], (320, 320))
+            ctk_img = CTkImage(light_image=pil_img, size=pil_img.size)
+            lbl = CTkLabel(self.thumbnail_panel, image=ctk_img, text="")
+            lbl.image = ctk_img
+            lbl.pack(pady=10)
+            if len(file_paths) > 1:
+                CTkLabel(self.thumbnail_panel, text=f"+ {len(file_paths) - 1} more", font=self.universal_font, text_color="#F7F8FA").pack()
+            for name in ("convert_options_frame", "convert_button", "save_button", "upload_again_button", "size_info_label"):
+                widget = getattr(self, name, None)
+                if widget and widget.winfo_exists():
+                    widget.destroy()
+            self.convert_options_frame = CTkFrame(self.input_panel, fg_color="#232A34")
+            self.convert_options_frame.pack(pady=(10, 0))
+            formats = [name.upper() for name in available_image_formats()]
+            CTkLabel(self.convert_options_frame, text="Target format:", font=self.universal_font, text_color="#F7F8FA").grid(row=0, column=0, padx=5, pady=2, sticky="e")
+            self.convert_format_menu = CTkOptionMenu(self.convert_options_frame, values=formats, font=self.universal_font)
+            self.convert_format_menu.set("WEBP" if "WEBP" in formats else formats[0])
+            self.convert_format_menu.grid(row=0, column=1, padx=5, pady=2)
+            CTkLabel(self.convert_options_frame, text="Quality 1-100 (optional):", font=self.universal_font, text_color="#F7F8FA").grid(row=1, column=0, padx=5, pady=2, sticky="e")
+            self.convert_quality_entry = CTkEntry(self.convert_options_frame, width=90, font=self.universal_font)
+            self.convert_quality_entry.grid(row=1, column=1, padx=5, pady=2)
+            self.convert_lossless_box = CTkCheckBox(self.convert_options_frame, text="Lossless (WebP)", font=self.universal_font)
+            self.convert_lossless_box.grid(row=2, column=0, columnspan=2, pady=4)
+            self.convert_button = CTkButton(self.input_panel, text="Convert", font=self.button_font, command=lambda: self.start_image_format_convert(list(file_paths)))
+            self.convert_button.pack(pady=10)
         else:
             self.status_label.configure(text="Please select an image file.")
 
-    def start_image_format_convert_process(self, file_path):
-        image_tools = ImageTools()
-        output_path = "converted_image.png"
+    def start_image_format_convert(self, file_paths):
+        quality_text = self.convert_quality_entry.get().strip()
+        quality = None
+        if quality_text:
+            try:
+                quality = int(quality_text)
+                if not 1 <= quality <= 100:
+                    raise ValueError("Quality must be between 1 and 100.")
+            except ValueError:
+                self.status_label.configure(text="❌ Invalid quality. Enter a number from 1 to 100.")
+                return
+        format_name = self.convert_format_menu.get()
+        lossless = bool(self.convert_lossless_box.get())
+        output_dir = self.choose_output("converted_images", folder=True)
+        if output_dir is None:
+            return
+        self.convert_options_frame.destroy()
+        self.convert_button.destroy()
+        self.info_label.configure(text=f"Converting to {format_name}...")
+        self.progress_bar = CTkProgressBar(self.input_panel, width=200)
+        self.progress_bar.pack(pady=10)
+        self.progress_bar.set(0)
+        progress = self.track_progress(self.finish_image_convert)
+        # One image is a quick interactive job; a folder of them queues as bulk work
+        priority = PRIORITY_INTERACTIVE if len(file_paths) == 1 else PRIORITY_BULK
+        self.run_job(self.start_image_format_convert_process, file_paths, output_dir, format_name, quality, lossless, progress, priority=priority)
+
+    def start_image_format_convert_process(self, job, file_paths, output_dir, format_name, quality, lossless, progress):
+        image_tools = ImageTools(progress, job.token)
         try:
-            image_tools.convert_image_format(file_path, output_path)
-            self.converted_image_path = output_path
-            self.image_convert_ready = True
-            self.status_label.configure(text="Image format converted successfully!")
+            self.convert_reports = image_tools.convert_images(
+                file_paths, output_dir, format_name, quality=quality, lossless=lossless,
+                workers=min(len(file_paths), os.cpu_count() or 1),
+            )
+            progress.done()
         except Exception as e:
-            self.status_label.configure(text=f"❌ Error: {e}")
-
-    def animate_image_convert_progress(self):
-        val = 0
-        while val < 1.0:
-            val += 0.01
-            self.progress_bar.set(val)
-            time.sleep(0.03)
-        self.progress_bar.set(1.0)
-        while not getattr(self, "image_convert_ready", False):
-            time.sleep(0.05)
-        self.info_label.configure(text="Conversion complete. You can now save the image.")
-        self.show_save_button_image(self.converted_image_path)
-        self.show_upload_again_button()
+            progress.done(e)
+
+    def finish_image_convert(self):
+        reports = self.convert_reports
+        converted = [r for r in reports if r["ok"]]
+        failed = len(reports) - len(converted)
+        if failed:
+            self.status_label.configure(text=f"Converted {len(converted)} of {len(reports)} images; {failed} failed.")
+        else:
+            self.status_label.configure(text="Image format converted successfully!")
+        self.info_label.configure(text="Conversion complete. You can now save the image." if len(converted) == 1 else "Conversion complete. You can now save the images.")
+        self.size_info_label = CTkLabel(self.input_panel, text=self.format_convert_report(reports), font=("Consolas", 12), text_color="#F7F8FA", justify="left")
+        self.size_info_label.pack(pady=(10, 0))
+        if len(converted) == 1:
+            self.show_save_button_image(converted[0]["output"])
+        elif converted:
+            self.show_save_button_image_folder([r["output"] for r in converted])
+        self.show_upload_again_button(self.upload_file_for_image_format_converter)
+
+    def format_convert_report(self, reports, limit=12):
+        # One line per file: decode + encode time and size change
+        lines = []
+        for r in reports[:limit]:
+            name = os.path.basename(r["input"])
+            if len(name) > 28:
+                name = name[:25] + "..."
+            if r["ok"]:
+                lines.append(
+                    f"{name:<28} {r['seconds']:6.2f}s (decode {r['decode_seconds']:.2f}s, encode {r['encode_seconds']:.2f}s)  "
+                    f"{self.format_size(r['bytes_in'])} → {self.format_size(r['bytes_out'])}"
+                )
+            else:
+                lines.append(f"{name:<28} failed: {r['error']}")
+        if len(reports) > limit:
+            lines.append(f"... and {len(reports) - limit} more")
+        total_in = sum(r["bytes_in"] for r in reports)
+        total_out = sum(r["bytes_out"] for r in reports)
+        lines.append(f"Total: {self.format_size(total_in)} → {self.format_size(total_out)}")
+        return "\n".join(lines)
 
     # --- Text to PDF ---
     def upload_file_for_text_to_pdf(self):
-        file_path = filedialog.askopenfilename(filetypes=[("Text Files", "*.txt")])
+        file_path = filedialog.askopenfilename(filetypes=[("Text Files", "*.txt;*.log"), ("All Files", "*.*")])
         if file_path:
             self.uploaded_files = [file_path]
-            self.info_label.configure(text="Text file uploaded. Converting to PDF...")
+            self.info_label.configure(text=f"Text file uploaded: {os.path.basename(file_path)} ({self.format_size(os.path.getsize(file_path))})")
             self.upload_button.configure(state="disabled")
             self.cancel_button.configure(state="normal")
-            self.progress_bar = CTkProgressBar(self.input_panel, width=200)
-            self.progress_bar.pack(pady=10)
-            self.progress_bar.set(0)
-            self.text_to_pdf_ready = False
-            threading.Thread(target=self.start_text_to_pdf_process, args=(file_path,), daemon=True).start()
-            threading.Thread(target=self.animate_text_to_pdf_progress, daemon=True).start()
+            if hasattr(self, "text_options_frame") and self.text_options_frame and self.text_options_frame.winfo_exists():
+                self.text_options_frame.destroy()
+            self.text_options_frame = CTkFrame(self.input_panel, fg_color="#232A34")
+            self.text_options_frame.pack(pady=(10, 0))
+            CTkLabel(self.text_options_frame, text="Max pages per PDF (optional):", font=self.universal_font, text_color="#F7F8FA").grid(row=0, column=0, padx=5, pady=2, sticky="e")
+            self.max_pages_entry = CTkEntry(self.text_options_frame, width=90, font=self.universal_font)
+            self.max_pages_entry.grid(row=0, column=1, padx=5, pady=2)
+            CTkButton(self.text_options_frame, text="Convert", font=self.button_font, command=lambda: self.start_text_to_pdf(file_path)).grid(row=1, column=0, columnspan=2, pady=10)
         else:
             self.status_label.configure(text="Please select a text file.")
 
-    def start_text_to_pdf_process(self, file_path):
-        text_tools = TextTools()
-        output_path = "converted_text.pdf"
+    def start_text_to_pdf(self, file_path):
+        max_pages_text = self.max_pages_entry.get().strip()
+        max_pages = None
+        if max_pages_text:
+            try:
+                max_pages = int(max_pages_text)
+                if max_pages < 1:
+                    raise ValueError("Max pages must be at least 1.")
+            except ValueError:
+                self.status_label.configure(text="❌ Invalid page count. Enter a whole number (e.g., 500).")
+                return
+        if max_pages:
+            output_path = self.choose_output("converted_text_parts", folder=True)
+        else:
+            output_path = self.choose_output("converted_text.pdf", ".pdf")
+        if output_path is None:
+            return
+        self.text_options_frame.destroy()
+        self.info_label.configure(text="Converting to PDF...")
+        self.progress_bar = CTkProgressBar(self.input_panel, width=200)
+        self.progress_bar.pack(pady=10)
+        self.progress_bar.set(0)
+        progress = self.track_progress(self.finish_text_to_pdf)
+        self.run_job(self.start_text_to_pdf_process, file_path, max_pages, output_path, progress, priority=PRIORITY_BULK)
+
+    def start_text_to_pdf_process(self, job, file_path, max_pages, output_path, progress):
+        text_tools = TextTools(progress, job.token)
         try:
-            text_tools.convert_text_to_pdf(file_path, output_path)
-            self.converted_text_pdf_path = output_path
-            self.text_to_pdf_ready = True
-            self.status_label.configure(text="Text converted successfully!")
+            self.text_to_pdf_report = self.cached(
+                progress, "text-to-pdf", [file_path], {"max_pages": max_pages}, output_path,
+                lambda: text_tools.convert_text_to_pdf(file_path, output_path, max_pages=max_pages),
+            )
+            progress.done()
         except Exception as e:
-            self.status_label.configure(text=f"❌ Error: {e}")
-
-    def animate_text_to_pdf_progress(self):
-        val = 0
-        while val < 1.0:
-            val += 0.01
-            self.progress_bar.set(val)
-            time.sleep(0.03)
-        self.progress_bar.set(1.0)
-        while not getattr(self, "text_to_pdf_ready", False):
-            time.sleep(0.05)
-        self.info_label.configure(text="Conversion complete. You can now save the PDF file.")
-        self.show_save_button(self.converted_text_pdf_path)
+            progress.done(e)
+
+    def finish_text_to_pdf(self):
+        report = self.text_to_pdf_report
+        self.status_label.configure(
+            text=f"Text converted: {report['pages']} pages in {report['seconds']:.1f}s ({report['mb_per_s']:.1f} MB/s)"
+        )
+        if len(report["outputs"]) > 1:
+            self.info_label.configure(text=f"Conversion complete. {len(report['outputs'])} PDF files are ready to save.")
+            self.show_save_button_split_folder(report["outputs"])
+        else:
+            self.info_label.configure(text="Conversion complete. You can now save the PDF file.")
+            self.show_save_button(report["outputs"][0])
+
+    # --- Recipe Builder ---
+    def upload_files_for_recipe(self):
+        file_paths = filedialog.askopenfilenames(filetypes=[("Supported Files", "*.pdf;*.docx;*.txt;*.log;*.png;*.jpg;*.jpeg;*.bmp;*.webp;*.tif;*.tiff"), ("All Files", "*.*")])
+        if not file_paths:
+            self.status_label.configure(text="Please select one or more files.")
+            return
+        for path in file_paths:
+            try:
+                pipeline_kind(path)
+            except ValueError as e:
+                self.status_label.configure(text=f"❌ {e}")
+                continue
+            # The inputs of a loaded recipe get files first, in order
+            unbound = [name for name in self.recipe.inputs if name not in self.recipe_files]
+            if unbound:
+                name = unbound[0]
+            else:
+                name = self.recipe.add_input(self.recipe.unique_name(os.path.splitext(os.path.basename(path))[0]))
+            self.recipe_files[name] = path
+        self.show_recipe_builder()
+
+    def recipe_input_kinds(self):
+        return {name: pipeline_kind(path) for name, path in self.recipe_files.items()}
+
+    def show_recipe_builder(self):
+        # The recipe so far on the left; a form for the next step and the
+        # run, save and load buttons on the right
+        for widget in self.thumbnail_panel.winfo_children():
+            widget.destroy()
+        for widget in self.input_panel.winfo_children():
+            if widget not in [self.info_label, self.button_row]:
+                widget.destroy()
+        self.info_label.configure(text=f"Recipe: {len(self.recipe.inputs)} inputs, {len(self.recipe.steps)} steps")
+        CTkLabel(self.thumbnail_panel, text="Recipe", font=self.universal_font, text_color="#F7F8FA").pack(pady=(16, 6))
+        recipe_list = CTkScrollableFrame(self.thumbnail_panel, fg_color="#181A20")
+        recipe_list.pack(fill="both", expand=True, padx=10, pady=(0, 10))
+        for name in self.recipe.inputs:
+            path = self.recipe_files.get(name)
+            text = f"{name} ← {os.path.basename(path) if path else '(add a file)'}"
+            CTkLabel(recipe_list, text=text, font=self.button_font, text_color="#a4b0be", anchor="w").pack(fill="x", padx=6, pady=2)
+        for step in self.recipe.steps.values():
+            row = CTkFrame(recipe_list, fg_color="#181A20")
+            row.pack(fill="x", padx=6, pady=2)
+            CTkLabel(row, text=step.describe(), font=self.button_font, text_color="#F7F8FA", anchor="w", justify="left", wraplength=300).pack(side="left", fill="x", expand=True)
+            CTkButton(row, text="✕", width=28, font=self.button_font, command=lambda name=step.name: self.remove_recipe_step(name)).pack(side="right")
+
+        self.recipe_form = CTkFrame(self.input_panel, fg_color="#232A34")
+        self.recipe_form.pack(pady=(10, 0))
+        CTkLabel(self.recipe_form, text="Step:", font=self.universal_font, text_color="#F7F8FA").grid(row=0, column=0, padx=5, pady=2, sticky="e")
+        self.recipe_op_menu = CTkOptionMenu(self.recipe_form, values=list(PIPELINE_STEPS), font=self.universal_font)
+        self.recipe_op_menu.grid(row=0, column=1, padx=5, pady=2, sticky="w")
+        CTkLabel(self.recipe_form, text="From (names, comma-separated):", font=self.universal_font, text_color="#F7F8FA").grid(row=1, column=0, padx=5, pady=2, sticky="e")
+        self.recipe_from_entry = CTkEntry(self.recipe_form, width=200, font=self.universal_font)
+        names = self.recipe.inputs + list(self.recipe.steps)
+        if names:
+            self.recipe_from_entry.insert(0, names[-1])
+        self.recipe_from_entry.grid(row=1, column=1, padx=5, pady=2)
+        CTkLabel(self.recipe_form, text="Options:", font=self.universal_font, text_color="#F7F8FA").grid(row=2, column=0, padx=5, pady=2, sticky="e")
+        self.recipe_args_entry = CTkEntry(self.recipe_form, width=200, font=self.universal_font, placeholder_text="--pages 10-40")
+        self.recipe_args_entry.grid(row=2, column=1, padx=5, pady=2)
+        CTkLabel(self.recipe_form, text="Save as (optional):", font=self.universal_font, text_color="#F7F8FA").grid(row=3, column=0, padx=5, pady=2, sticky="e")
+        self.recipe_output_entry = CTkEntry(self.recipe_form, width=200, font=self.universal_font, placeholder_text="part.docx")
+        self.recipe_output_entry.grid(row=3, column=1, padx=5, pady=2)
+        CTkButton(self.recipe_form, text="Add Step", font=self.button_font, command=self.add_recipe_step).grid(row=4, column=0, columnspan=2, pady=10)
+
+        actions = CTkFrame(self.input_panel, fg_color="#232A34")
+        actions.pack(pady=10)
+        CTkButton(actions, text="Run Recipe", font=self.button_font, command=self.start_recipe).pack(side="left", padx=5)
+        CTkButton(actions, text="Save Recipe", font=self.button_font, command=self.save_recipe).pack(side="left", padx=5)
+        CTkButton(actions, text="Load Recipe", font=self.button_font, command=self.load_recipe).pack(side="left", padx=5)
+
+    def add_recipe_step(self):
+        op = self.recipe_op_menu.get()
+        sources = [name.strip() for name in self.recipe_from_entry.get().split(",") if name.strip()]
+        name = self.recipe.unique_name(op)
+        try:
+            self.recipe.add_step(name, op, sources, self.recipe_args_entry.get().strip(), self.recipe_output_entry.get().strip() or None)
+            self.recipe.kinds(self.recipe_input_kinds())
+        except ValueError as e:
+            if name in self.recipe.steps:
+                self.recipe.remove_step(name)
+            self.status_label.configure(text=f"❌ {e}")
+            return
+        self.status_label.configure(text=f"Added step {name}.")
+        self.show_recipe_builder()
+
+    def remove_recipe_step(self, name):
+        try:
+            self.recipe.remove_step(name)
+        except ValueError as e:
+            self.status_label.configure(text=f"❌ {e}")
+            return
+        self.show_recipe_builder()
+
+    def save_recipe(self):
+        path = filedialog.asksaveasfilename(defaultextension=".json", filetypes=[("Recipe", "*.json")])
+        if not path:
+            return
+        try:
+            write_atomic(os.path.abspath(path), json.dumps(self.recipe.to_recipe(), indent=2).encode("utf-8"))
+        except OSError as e:
+            self.status_label.configure(text=f"❌ Could not save: {e}")
+            return
+        self.status_label.configure(text=f"Recipe saved: {os.path.basename(path)}")
+
+    def load_recipe(self):
+        path = filedialog.askopenfilename(filetypes=[("Recipe", "*.json")])
+        if not path:
+            return
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                recipe = Pipeline.from_recipe(json.load(f))
+        except (OSError, ValueError) as e:
+            self.status_label.configure(text=f"❌ Could not load recipe: {e}")
+            return
+        self.recipe = recipe
+        self.recipe_files = {}
+        self.show_recipe_builder()
+        if recipe.inputs:
+            self.status_label.configure(text=f"Recipe loaded. Add files for: {', '.join(recipe.inputs)}.")
+
+    def start_recipe(self):
+        if self.recipe_job is not None and not self.recipe_job.finished.is_set():
+            self.status_label.configure(text="The recipe is still running.")
+            return
+        missing = [name for name in self.recipe.inputs if name not in self.recipe_files]
+        if missing:
+            self.status_label.configure(text=f"❌ Add a file for {', '.join(missing)}.")
+            return
+        try:
+            self.recipe.check(self.recipe_input_kinds())
+        except ValueError as e:
+            self.status_label.configure(text=f"❌ {e}")
+            return
+        output_dir = self.choose_output("recipe_output", folder=True)
+        if output_dir is None:
+            return
+        self.cancel_button.configure(state="normal")
+        if self.progress_bar and self.progress_bar.winfo_exists():
+            self.progress_bar.destroy()
+        self.status_label.configure(text="Running recipe...")
+        self.progress_bar = CTkProgressBar(self.input_panel, width=200)
+        self.progress_bar.pack(pady=10)
+        self.progress_bar.set(0)
+        progress = self.track_progress(self.finish_recipe)
+        # A copy, so steps added while it runs wait for the next run
+        recipe = Pipeline.from_recipe(self.recipe.to_recipe())
+        self.recipe_job = self.run_job(self.start_recipe_process, recipe, dict(self.recipe_files), output_dir, progress, priority=PRIORITY_BULK)
+
+    def start_recipe_process(self, job, recipe, files, output_dir, progress):
+        pipeline_tools = PipelineTools(progress, job.token)
+        try:
+            self.recipe_report = pipeline_tools.run_pipeline(recipe, files, output_dir)
+            progress.done()
+        except Exception as e:
+            progress.done(e)
+
+    def finish_recipe(self):
+        report = self.recipe_report
+        self.status_label.configure(text=f"Recipe finished: {len(report['outputs'])} files in {report['seconds']:.2f}s")
+        lines = []
+        for step in report["steps"]:
+            line = f"{step['name']} ({step['op']}): {step['seconds']:.2f}s"
+            if step["output"]:
+                line += f", {os.path.basename(step['output'])} {self.format_size(step['bytes'])}"
+            lines.append(line)
+        self.info_label.configure(text="Recipe complete.\n" + "\n".join(lines))
+        self.show_save_button_split_folder(report["outputs"], "Save Outputs")
 
     # --- Cancel ---
     def cancel_operation(self):
+        self.cancel_jobs()
         for panel in [self.thumbnail_panel, self.input_panel]:
             for widget in panel.winfo_children():
                 widget.destroy()
@@ -695,7 +1597,3 @@ class MainWindow(CTk):
         self.upload_button = None
         self.selected_tool = None
         self.status_label.configure(text="")
-
-if __name__ == "__main__":
-    app = MainWindow()
-    app.mainloop()
\ No newline at end of file
@@ -1,9 +1,11 @@
 # -*- mode: python ; coding: utf-8 -*-
+import os
 
 
 a = Analysis(
-    ['FileNode.py'],
-    pathex=[],
+    ['__main__.py'],
+    # The folder above the package, so the script can import FileNode.*
+    pathex=[os.path.dirname(SPECPATH)],
     binaries=[],
     datas=[],
     hiddenimports=[],
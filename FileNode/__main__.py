@@ -0,0 +1,14 @@
+import os
+import sys
+import multiprocessing
+
+if not __package__:
+    # Run as a folder (python FileNode) or as a frozen build's script: make the
+    # package importable first
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from FileNode.cli import main
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
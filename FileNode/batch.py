@@ -0,0 +1,365 @@
+# Running tools headlessly over many files on a process pool
+
+import time
+import os
+import signal
+import threading
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+from FileNode.files import unique_output_names
+from FileNode.tracing import tracer
+from FileNode.workers import submit_bounded, worker_context
+from FileNode.jobs import CancelToken
+from FileNode.workspace import Workspace, publish_output, rebase_paths
+from FileNode.documents import split_page_spec
+from FileNode.office import DOCX_BACKENDS, docx_backend
+from FileNode.images import IMAGE_FORMATS, encoder_options, image_format_choice, image_format_for
+from FileNode.tools import ImageTools, PDFTools, TextTools, WordTools
+from FileNode.cache import default_result_cache
+
+def _batch_merge(inputs, output_path, options, progress=None, cancel_token=None):
+    specs = options.get("page_specs") or [None] * len(inputs)
+    return PDFTools(progress, cancel_token).merge_pdfs_streaming(list(zip(inputs, specs)), output_path)
+
+def _batch_split(inputs, output_path, options, progress=None, cancel_token=None):
+    if options.get("pages_per_file") or len(options.get("ranges", [])) > 1:
+        # The batch already runs one file per worker, so each split stays single-process
+        return PDFTools(progress, cancel_token).split_pdf_multi(inputs[0], options.get("ranges"), options.get("pages_per_file"), output_path)
+    return PDFTools(progress, cancel_token).split_pdf(inputs[0], options["start_page"], options["end_page"], output_path)
+
+def _batch_pdf_to_word(inputs, output_path, options, progress=None, cancel_token=None):
+    return PDFTools(progress, cancel_token).convert_pdf_to_word(inputs[0], output_path, workers=options.get("page_workers", 1))
+
+def _batch_optimize(inputs, output_path, options, progress=None, cancel_token=None):
+    # One worker process per file already; recompress its images on this one
+    return PDFTools(progress, cancel_token).optimize_pdf(
+        inputs[0], output_path, None if options.get("keep_images") else options.get("quality") or 75,
+        options.get("max_dpi") or 150, workers=1,
+    )
+
+def _batch_docx_to_pdf(inputs, output_path, options, progress=None, cancel_token=None):
+    return WordTools(progress, cancel_token).convert_docx_to_pdf(inputs[0], output_path, options.get("docx_backend"))
+
+def _batch_reduce_image(inputs, output_path, options, progress=None, cancel_token=None):
+    if options.get("target_bytes"):
+        # One worker process per file already; keep the quality search on one thread
+        return ImageTools(progress, cancel_token).reduce_image_to_size(
+            inputs[0], output_path, options["target_bytes"], workers=1, max_dimension=options.get("max_dimension")
+        )
+    return ImageTools(progress, cancel_token).reduce_image_size(
+        inputs[0], output_path, quality=options.get("quality") or 70, max_dimension=options.get("max_dimension")
+    )
+
+def _batch_convert_image(inputs, output_path, options, progress=None, cancel_token=None):
+    save_options = encoder_options(
+        image_format_for(output_path, None), options.get("quality"), options.get("lossless"), options.get("effort")
+    )
+    return ImageTools(progress, cancel_token).convert_image_format(
+        inputs[0], output_path, max_dimension=options.get("max_dimension"), save_options=save_options
+    )
+
+def _batch_text_to_pdf(inputs, output_path, options, progress=None, cancel_token=None):
+    return TextTools(progress, cancel_token).convert_text_to_pdf(inputs[0], output_path, max_pages=options.get("max_pages"))
+
+# operation name -> (worker function, output suffix)
+BATCH_OPERATIONS = {
+    "merge": (_batch_merge, ".pdf"),
+    "split": (_batch_split, "_split.pdf"),
+    "pdf-to-word": (_batch_pdf_to_word, ".docx"),
+    "optimize": (_batch_optimize, "_optimized.pdf"),
+    "docx-to-pdf": (_batch_docx_to_pdf, ".pdf"),
+    "reduce-image": (_batch_reduce_image, "_reduced.jpg"),
+    "convert-image": (_batch_convert_image, None),
+    "text-to-pdf": (_batch_text_to_pdf, ".pdf"),
+}
+
+class BatchJob:
+    def __init__(self, operation, inputs, output_path, options=None):
+        self.operation = operation
+        self.inputs = list(inputs)
+        self.output_path = output_path
+        self.options = options or {}
+
+def output_size(path):
+    if os.path.isdir(path):
+        return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+    return os.path.getsize(path)
+
+_batch_progress_queue = None
+_batch_worker = False
+
+def _init_batch_worker(progress_queue, trace=False):
+    # Tracing follows the parent whether the worker was forked or spawned
+    global _batch_progress_queue, _batch_worker
+    _batch_progress_queue = progress_queue
+    _batch_worker = True
+    tracer.clear()
+    tracer.enabled = trace
+
+def _init_service_worker(progress_queue=None):
+    # For the long-running watch and serve commands. Ctrl+C goes to the whole
+    # process group; the parent decides when jobs stop.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _init_batch_worker(progress_queue)
+
+class QueueProgress:
+    # Forwards a worker's progress events to the parent, at most every interval seconds
+    def __init__(self, progress_queue, job_id, interval=0.25):
+        self.progress_queue = progress_queue
+        self.job_id = job_id
+        self.interval = interval
+        self.last = 0.0
+
+    def __call__(self, event):
+        now = time.perf_counter()
+        if event.finished or now - self.last >= self.interval:
+            self.last = now
+            self.progress_queue.put((self.job_id, event))
+
+def run_batch_job(operation, inputs, output_path, options, job_id=None, progress=None, cancel_event=None):
+    # Runs inside a pool worker, so every failure is turned into a result
+    # instead of propagating and taking the rest of the batch down with it.
+    # Setting cancel_event stops the job at the tool's next progress point.
+    if progress is None and _batch_progress_queue is not None:
+        progress = QueueProgress(_batch_progress_queue, job_id)
+    cancel_token = CancelToken(cancel_event) if cancel_event is not None else None
+    result = {
+        "operation": operation,
+        "inputs": inputs,
+        "output": output_path,
+        "ok": False,
+        "error": None,
+        "seconds": 0.0,
+        "bytes_in": 0,
+        "bytes_out": 0,
+    }
+    start = time.perf_counter()
+    try:
+        with tracer.span(operation, "job", output=output_path) as args:
+            result["bytes_in"] = args["bytes_in"] = sum(os.path.getsize(p) for p in inputs)
+            func = BATCH_OPERATIONS[operation][0]
+            # Work happens in a workspace next to the output, so jobs with clashing
+            # names never see each other's files and the final move is a rename.
+            with Workspace(os.path.dirname(os.path.abspath(output_path))) as workspace:
+                work_path = workspace.path_for(os.path.basename(output_path))
+                if options.get("cache", True):
+                    details, hit = default_result_cache().run(
+                        operation, inputs, options, work_path, lambda: func(inputs, work_path, options, progress, cancel_token)
+                    )
+                    result["cache"] = "hit" if hit else "miss"
+                else:
+                    details = func(inputs, work_path, options, progress, cancel_token)
+                result["bytes_out"] = args["bytes_out"] = output_size(work_path)
+                publish_output(work_path, output_path)
+        if isinstance(details, (list, dict)):
+            result["details"] = rebase_paths(details, work_path, output_path)
+        result["ok"] = True
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+        result["traceback"] = traceback.format_exc()
+    result["seconds"] = time.perf_counter() - start
+    if _batch_worker and tracer.enabled:
+        # The parent merges these into its own trace
+        result["trace"] = tracer.take_events()
+    return result
+
+class BatchRunner:
+    # on_result(result, done, total) fires as each job finishes;
+    # on_progress(job_index, ProgressEvent) relays the tools' progress events.
+    def __init__(self, workers=None, on_result=None, on_progress=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.on_result = on_result
+        self.on_progress = on_progress
+
+    def run(self, jobs):
+        results = []
+        if self.workers == 1:
+            for i, job in enumerate(jobs):
+                progress = None
+                if self.on_progress:
+                    progress = lambda event, i=i: self.on_progress(i, event)
+                self._collect(results, run_batch_job(job.operation, job.inputs, job.output_path, job.options, i, progress), len(jobs))
+            return results
+        progress_queue = None
+        listener = None
+        if self.on_progress:
+            progress_queue = worker_context().Queue()
+            listener = threading.Thread(target=self._relay_progress, args=(progress_queue,), daemon=True)
+            listener.start()
+        try:
+            self._run_pool(jobs, results, progress_queue)
+        finally:
+            if progress_queue is not None:
+                progress_queue.put(None)
+                listener.join()
+        return results
+
+    def _relay_progress(self, progress_queue):
+        while True:
+            item = progress_queue.get()
+            if item is None:
+                return
+            self.on_progress(*item)
+
+    def _run_pool(self, jobs, results, progress_queue):
+        with ProcessPoolExecutor(
+            max_workers=self.workers, mp_context=worker_context(),
+            initializer=_init_batch_worker, initargs=(progress_queue, tracer.enabled),
+        ) as pool:
+            calls = (
+                (job, run_batch_job, (job.operation, job.inputs, job.output_path, job.options, i))
+                for i, job in enumerate(jobs)
+            )
+            for job, future in submit_bounded(pool, calls, self.workers * 2):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # The worker process itself died (e.g. a crash in a C extension).
+                    result = {
+                        "operation": job.operation,
+                        "inputs": job.inputs,
+                        "output": job.output_path,
+                        "ok": False,
+                        "error": f"worker failed: {type(e).__name__}: {e}",
+                        "seconds": 0.0,
+                        "bytes_in": 0,
+                        "bytes_out": 0,
+                    }
+                self._collect(results, result, len(jobs))
+
+    def _collect(self, results, result, total):
+        events = result.pop("trace", None)
+        if events:
+            tracer.add_events(events)
+        results.append(result)
+        if self.on_result:
+            self.on_result(result, len(results), total)
+
+def format_batch_summary(results, elapsed):
+    done = sum(1 for r in results if r["ok"])
+    failed = len(results) - done
+    bytes_in = sum(r["bytes_in"] for r in results)
+    bytes_out = sum(r["bytes_out"] for r in results)
+    elapsed = max(elapsed, 1e-9)
+    lines = [
+        f"Jobs: {len(results)}  ok: {done}  failed: {failed}",
+        f"Elapsed: {elapsed:.2f}s  ({len(results) / elapsed:.2f} jobs/s)",
+        f"Read: {bytes_in / 1_000_000:.2f} MB ({bytes_in / 1_000_000 / elapsed:.2f} MB/s)  "
+        f"Written: {bytes_out / 1_000_000:.2f} MB",
+    ]
+    cached = [r["cache"] for r in results if r.get("cache")]
+    if cached:
+        hits = cached.count("hit")
+        lines.append(f"Cache: {hits} reused, {len(cached) - hits} computed ({hits / len(cached):.0%} hit rate)")
+    for r in results:
+        if not r["ok"]:
+            lines.append(f"  FAILED {', '.join(r['inputs'])}: {r['error']}")
+    return "\n".join(lines)
+
+def parse_page_range(page_range):
+    start_page, end_page = map(int, page_range.split("-"))
+    if start_page < 1 or start_page > end_page:
+        raise ValueError("Start page must be less than or equal to end page.")
+    return start_page, end_page
+
+def build_batch_jobs(operation, inputs, output_dir, options, output=None):
+    if operation == "merge":
+        paths, specs = zip(*(split_page_spec(token) for token in inputs))
+        options = dict(options, page_specs=list(specs))
+        return [BatchJob(operation, paths, output or os.path.join(output_dir, "merged_output.pdf"), options)]
+    suffix = BATCH_OPERATIONS[operation][1]
+    if operation == "split" and (options.get("pages_per_file") or len(options.get("ranges", [])) > 1):
+        # One folder of pieces per input
+        suffix = "_split"
+    if operation == "text-to-pdf" and options.get("max_pages"):
+        # One folder of numbered PDFs per input
+        suffix = "_pdf"
+    if suffix is None:
+        suffix = image_format_choice(options["format"])[1]
+    return [
+        BatchJob(operation, [path], os.path.join(output_dir, name), options)
+        for path, name in zip(inputs, unique_output_names(inputs, suffix))
+    ]
+
+# The options that change what a tool does, shared by batch, watch and serve:
+# (flag, argparse keywords). The command line and the service both read them
+# from here.
+TOOL_OPTIONS = [
+    ("--page-workers", {"type": int, "default": 1, "help": "Processes per document for pdf-to-word text extraction."}),
+    ("--pages", {"help": "Page range for split, e.g. 1-5. Separate several ranges with ; to get one file per range."}),
+    ("--burst", {"type": int, "help": "Split into files of this many pages."}),
+    ("--quality", {"type": int, "help": "Encoder quality: JPEG quality for reduce-image (default 70) and for images in optimize (default 75), JPEG/WebP/AVIF quality for convert-image."}),
+    ("--max-dpi", {"type": int, "help": "For optimize, downsample images above this resolution at page size (default 150)."}),
+    ("--keep-images", {"action": "store_true", "help": "For optimize, leave images as they are and only remove duplicate objects."}),
+    ("--target-kb", {"type": float, "help": "Size budget in KB for reduce-image; searches for the best quality that fits."}),
+    ("--format", {"default": "png", "help": f"Target format for convert-image: {', '.join(IMAGE_FORMATS)}."}),
+    ("--lossless", {"action": "store_true", "help": "Lossless WebP for convert-image."}),
+    ("--effort", {"type": int, "choices": range(7), "metavar": "0-6", "help": "Encoder effort for convert-image, 0 fastest to 6 smallest."}),
+    ("--max-pages", {"type": int, "help": "For text-to-pdf, write numbered PDFs of at most this many pages."}),
+    ("--docx-backend", {"choices": list(DOCX_BACKENDS), "help": "Converter for docx-to-pdf (default: the first available of these)."}),
+    ("--max-dim", {"type": int, "help": "Shrink images so neither side exceeds this many pixels."}),
+    ("--no-cache", {"action": "store_true", "help": "Always run the tools instead of reusing results from earlier runs."}),
+]
+
+def add_tool_arguments(parser):
+    for flag, spec in TOOL_OPTIONS:
+        parser.add_argument(flag, **spec)
+    return parser
+
+def batch_options(args, operation):
+    # The tool options from add_tool_arguments, checked for operation.
+    # Raises ValueError with a message for the user.
+    options = {
+        "quality": args.quality, "format": args.format, "lossless": args.lossless,
+        "effort": args.effort, "page_workers": args.page_workers, "cache": not args.no_cache,
+        "max_dpi": args.max_dpi, "keep_images": args.keep_images,
+    }
+    if operation == "convert-image":
+        image_format_choice(args.format)
+    if operation == "docx-to-pdf":
+        options["docx_backend"] = docx_backend(args.docx_backend).name
+    if args.target_kb:
+        options["target_bytes"] = int(args.target_kb * 1000)
+    if args.max_dim:
+        options["max_dimension"] = args.max_dim
+    if args.max_pages is not None:
+        if args.max_pages < 1:
+            raise ValueError("--max-pages must be at least 1.")
+        options["max_pages"] = args.max_pages
+    if operation == "split":
+        if args.burst is not None:
+            if args.burst < 1:
+                raise ValueError("--burst must be at least 1.")
+            options["pages_per_file"] = args.burst
+        elif not args.pages:
+            raise ValueError("split needs --pages start-end or --burst N.")
+        else:
+            options["ranges"] = [spec.strip() for spec in args.pages.split(";") if spec.strip()]
+            if len(options["ranges"]) == 1:
+                try:
+                    options["start_page"], options["end_page"] = parse_page_range(options["ranges"][0])
+                except ValueError:
+                    raise ValueError("Invalid page range. Use the format: start-end (e.g., 1-5).") from None
+    return options
+
+def result_detail_lines(result):
+    # What a finished job reported beyond ok/failed, for the console
+    details = result.get("details")
+    if not details:
+        return []
+    if result["operation"] == "reduce-image":
+        return [f"quality {details['quality']}, scale {details['scale'] * 100:.0f}%, {details['size'] / 1000:.1f} KB after {details['encodes']} encodes"]
+    if result["operation"] == "optimize":
+        return [
+            f"{details['bytes_before'] / 1_000_000:.2f} MB -> {details['bytes_after'] / 1_000_000:.2f} MB, "
+            f"{details['duplicates']} duplicate objects, {details['images_recompressed']}/{details['images']} images recompressed"
+        ]
+    if result["operation"] == "text-to-pdf":
+        return [f"{details['pages']} pages in {len(details['outputs'])} file(s), {details['mb_per_s']:.1f} MB/s"]
+    if result["operation"] == "merge":
+        return [
+            f"{item['input']}: {item['pages']} pages, {item['seconds']:.2f}s, {item['bytes_written'] / 1_000_000:.2f} MB written"
+            for item in details
+        ]
+    return []
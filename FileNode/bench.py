@@ -0,0 +1,260 @@
+# Benchmark corpus and cases for the bench command
+
+import time
+import os
+import math
+import sys
+import statistics
+import platform
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+from FileNode import deps
+from FileNode.deps import require
+from FileNode.files import remove_files
+from FileNode.workers import worker_context
+from FileNode.workspace import Workspace
+from FileNode.pdf_writer import TextPdfWriter
+from FileNode.images import encoder_options
+from FileNode.tools import ImageTools, PDFTools, TextTools
+
+# corpus size -> what generate_bench_corpus writes
+BENCH_SCALES = {
+    "small": {"pdf_pages": [10, 200], "image_mp": [1, 12], "text_mb": [20]},
+    "full": {"pdf_pages": [10, 200, 2000], "image_mp": [1, 12, 48], "text_mb": [200]},
+}
+BENCH_SEED = 1234
+BENCH_WORDS = (
+    "request response worker queue cache page index token stream buffer merge split "
+    "render encode decode upload commit retry timeout socket thread process"
+).split()
+
+def peak_rss():
+    # Peak resident set size of this process in bytes, or None where it isn't reported.
+    # On Linux VmHWM is read rather than ru_maxrss, which survives exec and so
+    # would include the parent's peak in a freshly spawned worker.
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+        except ImportError:
+            return None
+        return getattr(psutil.Process().memory_info(), "peak_wset", None)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+def reset_peak_rss():
+    # Linux only: restart VmHWM from the current RSS
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+def bench_text_lines(rng):
+    n = 0
+    while True:
+        n += 1
+        words = " ".join(rng.choice(BENCH_WORDS) for _ in range(rng.randint(4, 30)))
+        yield f"2024-01-01 00:{n // 60 % 60:02d}:{n % 60:02d} INFO [{rng.randint(1, 64)}] {words}\n"
+
+def write_bench_pdf(path, pages, rng):
+    writer = TextPdfWriter(path)
+    lines = bench_text_lines(rng)
+    try:
+        for _ in range(pages):
+            writer.add_page([next(lines).rstrip("\n")[:writer.columns] for _ in range(writer.rows)])
+        writer.close()
+    except BaseException:
+        writer.abort()
+        raise
+
+def write_bench_image(path, megapixels, rng):
+    # Upsampled noise at two scales over a gradient: smooth areas plus detail,
+    # closer to a photo than pure noise or a flat fill
+    width = int(math.sqrt(megapixels * 1_000_000 * 4 / 3))
+    height = width * 3 // 4
+    require("image")
+    coarse = deps.Image.frombytes("RGB", (32, 24), rng.randbytes(32 * 24 * 3)).resize((width, height), deps.Image.BICUBIC)
+    fine = deps.Image.frombytes("RGB", (width // 8, height // 8), rng.randbytes((width // 8) * (height // 8) * 3)).resize((width, height), deps.Image.BICUBIC)
+    gradient = deps.Image.linear_gradient("L").resize((width, height)).convert("RGB")
+    deps.Image.blend(deps.Image.blend(coarse, fine, 0.35), gradient, 0.25).save(path, "JPEG", quality=92)
+
+def write_bench_text(path, megabytes, rng):
+    size = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for line in bench_text_lines(rng):
+            f.write(line)
+            size += len(line)
+            if size >= megabytes * 1_000_000:
+                break
+
+def generate_bench_corpus(corpus_dir, scale="small"):
+    # Files are named after their parameters and generated from a fixed seed, so
+    # a corpus is only written once and is the same on every machine.
+    # Returns {"pdfs": [(path, pages)], "images": [(path, megapixels)], "texts": [(path, megabytes)]}.
+    spec = BENCH_SCALES[scale]
+    os.makedirs(corpus_dir, exist_ok=True)
+    corpus = {"pdfs": [], "images": [], "texts": []}
+    jobs = (
+        [("pdfs", f"doc-{n}p.pdf", write_bench_pdf, n) for n in spec["pdf_pages"]]
+        + [("images", f"photo-{n}mp.jpg", write_bench_image, n) for n in spec["image_mp"]]
+        + [("texts", f"log-{n}mb.txt", write_bench_text, n) for n in spec["text_mb"]]
+    )
+    for kind, name, write, n in jobs:
+        path = os.path.join(corpus_dir, name)
+        if not os.path.exists(path):
+            root, ext = os.path.splitext(path)
+            part_path = f"{root}.part{ext}"
+            try:
+                write(part_path, n, random.Random(f"{BENCH_SEED}-{name}"))
+                os.replace(part_path, path)
+            except BaseException:
+                remove_files([part_path])
+                raise
+        corpus[kind].append((path, n))
+    return corpus
+
+# Each case runs as func(*args, work_dir) in a fresh process and returns (items, unit)
+
+def _bench_merge(paths, work_dir):
+    report = PDFTools().merge_pdfs_streaming(paths, os.path.join(work_dir, "merged.pdf"))
+    return sum(item["pages"] for item in report), "pages"
+
+def _bench_split(path, pages, work_dir):
+    PDFTools().split_pdf(path, 1, max(1, pages // 2), os.path.join(work_dir, "split.pdf"))
+    return max(1, pages // 2), "pages"
+
+def _bench_burst(path, pages, work_dir):
+    PDFTools().split_pdf_multi(path, pages_per_file=10, output_dir=os.path.join(work_dir, "burst"))
+    return pages, "pages"
+
+def _bench_pdf_to_word(path, pages, work_dir):
+    PDFTools().convert_pdf_to_word(path, os.path.join(work_dir, "converted.docx"))
+    return pages, "pages"
+
+def _bench_optimize(path, pages, work_dir):
+    PDFTools().optimize_pdf(path, os.path.join(work_dir, "optimized.pdf"), workers=1)
+    return pages, "pages"
+
+def _bench_reduce_image(path, megapixels, work_dir):
+    ImageTools().reduce_image_size(path, os.path.join(work_dir, "reduced.jpg"))
+    return megapixels, "MP"
+
+def _bench_convert_image(path, megapixels, work_dir):
+    ImageTools().convert_image_format(path, os.path.join(work_dir, "converted.webp"), save_options=encoder_options("WEBP"))
+    return megapixels, "MP"
+
+def _bench_text_to_pdf(path, megabytes, work_dir):
+    report = TextTools().convert_text_to_pdf(path, os.path.join(work_dir, "text.pdf"))
+    return report["pages"], "pages"
+
+def bench_cases(corpus):
+    # (name, func, args, input paths)
+    pdf_paths = [path for path, _ in corpus["pdfs"]]
+    cases = [
+        ("merge", _bench_merge, (pdf_paths,), pdf_paths),
+    ]
+    for path, pages in corpus["pdfs"]:
+        cases.append((f"split-{pages}p", _bench_split, (path, pages), [path]))
+        cases.append((f"burst-{pages}p", _bench_burst, (path, pages), [path]))
+        cases.append((f"pdf-to-word-{pages}p", _bench_pdf_to_word, (path, pages), [path]))
+        cases.append((f"optimize-{pages}p", _bench_optimize, (path, pages), [path]))
+    for path, megapixels in corpus["images"]:
+        cases.append((f"reduce-image-{megapixels}mp", _bench_reduce_image, (path, megapixels), [path]))
+        cases.append((f"convert-webp-{megapixels}mp", _bench_convert_image, (path, megapixels), [path]))
+    for path, megabytes in corpus["texts"]:
+        cases.append((f"text-to-pdf-{megabytes}mb", _bench_text_to_pdf, (path, megabytes), [path]))
+    return cases
+
+def _run_bench_case(func, args):
+    # Runs in a fresh worker process: libraries are loaded before the clock
+    # starts, so seconds and the RSS growth belong to the operation itself.
+    require("pdf", "docx", "image")
+    rss_before = peak_rss()
+    reset_peak_rss()
+    with Workspace() as workspace:
+        start = time.perf_counter()
+        items, unit = func(*args, workspace.path)
+        seconds = time.perf_counter() - start
+    return {"seconds": seconds, "items": items, "unit": unit, "peak_rss": peak_rss(), "rss_before": rss_before}
+
+def run_benchmarks(cases, repeat=3, on_case=None):
+    # Every run gets its own process so peak RSS is not inherited from earlier
+    # cases. Reports the median time and the highest peak RSS over the runs.
+    results = {}
+    context = worker_context()
+    for name, func, args, inputs in cases:
+        bytes_in = sum(os.path.getsize(path) for path in inputs)
+        runs = []
+        for _ in range(repeat):
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                runs.append(pool.submit(_run_bench_case, func, args).result())
+        seconds = statistics.median(run["seconds"] for run in runs)
+        peaks = [run["peak_rss"] for run in runs if run["peak_rss"] is not None]
+        growth = [run["peak_rss"] - run["rss_before"] for run in runs if run["peak_rss"] is not None and run["rss_before"] is not None]
+        results[name] = {
+            "seconds": seconds,
+            "runs": [run["seconds"] for run in runs],
+            "bytes_in": bytes_in,
+            "mb_per_s": bytes_in / 1_000_000 / max(seconds, 1e-9),
+            "items": runs[0]["items"],
+            "unit": runs[0]["unit"],
+            "items_per_s": runs[0]["items"] / max(seconds, 1e-9),
+            "peak_rss_mb": max(peaks) / 1_000_000 if peaks else None,
+            "rss_growth_mb": max(growth) / 1_000_000 if growth else None,
+        }
+        if on_case:
+            on_case(name, results[name])
+    return results
+
+def bench_environment():
+    from importlib.metadata import version, PackageNotFoundError
+    packages = {}
+    for package in ("PyPDF2", "Pillow", "python-docx", "pdf2image", "customtkinter"):
+        try:
+            packages[package] = version(package)
+        except PackageNotFoundError:
+            packages[package] = None
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "packages": packages,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+def compare_bench(results, baseline, threshold=0.10):
+    # Returns (report lines, names of cases that got slower or bigger than threshold)
+    lines = []
+    regressions = []
+    for name, result in results.items():
+        old = baseline.get(name)
+        if old is None:
+            lines.append(f"{name:<24} new case")
+            continue
+        time_change = result["seconds"] / max(old["seconds"], 1e-9) - 1
+        line = f"{name:<24} {old['seconds']:8.3f}s -> {result['seconds']:8.3f}s ({time_change:+.1%})"
+        worse = time_change > threshold
+        if result.get("peak_rss_mb") and old.get("peak_rss_mb"):
+            rss_change = result["peak_rss_mb"] / old["peak_rss_mb"] - 1
+            line += f"  RSS {old['peak_rss_mb']:.0f} -> {result['peak_rss_mb']:.0f} MB ({rss_change:+.1%})"
+            worse = worse or rss_change > threshold
+        if worse:
+            line += "  REGRESSION"
+            regressions.append(name)
+        lines.append(line)
+    for name in baseline:
+        if name not in results:
+            lines.append(f"{name:<24} not run")
+    return lines, regressions
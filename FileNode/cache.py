@@ -0,0 +1,301 @@
+# On-disk caches for thumbnails and tool results
+
+import io
+import os
+import sys
+import shutil
+import hashlib
+import threading
+import tempfile
+import json
+
+from FileNode import deps
+from FileNode.deps import DEPENDENCIES, require
+from FileNode.files import app_cache_dir, copy_file, write_atomic
+from FileNode.tracing import tracer
+from FileNode.workspace import rebase_paths, save_output
+
+_digest_memo = {}
+
+def file_digest(path):
+    # SHA-256 of the file contents. The result is remembered on disk per
+    # (path, size, mtime) so reopening a known file does not hash it again.
+    stat = os.stat(path)
+    stamp = f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}"
+    digest = _digest_memo.get(stamp)
+    if digest:
+        return digest
+    memo_path = os.path.join(app_cache_dir("digests"), hashlib.sha1(stamp.encode("utf-8")).hexdigest())
+    try:
+        with open(memo_path, "r", encoding="ascii") as f:
+            digest = f.read().strip()
+    except OSError:
+        digest = None
+    if not digest or len(digest) != 64:
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(chunk)
+        digest = h.hexdigest()
+        write_atomic(memo_path, digest.encode("ascii"))
+    _digest_memo[stamp] = digest
+    return digest
+
+class ThumbnailStore:
+    # On-disk thumbnails keyed by content hash, page and size. Files are written
+    # atomically and a hit bumps the mtime, which eviction uses as LRU order, so
+    # several app instances can share the same store.
+    def __init__(self, root=None, max_bytes=256 * 1024 * 1024):
+        self.root = root or app_cache_dir("thumbnails")
+        self.max_bytes = max_bytes
+        self.size = None
+        self.lock = threading.Lock()
+
+    def path_for(self, digest, page, size):
+        return os.path.join(self.root, digest[:2], f"{digest}_{page}_{size[0]}x{size[1] or 0}.png")
+
+    def get(self, digest, page, size):
+        path = self.path_for(digest, page, size)
+        require("image")
+        try:
+            img = deps.Image.open(path)
+            img.load()
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # Damaged entry; drop it and render again
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return img
+
+    def put(self, digest, page, size, img):
+        buf = io.BytesIO()
+        img.save(buf, "PNG")
+        data = buf.getvalue()
+        write_atomic(self.path_for(digest, page, size), data)
+        with self.lock:
+            if self.size is None:
+                self.size = sum(entry[1] for entry in self.entries())
+            else:
+                self.size += len(data)
+            over = self.size > self.max_bytes
+        if over:
+            self.evict()
+
+    def entries(self):
+        found = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if not name.endswith(".png"):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                found.append((stat.st_mtime, stat.st_size, path))
+        return found
+
+    def evict(self):
+        entries = sorted(self.entries())
+        total = sum(entry[1] for entry in entries)
+        target = self.max_bytes * 0.9
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        with self.lock:
+            self.size = total
+
+# operation -> (version, DEPENDENCIES its output comes from, options that change
+# the output with their defaults). Bump the version whenever a tool starts
+# producing different output for the same input and options.
+RESULT_OPERATIONS = {
+    "merge": (1, ("pdf",), {"page_specs": None}),
+    "split": (1, ("pdf",), {"ranges": None, "pages_per_file": None, "start_page": None, "end_page": None}),
+    "pdf-to-word": (1, ("pdf", "docx"), {}),
+    "optimize": (1, ("pdf",), {"quality": 75, "max_dpi": 150, "keep_images": False}),
+    "docx-to-pdf": (2, (), {"docx_backend": None}),
+    "reduce-image": (1, ("image",), {"quality": 70, "target_bytes": None, "max_dimension": None}),
+    "convert-image": (1, ("image",), {"quality": None, "lossless": False, "effort": None, "max_dimension": None}),
+    "text-to-pdf": (1, ("pdf",), {"max_pages": None}),
+}
+# Stands in for the output path in the reports kept with cached results
+RESULT_ROOT = "<output>"
+
+def result_files(output_path, details):
+    # The files an operation produced: output_path itself, or for folder outputs
+    # the paths the tool reported, since the folder may hold other files too
+    if os.path.isfile(output_path):
+        return [output_path]
+    if isinstance(details, dict):
+        details = details.get("outputs")
+    if not isinstance(details, list):
+        return []
+    paths = [item.get("output") if isinstance(item, dict) else item for item in details]
+    return [path for path in paths if isinstance(path, str) and os.path.isfile(path)]
+
+class ResultCache:
+    # Finished outputs keyed by a hash of the input contents, the operation, the
+    # options that shape its output and the versions of the code producing it.
+    # Entries are folders moved into place whole and a hit bumps the entry's
+    # mtime, which eviction uses as LRU order, so processes can share the cache.
+    def __init__(self, root=None, max_bytes=1024 * 1024 * 1024):
+        self.root = root or app_cache_dir("results")
+        self.max_bytes = max_bytes
+        self.size = None
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def key_for(self, operation, inputs, options, output_path):
+        version, dependencies, defaults = RESULT_OPERATIONS[operation]
+        require(*dependencies)
+        key = {
+            "operation": operation,
+            "version": version,
+            "libraries": [getattr(sys.modules[DEPENDENCIES[name][1]], "__version__", None) for name in dependencies],
+            "inputs": [file_digest(path) for path in inputs],
+            "params": {name: default if options.get(name) is None else options[name] for name, default in defaults.items()},
+            "extension": os.path.splitext(output_path)[1].lower(),
+        }
+        return hashlib.sha256(json.dumps(key, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def path_for(self, key):
+        return os.path.join(self.root, key[:2], key)
+
+    def run(self, operation, inputs, options, output_path, compute):
+        # compute() writes output_path and returns the tool's result. Returns
+        # (result, hit). Trouble with the cache itself never fails the operation.
+        try:
+            key = self.key_for(operation, inputs, options, output_path)
+        except OSError:
+            key = None
+        if key is not None:
+            with tracer.span("cache lookup", "cache", operation=operation) as args:
+                meta = self.restore(key, output_path)
+                args["hit"] = meta is not None
+            if meta is not None:
+                with self.lock:
+                    self.hits += 1
+                return rebase_paths(meta["details"], RESULT_ROOT, output_path), True
+        with self.lock:
+            self.misses += 1
+        details = compute()
+        if key is not None:
+            with tracer.span("cache store", "cache", operation=operation):
+                self.store(key, output_path, details)
+        return details, False
+
+    def restore(self, key, output_path):
+        # Copies a cached result to output_path. Returns the entry's metadata, or
+        # None when there is no usable entry.
+        entry = self.path_for(key)
+        meta_path = os.path.join(entry, "meta.json")
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            for i, name in enumerate(meta["files"]):
+                dst = output_path
+                if name:
+                    dst = os.path.join(output_path, name)
+                    os.makedirs(os.path.dirname(dst), exist_ok=True)
+                save_output(os.path.join(entry, str(i)), dst, move=False)
+            os.utime(meta_path)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError):
+            # Damaged, or evicted while we read it
+            return None
+        return meta
+
+    def store(self, key, output_path, details):
+        if isinstance(details, list) and any(isinstance(item, dict) and item.get("ok") is False for item in details):
+            # Some files failed; a later run should try them again
+            return
+        files = result_files(output_path, details)
+        if not files:
+            return
+        staging = None
+        try:
+            staging = tempfile.mkdtemp(prefix=".tmp-", dir=self.root)
+            size = 0
+            for i, path in enumerate(files):
+                copy_file(path, os.path.join(staging, str(i)))
+                size += os.path.getsize(path)
+            meta = {
+                "files": ["" if path == output_path else os.path.relpath(path, output_path) for path in files],
+                "details": rebase_paths(details, output_path, RESULT_ROOT),
+            }
+            with open(os.path.join(staging, "meta.json"), "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+            entry = self.path_for(key)
+            os.makedirs(os.path.dirname(entry), exist_ok=True)
+            os.rename(staging, entry)
+        except (OSError, TypeError, ValueError):
+            # Unwritable cache, a report that is not JSON, or another process
+            # stored the same result first
+            if staging is not None:
+                shutil.rmtree(staging, ignore_errors=True)
+            return
+        with self.lock:
+            if self.size is None:
+                self.size = sum(entry[1] for entry in self.entries())
+            else:
+                self.size += size
+            over = self.size > self.max_bytes
+        if over:
+            self.evict()
+
+    def entries(self):
+        found = []
+        for shard in os.scandir(self.root):
+            if len(shard.name) != 2 or not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                try:
+                    stat = os.stat(os.path.join(entry.path, "meta.json"))
+                    size = sum(item.stat().st_size for item in os.scandir(entry.path))
+                except OSError:
+                    continue
+                found.append((stat.st_mtime, size, entry.path))
+        return found
+
+    def evict(self):
+        entries = sorted(self.entries())
+        total = sum(entry[1] for entry in entries)
+        target = self.max_bytes * 0.9
+        for _, size, path in entries:
+            if total <= target:
+                break
+            # Out of the way first, so a reader never finds half an entry
+            doomed = os.path.join(self.root, f".evict-{os.getpid()}-{os.path.basename(path)}")
+            try:
+                os.rename(path, doomed)
+            except OSError:
+                # Gone already, or in use on Windows
+                continue
+            shutil.rmtree(doomed, ignore_errors=True)
+            total -= size
+        with self.lock:
+            self.size = total
+
+_result_cache = None
+
+def default_result_cache():
+    # One per process, so its size is only counted once
+    global _result_cache
+    if _result_cache is None:
+        _result_cache = ResultCache()
+    return _result_cache
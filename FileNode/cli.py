@@ -0,0 +1,464 @@
+# The command line, and the entry point that opens the window
+
+import time
+# Taken before any other import, so startup-bench sees the whole import cost
+STARTED = time.perf_counter()
+import os
+import sys
+import glob
+import shlex
+import signal
+import hashlib
+import argparse
+import threading
+import atexit
+import subprocess
+import statistics
+import json
+import fnmatch
+
+from FileNode.files import app_cache_dir, write_atomic
+from FileNode.tracing import start_trace, stop_trace
+from FileNode.workspace import sweep_workspaces
+from FileNode.batch import (
+    BATCH_OPERATIONS, BatchRunner, add_tool_arguments, batch_options, build_batch_jobs, format_batch_summary,
+    result_detail_lines
+)
+from FileNode.pipeline import Pipeline, PipelineTools, pipeline_kind
+from FileNode.watch import HotFolderService, WatchJournal, WatchedFolder
+from FileNode.bench import (
+    BENCH_SCALES, bench_cases, bench_environment, compare_bench, generate_bench_corpus, run_benchmarks
+)
+from FileNode.service import (
+    FileService, format_load_test, load_test_input, make_service_server, run_load_test, tool_options
+)
+
+def collect_inputs(paths, patterns, manifest, unique=True):
+    inputs = list(paths or [])
+    for pattern in patterns or []:
+        inputs.extend(sorted(glob.glob(pattern, recursive=True)))
+    if manifest:
+        with open(manifest, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    inputs.append(line)
+    if not unique:
+        return inputs
+    # Keep the first occurrence of each file, in order
+    seen = set()
+    unique = []
+    for path in inputs:
+        key = os.path.abspath(path)
+        if key not in seen:
+            seen.add(key)
+            unique.append(path)
+    return unique
+
+def build_batch_parser():
+    parser = argparse.ArgumentParser(prog="FileNode batch", description="Run a tool headlessly over many files.")
+    parser.add_argument("operation", choices=sorted(BATCH_OPERATIONS))
+    parser.add_argument("inputs", nargs="*", help="Input files. For merge, append :1-5,8 to a path to take only those pages.")
+    parser.add_argument("-g", "--glob", action="append", dest="patterns", help="Glob pattern for inputs (repeatable).")
+    parser.add_argument("-m", "--manifest", help="Text file listing one input path per line.")
+    parser.add_argument("-o", "--output-dir", default="batch_output", help="Directory for the outputs.")
+    parser.add_argument("--output", help="Output file for merge.")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="Worker processes (default: CPU count).")
+    add_tool_arguments(parser)
+    parser.add_argument("--progress", action="store_true", help="Print progress of running jobs.")
+    parser.add_argument("--trace", metavar="FILE", help="Record a Chrome trace (JSON) of the run, workers included.")
+    parser.add_argument("--profile", action="store_true", help="With --trace, also sample Python stacks in this process.")
+    return parser
+
+def run_batch_command(args):
+    # The same file may be merged more than once, e.g. with different page ranges
+    inputs = collect_inputs(args.inputs, args.patterns, args.manifest, unique=args.operation != "merge")
+    if not inputs:
+        print("No input files given.", file=sys.stderr)
+        return 2
+    try:
+        options = batch_options(args, args.operation)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+    os.makedirs(args.output_dir, exist_ok=True)
+    sweep_workspaces(args.output_dir)
+    jobs = build_batch_jobs(args.operation, inputs, args.output_dir, options, args.output)
+
+    def on_result(result, done, total):
+        status = "ok    " if result["ok"] else "FAILED"
+        cached = " from cache" if result.get("cache") == "hit" else ""
+        print(f"[{done}/{total}] {status} {', '.join(result['inputs'])} ({result['seconds']:.2f}s{cached})", flush=True)
+        for line in result_detail_lines(result):
+            print(f"    {line}")
+
+    last_report = {}
+
+    def on_progress(job_index, event):
+        # At most one line per job per second
+        now = time.perf_counter()
+        if event.finished or now - last_report.get(job_index, 0) < 1.0:
+            return
+        last_report[job_index] = now
+        name = os.path.basename(jobs[job_index].inputs[0])
+        print(f"    {name}: {event.describe()}", file=sys.stderr, flush=True)
+
+    if args.trace:
+        start_trace(args.profile)
+    start = time.perf_counter()
+    try:
+        results = BatchRunner(args.workers, on_result, on_progress if args.progress else None).run(jobs)
+    finally:
+        if args.trace:
+            stop_trace(args.trace)
+            print(f"Trace written to {args.trace}", file=sys.stderr)
+    print(format_batch_summary(results, time.perf_counter() - start))
+    return 0 if all(r["ok"] for r in results) else 1
+
+def build_pipeline_parser():
+    parser = argparse.ArgumentParser(
+        prog="FileNode pipeline",
+        description="Run a recipe of chained tools. Values pass between steps in memory; only outputs are written.",
+    )
+    parser.add_argument("recipe", help='JSON recipe: {"inputs": [names], "steps": [{"name", "op", "from", "args", "output"}]}.')
+    parser.add_argument("files", nargs="+", metavar="NAME=PATH", help="File for each recipe input, by name or in input order.")
+    parser.add_argument("-o", "--output-dir", default="pipeline_output", help="Directory for the outputs.")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="Steps run at once (default: CPU count).")
+    parser.add_argument("--trace", metavar="FILE", help="Record a Chrome trace (JSON) of the run.")
+    return parser
+
+def run_pipeline_command(args):
+    try:
+        with open(args.recipe, "r", encoding="utf-8") as f:
+            pipeline = Pipeline.from_recipe(json.load(f))
+        files = pipeline.bind(args.files)
+        pipeline.check({name: pipeline_kind(path) for name, path in files.items()})
+    except (OSError, ValueError) as e:
+        print(e, file=sys.stderr)
+        return 2
+    if args.trace:
+        start_trace()
+    try:
+        report = PipelineTools().run_pipeline(pipeline, files, args.output_dir, args.workers)
+    except (OSError, ValueError) as e:
+        print(f"Pipeline failed: {e}", file=sys.stderr)
+        return 1
+    finally:
+        if args.trace:
+            stop_trace(args.trace)
+            print(f"Trace written to {args.trace}", file=sys.stderr)
+    for step in report["steps"]:
+        line = f"{step['name']:<20}{step['op']:<15}{step['seconds']:>8.2f}s"
+        if step["output"]:
+            line += f"  -> {step['output']} ({step['bytes'] / 1000:.1f} KB)"
+        print(line)
+    print(f"{len(report['outputs'])} file(s) written in {report['seconds']:.2f}s")
+    return 0
+
+def build_watch_parser():
+    parser = argparse.ArgumentParser(
+        prog="FileNode watch",
+        description="Run each file that arrives in a folder through a tool. Tool options apply to every -f folder.",
+    )
+    parser.add_argument(
+        "-f", "--folder", nargs=3, action="append", default=[], metavar=("DIR", "OPERATION", "OUTPUT_DIR"),
+        help=f"Watch DIR and put its files through OPERATION ({', '.join(sorted(BATCH_OPERATIONS))}) into OUTPUT_DIR (repeatable).",
+    )
+    parser.add_argument("-c", "--config", help='JSON file with a "folders" list of {"path", "operation", "output", "args"}, where args holds that folder\'s tool options, e.g. "--burst 1".')
+    parser.add_argument("-j", "--workers", type=int, default=None, help="Worker processes (default: CPU count).")
+    parser.add_argument("--journal", help="Journal of handled files (default: one per set of folders in the app cache).")
+    parser.add_argument("--settle", type=float, default=2.0, help="Seconds a file's size and time must stay the same before it is taken.")
+    parser.add_argument("--batch-window", type=float, default=10.0, help="For merge folders, seconds without a new file before the batch is merged.")
+    parser.add_argument("--poll", type=float, default=2.0, help="Seconds between scans when polling.")
+    parser.add_argument("--no-inotify", action="store_true", help="Always poll, e.g. for network shares written from other machines.")
+    parser.add_argument("--once", action="store_true", help="Handle the files there now, then exit.")
+    add_tool_arguments(parser)
+    return parser
+
+def watch_folders(args):
+    # (path, operation, output, options) for every folder on the command line
+    # and in --config. Raises ValueError with a message for the user.
+    entries = [(path, operation, output, args) for path, operation, output in args.folder]
+    if args.config:
+        with open(args.config, "r", encoding="utf-8") as f:
+            config = json.load(f)
+        tool_parser = add_tool_arguments(argparse.ArgumentParser(prog="FileNode watch config", add_help=False))
+        for item in config.get("folders", []):
+            try:
+                folder_args = tool_parser.parse_args(shlex.split(item.get("args", "")))
+                entries.append((item["path"], item["operation"], item["output"], folder_args))
+            except KeyError as e:
+                raise ValueError(f"A folder in {args.config} has no {e.args[0]!r}.") from None
+            except SystemExit:
+                raise ValueError(f"Invalid args for {item['path']} in {args.config}.") from None
+    folders = []
+    for path, operation, output, folder_args in entries:
+        if operation not in BATCH_OPERATIONS:
+            raise ValueError(f"Unknown operation {operation} for {path}.")
+        if not os.path.isdir(path):
+            raise ValueError(f"{path} is not a folder.")
+        folders.append(WatchedFolder(path, operation, output, batch_options(folder_args, operation), args.batch_window))
+    return folders
+
+def run_watch_command(args):
+    try:
+        folders = watch_folders(args)
+    except (OSError, ValueError) as e:
+        print(e, file=sys.stderr)
+        return 2
+    if not folders:
+        print("No folders to watch. Give -f DIR OPERATION OUTPUT_DIR or --config.", file=sys.stderr)
+        return 2
+    journal_path = args.journal
+    if not journal_path:
+        names = "\n".join(sorted(folder.path for folder in folders))
+        journal_path = os.path.join(app_cache_dir("watch"), hashlib.sha1(names.encode("utf-8")).hexdigest()[:16] + ".jsonl")
+    try:
+        journal = WatchJournal(journal_path)
+    except RuntimeError as e:
+        print(e, file=sys.stderr)
+        return 1
+
+    def on_result(result):
+        status = "ok    " if result["ok"] else "FAILED"
+        cached = " from cache" if result.get("cache") == "hit" else ""
+        print(f"{time.strftime('%H:%M:%S')} {status} {', '.join(result['inputs'])} -> {result['output']} ({result['seconds']:.2f}s{cached})", flush=True)
+        for line in result_detail_lines(result):
+            print(f"    {line}")
+        if not result["ok"]:
+            print(f"    {result['error']}", flush=True)
+
+    service = HotFolderService(
+        folders, journal, args.workers, args.settle, args.poll,
+        use_inotify=not args.no_inotify, on_result=on_result,
+    )
+
+    def on_signal(signum, frame):
+        if service.stop_event.is_set():
+            raise KeyboardInterrupt
+        print("Stopping once the running jobs finish (Ctrl+C again to stop now).", file=sys.stderr, flush=True)
+        service.stop()
+
+    signal.signal(signal.SIGINT, on_signal)
+    if hasattr(signal, "SIGTERM"):
+        signal.signal(signal.SIGTERM, on_signal)
+    for folder in folders:
+        print(f"Watching {folder.path}: {folder.operation} -> {folder.output_dir}", flush=True)
+    print(f"Journal: {journal_path}", flush=True)
+    try:
+        service.run(once=args.once)
+    except KeyboardInterrupt:
+        return 130
+    finally:
+        journal.close()
+    return 0
+
+def build_serve_parser():
+    parser = argparse.ArgumentParser(prog="FileNode serve", description="Serve the tools over HTTP, with jobs run on a process pool.")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on; 0.0.0.0 for every interface.")
+    parser.add_argument("-p", "--port", type=int, default=8765, help="Port to listen on.")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="Jobs run at once, each in its own process (default: CPU count).")
+    parser.add_argument("--max-queue", type=int, default=64, help="Jobs that may wait for a worker before new ones are refused.")
+    parser.add_argument("--max-uploads", type=int, default=8, help="Uploads received at once before new ones are refused.")
+    parser.add_argument("--max-upload-mb", type=int, default=2048, help="Largest file accepted.")
+    parser.add_argument("--ttl", type=float, default=3600, help="Seconds outputs and unused uploads are kept.")
+    parser.add_argument("--data-dir", help="Where uploads and outputs are kept (default: the temp folder).")
+    parser.add_argument("--token", default=os.environ.get("FILENODE_TOKEN"), help="Require 'Authorization: Bearer TOKEN' (default: $FILENODE_TOKEN).")
+    parser.add_argument("-q", "--quiet", action="store_true", help="Do not log each request.")
+    return parser
+
+def run_serve_command(args):
+    service = FileService(args.data_dir, args.workers, args.max_queue, args.max_upload_mb * 1_000_000, args.ttl)
+    try:
+        server = make_service_server(service, args.host, args.port, args.token, args.max_uploads, args.quiet)
+    except OSError as e:
+        service.close()
+        print(f"Cannot listen on {args.host}:{args.port}: {e}", file=sys.stderr)
+        return 1
+    host, port = server.server_address[:2]
+    print(f"Serving on http://{host}:{port} with {service.workers} workers (Ctrl+C to stop)", flush=True)
+    if args.host not in ("127.0.0.1", "localhost", "::1") and not args.token:
+        print("Warning: anyone who can reach this address can use the service; consider --token.", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Stopping once the running jobs finish.", file=sys.stderr, flush=True)
+    finally:
+        server.server_close()
+        service.close()
+    return 0
+
+def build_load_test_parser():
+    parser = argparse.ArgumentParser(prog="FileNode load-test", description="Send concurrent jobs to a FileNode service and report throughput and latency.")
+    parser.add_argument("--url", help="Service to test. Without it, one is started on a free localhost port for the test.")
+    parser.add_argument("--operation", default="pdf-to-word", choices=sorted(BATCH_OPERATIONS))
+    parser.add_argument("--file", help="Input to send with every job (default: a small file from the bench corpus).")
+    parser.add_argument("-o", "--option", action="append", default=[], metavar="NAME=VALUE", help="Tool option for the jobs, e.g. burst=4 (repeatable).")
+    parser.add_argument("-c", "--clients", type=int, default=4, help="Clients sending jobs at once.")
+    parser.add_argument("-n", "--requests", type=int, default=40, help="Jobs to send in total.")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="Workers for the service started without --url.")
+    parser.add_argument("--cache", action="store_true", help="Let the service reuse results; by default every job runs the tool.")
+    parser.add_argument("--token", default=os.environ.get("FILENODE_TOKEN"), help="Token for a service started with --token.")
+    return parser
+
+def run_load_test_command(args):
+    options = {}
+    for option in args.option:
+        name, sep, value = option.partition("=")
+        if not sep:
+            print(f"Give options as NAME=VALUE, not {option}.", file=sys.stderr)
+            return 2
+        options[name] = value
+    if not args.cache:
+        options["no_cache"] = True
+    try:
+        tool_options(args.operation, options)
+        path = args.file or load_test_input(args.operation)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+    server = service = None
+    url = args.url
+    if not url:
+        service = FileService(workers=args.workers)
+        server = make_service_server(service, "127.0.0.1", 0, args.token, max(8, args.clients), quiet=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+    print(f"{args.requests} {args.operation} jobs of {os.path.basename(path)} ({os.path.getsize(path) / 1_000_000:.2f} MB) against {url}", flush=True)
+    start = time.perf_counter()
+    try:
+        records = run_load_test(url, path, args.operation, options, args.clients, args.requests, args.token)
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+            service.close()
+    print(format_load_test(records, time.perf_counter() - start, args.clients))
+    return 0 if records and all(r["ok"] for r in records) else 1
+
+def build_startup_bench_parser():
+    parser = argparse.ArgumentParser(prog="FileNode startup-bench", description="Launch the app repeatedly and time how long its window takes to appear.")
+    parser.add_argument("--exe", help="Frozen build to measure, e.g. dist/FileNode. Defaults to this script under the current Python.")
+    parser.add_argument("-n", "--runs", type=int, default=5, help="Number of launches.")
+    parser.add_argument("--budget-ms", type=float, help="Exit non-zero if the median launch-to-paint time is above this.")
+    return parser
+
+def run_startup_bench(args):
+    # Each launch runs with FILENODE_STARTUP_PROBE set, which makes the window
+    # report and close itself once its first frame is drawn. The time is taken
+    # from process launch, so it includes the interpreter (or the frozen
+    # bootloader unpacking itself).
+    if args.exe:
+        command = [os.path.abspath(args.exe)]
+    elif getattr(sys, "frozen", False):
+        command = [sys.executable]
+    else:
+        command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "__main__.py")]
+    env = dict(os.environ, FILENODE_STARTUP_PROBE="1")
+    totals = []
+    for run in range(1, args.runs + 1):
+        start = time.perf_counter()
+        proc = subprocess.Popen(command, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        line = ""
+        for line in proc.stdout:
+            if line.startswith("FILENODE_PAINTED"):
+                break
+        total = (time.perf_counter() - start) * 1000
+        _, stderr = proc.communicate(timeout=60)
+        if not line.startswith("FILENODE_PAINTED"):
+            print(f"Run {run}: the app exited without drawing its window.\n{stderr.strip()}", file=sys.stderr)
+            return 1
+        _, in_process, loaded = line.split()
+        totals.append(total)
+        print(f"Run {run}: {total:.0f} ms from launch to first paint ({float(in_process):.0f} ms of it in FileNode)")
+        if loaded != "-":
+            print(f"    loaded before the first paint: {loaded}")
+    print(
+        f"Median {statistics.median(totals):.0f} ms, best {min(totals):.0f} ms, "
+        f"first launch {totals[0]:.0f} ms ({len(totals)} runs)"
+    )
+    if args.budget_ms and statistics.median(totals) > args.budget_ms:
+        print(f"Over the {args.budget_ms:.0f} ms budget.", file=sys.stderr)
+        return 1
+    return 0
+
+def build_bench_parser():
+    parser = argparse.ArgumentParser(prog="FileNode bench", description="Benchmark every tool over a generated corpus.")
+    parser.add_argument("--scale", choices=sorted(BENCH_SCALES), default="small", help="Corpus size.")
+    parser.add_argument("--corpus", help="Where the corpus is generated and kept (default: the app cache).")
+    parser.add_argument("-k", "--only", action="append", help="Only run cases matching this glob, e.g. 'merge*' (repeatable).")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="Runs per case; the median time is reported.")
+    parser.add_argument("-o", "--output", help="Write the results to this JSON file.")
+    parser.add_argument("--baseline", help="Earlier results JSON to compare against.")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative slowdown or RSS growth that counts as a regression.")
+    return parser
+
+def run_bench_command(args):
+    corpus_dir = args.corpus or app_cache_dir("bench-corpus", args.scale)
+    print(f"Corpus: {corpus_dir}", flush=True)
+    corpus = generate_bench_corpus(corpus_dir, args.scale)
+    cases = bench_cases(corpus)
+    if args.only:
+        cases = [case for case in cases if any(fnmatch.fnmatch(case[0], pattern) for pattern in args.only)]
+    if not cases:
+        print("No benchmark cases match.", file=sys.stderr)
+        return 2
+
+    def on_case(name, result):
+        rss = f"{result['peak_rss_mb']:7.0f} MB peak" if result["peak_rss_mb"] is not None else "  peak RSS n/a"
+        print(
+            f"{name:<24} {result['seconds']:8.3f}s  {result['mb_per_s']:8.2f} MB/s  "
+            f"{result['items_per_s']:10.1f} {result['unit']}/s  {rss}",
+            flush=True,
+        )
+
+    results = run_benchmarks(cases, max(1, args.repeat), on_case)
+    if args.output:
+        report = {"environment": bench_environment(), "scale": args.scale, "repeat": args.repeat, "results": results}
+        write_atomic(os.path.abspath(args.output), json.dumps(report, indent=2).encode("utf-8"))
+        print(f"Results written to {args.output}")
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("scale") != args.scale:
+            print(f"Warning: the baseline was taken at scale {baseline.get('scale')!r}.", file=sys.stderr)
+        lines, regressions = compare_bench(results, baseline["results"], args.threshold)
+        print(f"\nAgainst {args.baseline} ({baseline['environment']['time']}):")
+        print("\n".join(lines))
+        if regressions:
+            print(f"{len(regressions)} regression(s) over {args.threshold:.0%}: {', '.join(regressions)}", file=sys.stderr)
+            return 1
+    return 0
+
+# command name -> (argument parser factory, runner)
+COMMANDS = {
+    "batch": (build_batch_parser, run_batch_command),
+    "pipeline": (build_pipeline_parser, run_pipeline_command),
+    "watch": (build_watch_parser, run_watch_command),
+    "serve": (build_serve_parser, run_serve_command),
+    "load-test": (build_load_test_parser, run_load_test_command),
+    "startup-bench": (build_startup_bench_parser, run_startup_bench),
+    "bench": (build_bench_parser, run_bench_command),
+}
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if argv:
+        if argv[0] not in COMMANDS:
+            print(f"usage: FileNode [{'|'.join(COMMANDS)}] ...", file=sys.stderr)
+            return 2
+        build_parser, run_command = COMMANDS[argv[0]]
+        return run_command(build_parser().parse_intermixed_args(argv[1:]))
+    trace_path = os.environ.get("FILENODE_TRACE")
+    if trace_path:
+        # Records the whole session and writes it on exit
+        start_trace(bool(os.environ.get("FILENODE_PROFILE")))
+        atexit.register(stop_trace, trace_path)
+    # The window's libraries load only when it opens
+    from FileNode.FileNode import MainWindow
+    app = MainWindow()
+    if os.environ.get("FILENODE_STARTUP_PROBE"):
+        # after_idle from inside the first event pass lands behind the initial redraws
+        app.after(0, app.after_idle, app.report_startup, STARTED)
+    app.mainloop()
+    return 0
@@ -0,0 +1,50 @@
+# Third-party libraries that load on first use. The loaders set globals here,
+# which the other modules read as deps.Name once they have called require().
+
+import threading
+
+# PyPDF2, python-docx, docx2pdf and Pillow are only imported once a tool needs
+# them, so the window (and the command line) start without paying for them.
+
+def _load_pdf():
+    global PdfReader, PdfWriter
+    global ArrayObject, DecodedStreamObject, DictionaryObject, EncodedStreamObject, IndirectObject
+    global NameObject, NullObject, NumberObject, StreamObject
+    from PyPDF2 import PdfReader, PdfWriter
+    from PyPDF2.generic import (
+        ArrayObject, DecodedStreamObject, DictionaryObject, EncodedStreamObject, IndirectObject,
+        NameObject, NullObject, NumberObject, StreamObject
+    )
+
+def _load_docx():
+    global Document, Paragraph, Table
+    from docx import Document
+    from docx.text.paragraph import Paragraph
+    from docx.table import Table
+
+def _load_docx2pdf():
+    global docx2pdf_convert
+    from docx2pdf import convert as docx2pdf_convert
+
+def _load_image():
+    global Image
+    from PIL import Image
+
+# dependency name -> loader, and the modules it brings in
+DEPENDENCIES = {
+    "pdf": (_load_pdf, "PyPDF2"),
+    "docx": (_load_docx, "docx"),
+    "docx2pdf": (_load_docx2pdf, "docx2pdf"),
+    "image": (_load_image, "PIL"),
+}
+_loaded_dependencies = set()
+_dependency_lock = threading.Lock()
+
+def require(*names):
+    for name in names:
+        if name in _loaded_dependencies:
+            continue
+        with _dependency_lock:
+            if name not in _loaded_dependencies:
+                DEPENDENCIES[name][0]()
+                _loaded_dependencies.add(name)
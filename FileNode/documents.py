@@ -0,0 +1,228 @@
+# Parsed PDFs shared between tools, and page range parsing
+
+import io
+import mmap
+import os
+import threading
+from collections import OrderedDict
+
+from FileNode import deps
+from FileNode.deps import require
+from FileNode.tracing import tracer
+
+def parse_page_ranges(spec, page_count):
+    # "1-5,8,10-" -> zero-based page indices, in the order given. A page may
+    # appear only once: "1,1" or "1-3,2" is an error rather than a silent copy.
+    indices = []
+    seen = set()
+    for part in spec.replace(" ", "").split(","):
+        if not part:
+            continue
+        if "-" in part:
+            start, end = part.split("-", 1)
+            start = int(start) if start else 1
+            end = int(end) if end else page_count
+        else:
+            start = end = int(part)
+        if start > end:
+            raise ValueError(f"Page range {part} is reversed; write it as {end}-{start}.")
+        if start < 1 or end > page_count:
+            raise ValueError(f"Page range {part} is outside 1-{page_count}.")
+        for index in range(start - 1, end):
+            if index in seen:
+                raise ValueError(f"Page {index + 1} is listed more than once.")
+            seen.add(index)
+            indices.append(index)
+    if not indices:
+        raise ValueError("Empty page range.")
+    return indices
+
+def split_page_spec(token):
+    # "report.pdf:1-5,8" -> ("report.pdf", "1-5,8"). A drive letter like C:\ is left alone.
+    path, sep, spec = token.rpartition(":")
+    if sep and path and spec and all(c.isdigit() or c in ",- " for c in spec):
+        return path, spec
+    return token, None
+
+class PdfDocument:
+    # One parse of a PDF, shared by every tool that opens the same file. PyPDF2
+    # reads from a memory map of it, and the page count, page sizes and extracted
+    # text are worked out on first use and kept. Tools hold `lock` while they use
+    # the reader, since it seeks the one shared buffer. Used as a context manager
+    # the document is released at the end of the block; one the cache has dropped
+    # is closed by its last release. With data, the PDF was made in memory (by a
+    # pipeline step) and path is only its name.
+    def __init__(self, path, data=None):
+        require("pdf")
+        self.path = path
+        self.lock = threading.RLock()
+        self.use_lock = threading.Lock()
+        self.users = 0
+        self.evicted = False
+        self.closed = False
+        if data is not None:
+            self.file = None
+            self.stamp = (len(data), 0)
+        else:
+            self.file = open(path, "rb")
+            stat = os.fstat(self.file.fileno())
+            self.stamp = (stat.st_size, stat.st_mtime_ns)
+        if not self.stamp[0]:
+            if self.file is not None:
+                self.file.close()
+            raise ValueError(f"{os.path.basename(path)} is empty.")
+        if data is not None:
+            self.buffer = io.BytesIO(data)
+        else:
+            self.buffer = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._reader = None
+        self._page_count = None
+        self.sizes = {}
+        self.texts = {}
+
+    @property
+    def reader(self):
+        if self._reader is None:
+            with self.lock:
+                if self._reader is None:
+                    with tracer.span("parse", input=self.path, bytes=self.stamp[0]):
+                        reader = deps.PdfReader(self.buffer)
+                        if reader.is_encrypted:
+                            reader.decrypt("")
+                    self._reader = reader
+        return self._reader
+
+    @property
+    def page_count(self):
+        if self._page_count is None:
+            with self.lock:
+                self._page_count = len(self.reader.pages)
+        return self._page_count
+
+    def page(self, index):
+        return self.reader.pages[index]
+
+    def page_size(self, index):
+        # (width, height) in points as displayed, so with /Rotate applied
+        size = self.sizes.get(index)
+        if size is None:
+            with self.lock:
+                page = self.page(index)
+                box = page.mediabox
+                size = (float(box.width), float(box.height))
+                if page.get("/Rotate", 0) % 180:
+                    size = size[::-1]
+            self.sizes[index] = size
+        return size
+
+    def page_text(self, index):
+        text = self.texts.get(index)
+        if text is None:
+            with self.lock:
+                text = self.page(index).extract_text() or ""
+            self.texts[index] = text
+        return text
+
+    def matches(self, stat):
+        return self.stamp == (stat.st_size, stat.st_mtime_ns)
+
+    def acquire(self):
+        with self.use_lock:
+            self.users += 1
+        return self
+
+    def release(self):
+        with self.use_lock:
+            self.users -= 1
+            unused = self.evicted and not self.users
+        if unused:
+            self.close()
+
+    def evict(self):
+        with self.use_lock:
+            self.evicted = True
+            unused = not self.users
+        if unused:
+            self.close()
+
+    def close(self):
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            self._reader = None
+            self.buffer.close()
+            if self.file is not None:
+                self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+class DocumentCache:
+    # Open PdfDocuments by path, so preview and every tool run on an unchanged
+    # file share one parse. A changed file gets a fresh document; past max_open
+    # the least recently used are dropped, and closed once nothing uses them.
+    # open() counts the caller as a user until it calls release().
+    def __init__(self, max_open=8):
+        self.max_open = max_open
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def open(self, path):
+        key = os.path.abspath(path)
+        stat = os.stat(path)
+        dropped = []
+        with self.lock:
+            doc = self.items.get(key)
+            if doc is not None and doc.matches(stat):
+                self.items.move_to_end(key)
+                return doc.acquire()
+            if doc is not None:
+                dropped.append(doc)
+            doc = self.items[key] = PdfDocument(path)
+            self.items.move_to_end(key)
+            while len(self.items) > self.max_open:
+                dropped.append(self.items.popitem(last=False)[1])
+            doc.acquire()
+        for old in dropped:
+            old.evict()
+        return doc
+
+    def clear(self):
+        with self.lock:
+            docs, self.items = list(self.items.values()), OrderedDict()
+        for doc in docs:
+            doc.evict()
+
+    def after_fork(self):
+        # A lock some other thread held at fork time would never be released in the child
+        self.lock = threading.Lock()
+        for doc in self.items.values():
+            doc.lock = threading.RLock()
+            doc.use_lock = threading.Lock()
+
+pdf_documents = DocumentCache()
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=pdf_documents.after_fork)
+
+def open_pdf(path):
+    # The shared document for path, in use until released: `with open_pdf(path) as doc:`
+    return pdf_documents.open(path)
+
+_text_document = None
+
+def _init_text_worker(input_path):
+    # Each extraction process parses the document once and keeps it for all its
+    # batches, until the process exits.
+    global _text_document
+    _text_document = open_pdf(input_path)
+    _text_document.page_count
+
+def extract_page_texts(start, end, input_path=None):
+    if input_path is None:
+        return [_text_document.page_text(i) for i in range(start, end)]
+    with open_pdf(input_path) as doc:
+        return [doc.page_text(i) for i in range(start, end)]
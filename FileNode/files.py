@@ -0,0 +1,65 @@
+# Small file helpers shared by the tools, caches and commands
+
+import os
+import shutil
+import tempfile
+
+def remove_files(paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+def copy_file(src, dst):
+    # copy_file_range keeps the copy inside the kernel (and lets filesystems that
+    # support it share extents); shutil.copyfile falls back to sendfile, fcopyfile
+    # or a fixed-size buffer. The file never passes through memory whole.
+    if hasattr(os, "copy_file_range"):
+        try:
+            with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+                remaining = os.fstat(fsrc.fileno()).st_size
+                while remaining > 0:
+                    copied = os.copy_file_range(fsrc.fileno(), fdst.fileno(), remaining)
+                    if not copied:
+                        break
+                    remaining -= copied
+            if remaining == 0:
+                return
+        except OSError:
+            pass
+    shutil.copyfile(src, dst)
+
+def unique_output_names(inputs, suffix):
+    # stem + suffix for each input, numbering stems that repeat across folders
+    names = []
+    used = set()
+    for path in inputs:
+        stem = os.path.splitext(os.path.basename(path))[0]
+        name = stem + suffix
+        n = 1
+        while name in used:
+            n += 1
+            name = f"{stem}-{n}{suffix}"
+        used.add(name)
+        names.append(name)
+    return names
+
+def app_cache_dir(*parts):
+    base = os.environ.get("LOCALAPPDATA") or os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    path = os.path.join(base, "FileNode", *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def write_atomic(path, data):
+    # Readers in other processes see either the old file or the complete new one
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
@@ -0,0 +1,113 @@
+# Image loading, encoding and format conversion
+
+import time
+import io
+import os
+
+from FileNode import deps
+from FileNode.deps import require
+from FileNode.files import remove_files
+from FileNode.tracing import tracer
+
+def load_image(path, max_dimension=None):
+    # With max_dimension, JPEGs decode straight at a reduced DCT scale (draft mode)
+    # and other formats go through a cheap box reduce before the final resample,
+    # so memory and time follow the output size rather than the source size.
+    # path may also be an open binary file.
+    require("image")
+    with tracer.span("decode", "image", input=path if isinstance(path, str) else "<memory>") as args:
+        img = deps.Image.open(path)
+        args["size"] = img.size
+        if max_dimension and max(img.size) > max_dimension:
+            img.thumbnail((max_dimension, max_dimension), deps.Image.LANCZOS, reducing_gap=2.0)
+        else:
+            img.load()
+    return img
+
+def image_format_for(path, default="JPEG"):
+    require("image")
+    return deps.Image.registered_extensions().get(os.path.splitext(path)[1].lower(), default)
+
+def prepare_for_format(img, fmt):
+    # JPEG has no alpha or palette; flatten onto white like most viewers show it
+    if fmt == "JPEG" and img.mode not in ("RGB", "L", "CMYK"):
+        require("image")
+        img = img.convert("RGBA")
+        background = deps.Image.new("RGB", img.size, (255, 255, 255))
+        background.paste(img, mask=img.getchannel("A"))
+        return background
+    return img
+
+def encode_image(img, fmt, quality):
+    with tracer.span("encode", "image", format=fmt, quality=int(quality)) as args:
+        buf = io.BytesIO()
+        img.save(buf, fmt, quality=int(quality), optimize=True)
+        args["bytes"] = buf.tell()
+    return buf.getvalue()
+
+# format name -> (Pillow format, output extension)
+IMAGE_FORMATS = {
+    "png": ("PNG", ".png"),
+    "jpeg": ("JPEG", ".jpg"),
+    "webp": ("WEBP", ".webp"),
+    "avif": ("AVIF", ".avif"),
+    "bmp": ("BMP", ".bmp"),
+    "tiff": ("TIFF", ".tif"),
+}
+
+def available_image_formats():
+    require("image")
+    deps.Image.init()
+    return [name for name, (fmt, ext) in IMAGE_FORMATS.items() if fmt in deps.Image.SAVE]
+
+def image_format_choice(name):
+    name = name.lower().lstrip(".")
+    name = {"jpg": "jpeg", "tif": "tiff"}.get(name, name)
+    if name not in IMAGE_FORMATS:
+        raise ValueError(f"Unknown image format '{name}'. Choose from: {', '.join(IMAGE_FORMATS)}.")
+    if name not in available_image_formats():
+        raise ValueError(f"This Pillow build cannot write {name.upper()} files.")
+    return IMAGE_FORMATS[name]
+
+def encoder_options(fmt, quality=None, lossless=False, effort=None):
+    # effort runs from 0 (fastest) to 6 (smallest output), WebP's method scale;
+    # the other encoders get the nearest equivalent of their own knob.
+    options = {}
+    if fmt == "JPEG":
+        options.update(quality=int(quality or 85), optimize=True)
+    elif fmt == "WEBP":
+        options.update(quality=int(quality or 80), lossless=bool(lossless), method=4 if effort is None else effort)
+    elif fmt == "AVIF":
+        options.update(quality=int(quality or 75), speed=6 if effort is None else 10 - effort)
+    elif fmt == "PNG":
+        options.update(compress_level=6 if effort is None else round(effort * 9 / 6))
+    return options
+
+def convert_image_file(input_path, output_path, fmt, save_options=None, max_dimension=None):
+    # One file through decode and encode; runs in a pool worker and reports the
+    # time spent in each stage.
+    start = time.perf_counter()
+    img = load_image(input_path, max_dimension)
+    img = prepare_for_format(img, fmt)
+    decoded = time.perf_counter()
+    root, ext = os.path.splitext(output_path)
+    part_path = f"{root}.part{ext}"
+    try:
+        with tracer.span("encode", "image", format=fmt):
+            img.save(part_path, fmt, **(save_options or {}))
+        os.replace(part_path, output_path)
+    except BaseException:
+        remove_files([part_path])
+        raise
+    end = time.perf_counter()
+    return {
+        "input": input_path,
+        "output": output_path,
+        "ok": True,
+        "error": None,
+        "decode_seconds": decoded - start,
+        "encode_seconds": end - decoded,
+        "seconds": end - start,
+        "bytes_in": os.path.getsize(input_path),
+        "bytes_out": os.path.getsize(output_path),
+    }
@@ -0,0 +1,101 @@
+# Cancellation and the in-app job scheduler
+
+import threading
+import itertools
+import queue
+
+from FileNode.tracing import tracer
+
+class JobCancelled(Exception):
+    pass
+
+class CancelToken:
+    # Set from any thread; tools check it between pages and chunks. event can be
+    # a multiprocessing Manager Event, so a job in a worker process can be stopped.
+    def __init__(self, event=None):
+        self.event = event if event is not None else threading.Event()
+
+    @property
+    def cancelled(self):
+        return self.event.is_set()
+
+    def cancel(self):
+        self.event.set()
+
+    def check(self):
+        if self.event.is_set():
+            raise JobCancelled("Operation cancelled.")
+
+# Job priorities, lowest value first: a single-file tool the user is waiting on
+# runs ahead of queued jobs that work through whole documents or many files
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 10
+
+class Job:
+    def __init__(self, job_id, func, args, priority=PRIORITY_INTERACTIVE, name=None):
+        self.id = job_id
+        self.func = func
+        self.args = args
+        self.priority = priority
+        self.name = name or func.__name__
+        self.token = CancelToken()
+        self.state = "queued"
+        self.result = None
+        self.error = None
+        self.finished = threading.Event()
+
+    def cancel(self):
+        self.token.cancel()
+
+class JobScheduler:
+    # Runs jobs on a fixed number of worker threads, lowest priority value first.
+    # Each job function is called as func(job, *args) and should pass job.token
+    # to the tools it uses so cancel() stops it between pages.
+    def __init__(self, workers=2):
+        self.queue = queue.PriorityQueue()
+        self.jobs = {}
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+        for _ in range(workers):
+            threading.Thread(target=self._worker, daemon=True).start()
+
+    def submit(self, func, *args, priority=PRIORITY_INTERACTIVE, name=None):
+        job = Job(next(self.ids), func, args, priority, name)
+        with self.lock:
+            self.jobs[job.id] = job
+        self.queue.put((priority, job.id, job))
+        return job
+
+    def cancel(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+        if job:
+            job.cancel()
+
+    def cancel_all(self):
+        with self.lock:
+            jobs = list(self.jobs.values())
+        for job in jobs:
+            job.cancel()
+
+    def _worker(self):
+        while True:
+            _, _, job = self.queue.get()
+            try:
+                if job.token.cancelled:
+                    job.state = "cancelled"
+                    continue
+                job.state = "running"
+                try:
+                    with tracer.span(job.name, "job", job=job.id):
+                        job.result = job.func(job, *job.args)
+                    job.state = "cancelled" if job.token.cancelled else "done"
+                except JobCancelled:
+                    job.state = "cancelled"
+                except Exception as e:
+                    job.error = e
+                    job.state = "failed"
+            finally:
+                with self.lock:
+                    self.jobs.pop(job.id, None)
+                job.finished.set()
@@ -0,0 +1,450 @@
+# Word documents: the streaming .docx writer and the DOCX to PDF converters
+
+import time
+import io
+import os
+import re
+import sys
+import shutil
+import threading
+import tempfile
+import textwrap
+import zipfile
+import queue
+import subprocess
+import importlib.util
+import pathlib
+import multiprocessing
+import multiprocessing.util
+from xml.sax.saxutils import escape as xml_escape
+from concurrent.futures import Future
+
+from FileNode import deps
+from FileNode.deps import require
+from FileNode.files import remove_files
+from FileNode.tracing import tracer
+from FileNode.pdf_writer import CONTROL_CHARS, TextPdfWriter
+
+class DocxStreamWriter:
+    # Writes a .docx one paragraph at a time. The package parts come from
+    # python-docx's default template; only word/document.xml is streamed.
+    INVALID_XML = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+    def __init__(self, output_path):
+        require("docx")
+        template = io.BytesIO()
+        deps.Document().save(template)
+        self.zip = zipfile.ZipFile(output_path, "w", zipfile.ZIP_DEFLATED)
+        with zipfile.ZipFile(template) as src:
+            for item in src.infolist():
+                if item.filename == "word/document.xml":
+                    document_xml = src.read(item)
+                else:
+                    self.zip.writestr(item, src.read(item))
+        head, _, rest = document_xml.partition(b"<w:body>")
+        self.section = rest.partition(b"</w:body>")[0]
+        self.stream = self.zip.open("word/document.xml", "w")
+        self.stream.write(head + b"<w:body>")
+
+    def add_paragraph(self, text):
+        text = self.INVALID_XML.sub("", text)
+        parts = []
+        for i, line in enumerate(text.split("\n")):
+            if i:
+                parts.append("<w:br/>")
+            for j, chunk in enumerate(line.split("\t")):
+                if j:
+                    parts.append("<w:tab/>")
+                if chunk:
+                    parts.append(f'<w:t xml:space="preserve">{xml_escape(chunk)}</w:t>')
+        self.stream.write(f"<w:p><w:r>{''.join(parts)}</w:r></w:p>".encode("utf-8"))
+
+    def close(self):
+        self.stream.write(self.section + b"</w:body></w:document>")
+        self.stream.close()
+        self.zip.close()
+
+    def abort(self):
+        self.stream.close()
+        self.zip.close()
+
+def docx_text_rows(doc, columns):
+    # The body of a python-docx Document as word-wrapped rows of text in document
+    # order. Headings are underlined, list items get a bullet and table rows
+    # their cells separated by " | "; None marks a page break.
+    def wrap(text):
+        return [
+            row for line in text.split("\n")
+            for row in textwrap.wrap(CONTROL_CHARS.sub("", line.expandtabs(8)), columns) or [""]
+        ]
+
+    for child in doc.element.body.iterchildren():
+        tag = child.tag.rpartition("}")[2]
+        if tag == "p":
+            paragraph = deps.Paragraph(child, doc)
+            style = paragraph.style.name if paragraph.style is not None else ""
+            text = paragraph.text
+            if style.startswith("List") or (child.pPr is not None and child.pPr.numPr is not None):
+                text = "\u2022 " + text
+            rows = wrap(text)
+            if style == "Title" or style.startswith("Heading"):
+                yield ""
+                yield from rows
+                yield ("=" if style in ("Title", "Heading 1") else "-") * min(columns, max(map(len, rows)))
+            else:
+                yield from rows
+            if child.xpath('.//w:br[@w:type="page"]'):
+                yield None
+        elif tag == "tbl":
+            for row in deps.Table(child, doc).rows:
+                text = " | ".join(cell.text.replace("\n", " ") for cell in row.cells)
+                yield from wrap(text)
+            yield ""
+
+def find_soffice():
+    found = shutil.which("soffice") or shutil.which("libreoffice")
+    if found:
+        return found
+    for path in (r"C:\Program Files\LibreOffice\program\soffice.exe", "/Applications/LibreOffice.app/Contents/MacOS/soffice"):
+        if os.path.exists(path):
+            return path
+    return None
+
+# A DOCX backend starts its converter in __init__, converts with convert(input,
+# output) as often as asked, and shuts down in close(). max_instances caps how
+# many a pool keeps warm at once.
+
+class WordBackend:
+    # Word kept open through COM; docx2pdf starts and quits Word for every file
+    name = "word"
+    max_instances = 1
+
+    @staticmethod
+    def available():
+        return os.name == "nt" and importlib.util.find_spec("win32com") is not None
+
+    def __init__(self):
+        import pythoncom
+        import win32com.client
+        pythoncom.CoInitialize()
+        self.word = win32com.client.DispatchEx("Word.Application")
+        self.word.Visible = False
+        self.word.DisplayAlerts = 0
+
+    def convert(self, input_path, output_path):
+        doc = self.word.Documents.Open(os.path.abspath(input_path), ReadOnly=True, AddToRecentFiles=False)
+        try:
+            # 17 = wdFormatPDF
+            doc.SaveAs(os.path.abspath(output_path), FileFormat=17)
+        finally:
+            doc.Close(0)
+
+    def close(self):
+        import pythoncom
+        try:
+            self.word.Quit()
+        finally:
+            pythoncom.CoUninitialize()
+
+class OfficeBackend:
+    # Headless LibreOffice. With the uno module (python3-uno on Debian and Ubuntu)
+    # one office process stays up and is driven over a pipe. Without it each file
+    # is a --convert-to run that reuses the profile set up when the backend
+    # started, which is the slowest part of a cold launch.
+    name = "office"
+    max_instances = 2
+
+    @staticmethod
+    def available():
+        return find_soffice() is not None
+
+    def __init__(self):
+        self.soffice = find_soffice()
+        self.profile = tempfile.mkdtemp(prefix="filenode-office-")
+        self.process = None
+        self.desktop = None
+        if importlib.util.find_spec("uno") is not None:
+            self._start_listener()
+        else:
+            subprocess.run(self._command("--terminate_after_init"), stdin=subprocess.DEVNULL, capture_output=True, timeout=300)
+
+    def _command(self, *args):
+        return [
+            self.soffice, "--headless", "--invisible", "--nologo", "--norestore", "--nolockcheck", "--nodefault",
+            f"-env:UserInstallation={pathlib.Path(self.profile).as_uri()}", *args,
+        ]
+
+    def _start_listener(self):
+        import uno
+        connection = f"pipe,name=filenode-{os.getpid()}-{threading.get_ident()};urp;StarOffice.ComponentContext"
+        self.process = subprocess.Popen(
+            self._command(f"--accept={connection}"), stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        local = uno.getComponentContext()
+        resolver = local.ServiceManager.createInstanceWithContext("com.sun.star.bridge.UnoUrlResolver", local)
+        deadline = time.monotonic() + 60
+        while True:
+            try:
+                context = resolver.resolve(f"uno:{connection}")
+                break
+            except Exception:
+                if self.process.poll() is not None or time.monotonic() > deadline:
+                    self.close()
+                    raise RuntimeError("LibreOffice did not start.")
+                time.sleep(0.1)
+        self.desktop = context.ServiceManager.createInstanceWithContext("com.sun.star.frame.Desktop", context)
+
+    def convert(self, input_path, output_path):
+        if self.desktop is not None:
+            self._convert_uno(input_path, output_path)
+        else:
+            self._convert_cli(input_path, output_path)
+
+    def _convert_uno(self, input_path, output_path):
+        import uno
+        from com.sun.star.beans import PropertyValue
+
+        def properties(**values):
+            result = []
+            for name, value in values.items():
+                prop = PropertyValue()
+                prop.Name = name
+                prop.Value = value
+                result.append(prop)
+            return tuple(result)
+
+        url = uno.systemPathToFileUrl(os.path.abspath(input_path))
+        doc = self.desktop.loadComponentFromURL(url, "_blank", 0, properties(Hidden=True, ReadOnly=True))
+        if doc is None:
+            raise ValueError(f"LibreOffice could not open {os.path.basename(input_path)}.")
+        try:
+            doc.storeToURL(uno.systemPathToFileUrl(os.path.abspath(output_path)), properties(FilterName="writer_pdf_Export"))
+        finally:
+            doc.close(True)
+
+    def _convert_cli(self, input_path, output_path):
+        output_dir = tempfile.mkdtemp(prefix="filenode-office-out-")
+        try:
+            completed = subprocess.run(
+                self._command("--convert-to", "pdf:writer_pdf_Export", "--outdir", output_dir, os.path.abspath(input_path)),
+                stdin=subprocess.DEVNULL, capture_output=True, timeout=600,
+            )
+            produced = os.path.join(output_dir, os.path.splitext(os.path.basename(input_path))[0] + ".pdf")
+            if not os.path.exists(produced):
+                message = completed.stderr.decode("utf-8", "replace").strip()
+                raise RuntimeError(f"LibreOffice could not convert {os.path.basename(input_path)}: {message}")
+            shutil.move(produced, output_path)
+        finally:
+            shutil.rmtree(output_dir, ignore_errors=True)
+
+    def close(self):
+        if self.desktop is not None:
+            try:
+                self.desktop.terminate()
+            except Exception:
+                # The bridge goes down with the office
+                pass
+            self.desktop = None
+        if self.process is not None:
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+            self.process = None
+        shutil.rmtree(self.profile, ignore_errors=True)
+
+class Docx2PdfBackend:
+    # docx2pdf drives Word on macOS; it starts Word for every file
+    name = "docx2pdf"
+    max_instances = 1
+
+    @staticmethod
+    def available():
+        return sys.platform == "darwin" and importlib.util.find_spec("docx2pdf") is not None
+
+    def __init__(self):
+        require("docx2pdf")
+
+    def convert(self, input_path, output_path):
+        deps.docx2pdf_convert(input_path, output_path)
+
+    def close(self):
+        pass
+
+class TextBackend:
+    # Pure Python: python-docx reads the body and TextPdfWriter sets it as plain
+    # text. Runs anywhere without an office suite, but keeps the words and not
+    # the layout.
+    name = "text"
+    max_instances = 1
+
+    @staticmethod
+    def available():
+        return importlib.util.find_spec("docx") is not None
+
+    def __init__(self):
+        require("docx", "pdf")
+
+    def convert(self, input_path, output_path):
+        doc = deps.Document(input_path)
+        writer = TextPdfWriter(output_path)
+        try:
+            rows = []
+            for row in docx_text_rows(doc, writer.columns):
+                if row is None:
+                    if rows:
+                        writer.add_page(rows)
+                        rows = []
+                    continue
+                rows.append(row)
+                if len(rows) == writer.rows:
+                    writer.add_page(rows)
+                    rows = []
+            if rows or not writer.page_count:
+                writer.add_page(rows)
+            writer.close()
+        except BaseException:
+            writer.abort()
+            raise
+
+    def close(self):
+        pass
+
+# Tried in this order when no backend is named
+DOCX_BACKENDS = {
+    "word": WordBackend,
+    "office": OfficeBackend,
+    "docx2pdf": Docx2PdfBackend,
+    "text": TextBackend,
+}
+
+def docx_backend(name=None):
+    # The named backend, else FILENODE_DOCX_BACKEND, else the first that works here
+    name = name or os.environ.get("FILENODE_DOCX_BACKEND")
+    if name:
+        if name not in DOCX_BACKENDS:
+            raise ValueError(f"Unknown DOCX backend '{name}'. Choose from: {', '.join(DOCX_BACKENDS)}.")
+        if not DOCX_BACKENDS[name].available():
+            raise ValueError(f"The {name} DOCX backend is not available on this machine.")
+        return DOCX_BACKENDS[name]
+    for backend in DOCX_BACKENDS.values():
+        if backend.available():
+            return backend
+    raise ValueError("No DOCX converter found. Install LibreOffice or python-docx.")
+
+class DocxConverterPool:
+    # Keeps up to max_instances of a backend warm. Each instance lives on its
+    # own thread for its whole life (Word's COM objects must stay on the thread
+    # that made them) and takes conversions from a shared queue, so only the
+    # first file pays for starting the backend.
+    def __init__(self, backend):
+        self.backend = backend
+        self.requests = queue.Queue()
+        self.threads = []
+        self.idle = 0
+        self.lock = threading.Lock()
+
+    def _submit(self, input_path, output_path):
+        future = Future()
+        with self.lock:
+            if self.idle <= self.requests.qsize() and len(self.threads) < self.backend.max_instances:
+                thread = threading.Thread(target=self._serve, name=f"docx-{self.backend.name}", daemon=True)
+                self.threads.append(thread)
+                thread.start()
+            self.requests.put((input_path, output_path, future))
+        return future
+
+    def warm(self):
+        # Starts an instance ahead of the first file
+        return self._submit(None, None)
+
+    def convert(self, input_path, output_path, cancel_token=None):
+        future = self._submit(input_path, output_path)
+        while True:
+            try:
+                return future.result(timeout=0.1)
+            except TimeoutError:
+                if cancel_token is None or not cancel_token.cancelled:
+                    continue
+                if not future.cancel():
+                    # Already converting and the backend cannot be interrupted;
+                    # drop what it writes once it finishes
+                    future.add_done_callback(lambda f: remove_files([output_path]))
+                cancel_token.check()
+
+    def _serve(self):
+        instance = None
+        while True:
+            with self.lock:
+                self.idle += 1
+            request = self.requests.get()
+            with self.lock:
+                self.idle -= 1
+            if request is None:
+                break
+            input_path, output_path, future = request
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                if instance is None:
+                    with tracer.span("start backend", "docx", backend=self.backend.name):
+                        instance = self.backend()
+                if input_path is not None:
+                    with tracer.span("convert", "docx", backend=self.backend.name, input=input_path):
+                        instance.convert(input_path, output_path)
+                future.set_result(output_path)
+            except BaseException as e:
+                # The next request starts a fresh instance in case this one is wedged
+                if instance is not None:
+                    try:
+                        instance.close()
+                    except Exception:
+                        pass
+                    instance = None
+                future.set_exception(e)
+        if instance is not None:
+            instance.close()
+
+    def close(self):
+        with self.lock:
+            threads = list(self.threads)
+            self.threads = []
+        for _ in threads:
+            self.requests.put(None)
+        for thread in threads:
+            thread.join(timeout=30)
+
+_docx_pools = {}
+_docx_pools_lock = threading.Lock()
+
+def docx_converter_pool(name=None):
+    # One pool per backend per process, kept until exit so the next file (or
+    # the next batch job in this worker) finds the converter already running
+    backend = docx_backend(name)
+    with _docx_pools_lock:
+        if not _docx_pools:
+            # multiprocessing runs its finalizers at interpreter exit and when a
+            # pool worker process ends, which skips atexit. A forked worker drops
+            # the parent's, so each process registers its own.
+            multiprocessing.util.Finalize(None, close_docx_pools, exitpriority=10)
+        pool = _docx_pools.get(backend.name)
+        if pool is None:
+            pool = _docx_pools[backend.name] = DocxConverterPool(backend)
+    return pool
+
+def close_docx_pools():
+    with _docx_pools_lock:
+        pools = list(_docx_pools.values())
+        _docx_pools.clear()
+    for pool in pools:
+        pool.close()
+
+def _forget_docx_pools():
+    # A forked child has none of the parent's converter threads
+    global _docx_pools_lock
+    _docx_pools.clear()
+    _docx_pools_lock = threading.Lock()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget_docx_pools)
@@ -0,0 +1,444 @@
+# Streaming PDF writers: page copies, text pages and the optimizing rewrite
+
+import io
+import os
+import re
+import hashlib
+import zlib
+from collections import deque
+
+from FileNode import deps
+from FileNode.deps import require
+from FileNode.files import remove_files
+from FileNode.jobs import JobCancelled
+from FileNode.documents import open_pdf, parse_page_ranges
+
+class PdfStreamWriter:
+    # Writes a PDF one object at a time so pages can be copied from any number of
+    # sources while only one source is open and its objects are dropped once written.
+    CATALOG_ID = 1
+    PAGES_ID = 2
+
+    def __init__(self, output_path, cache_limit=4096):
+        # output_path may also be a binary file object, which is left open
+        require("pdf")
+        self.output_path = output_path
+        self.cache_limit = cache_limit
+        self.offsets = [None, None, None]
+        self.kids = []
+        self.catalog_entries = {}
+        self.owns_file = not hasattr(output_path, "write")
+        self.file = open(output_path, "wb") if self.owns_file else output_path
+        self.file.write(b"%PDF-1.7\n%\xe2\xe3\xcf\xd3\n")
+
+    def tell(self):
+        return self.file.tell()
+
+    def _allocate(self):
+        self.offsets.append(None)
+        return len(self.offsets) - 1
+
+    def _write_object(self, idnum, obj):
+        self.offsets[idnum] = self.file.tell()
+        self.file.write(f"{idnum} 0 obj\n".encode())
+        obj.write_to_stream(self.file, None)
+        self.file.write(b"\nendobj\n")
+
+    def _copy(self, obj, ref_for):
+        if isinstance(obj, deps.IndirectObject):
+            return ref_for(obj)
+        if isinstance(obj, deps.StreamObject):
+            new = deps.DecodedStreamObject() if isinstance(obj, deps.DecodedStreamObject) else deps.EncodedStreamObject()
+            new._data = obj._data
+            for key, value in obj.items():
+                if key != "/Length":
+                    new[key] = self._copy(value, ref_for)
+            return new
+        if isinstance(obj, deps.DictionaryObject):
+            new = deps.DictionaryObject()
+            for key, value in obj.items():
+                new[key] = self._copy(value, ref_for)
+            return new
+        if isinstance(obj, deps.ArrayObject):
+            return deps.ArrayObject(self._copy(value, ref_for) for value in obj)
+        return obj
+
+    def object_key(self, ref):
+        # Source objects with the same key are written once; subclasses widen
+        # this to merge identical objects
+        return (ref.idnum, ref.generation)
+
+    def replace_object(self, ref, obj):
+        return obj
+
+    def add_pages(self, reader, page_indices, catalog_keys=(), on_page=None):
+        # catalog_keys names document-level entries (bookmarks, form fields...)
+        # to carry over; they are copied after the pages they point into.
+        mapping = {}
+        pending = deque()
+        pages = []
+        # Reserve every selected page first so links between them resolve
+        for index in page_indices:
+            page = reader.pages[index]
+            page_id = self._allocate()
+            self.kids.append(page_id)
+            if page.indirect_reference is not None:
+                mapping.setdefault(self.object_key(page.indirect_reference), page_id)
+            pages.append((page_id, page))
+        page_ids = set(mapping.values())
+
+        def ref_for(ref):
+            key = self.object_key(ref)
+            if key not in mapping:
+                mapping[key] = self._allocate()
+                pending.append((ref, mapping[key]))
+            return deps.IndirectObject(mapping[key], 0, None)
+
+        def drain():
+            while pending:
+                ref, new_id = pending.popleft()
+                obj = ref.get_object()
+                # Pages that were not selected (and the source page tree) are not copied
+                if obj is None or (isinstance(obj, deps.DictionaryObject) and obj.get("/Type") in ("/Page", "/Pages") and new_id not in page_ids):
+                    obj = deps.NullObject()
+                else:
+                    obj = self._copy(self.replace_object(ref, obj), ref_for)
+                self._write_object(new_id, obj)
+
+        for done, (page_id, page) in enumerate(pages, 1):
+            copy = self._copy(page, ref_for)
+            copy[deps.NameObject("/Parent")] = deps.IndirectObject(self.PAGES_ID, 0, None)
+            self._write_object(page_id, copy)
+            drain()
+            if len(reader.resolved_objects) > self.cache_limit:
+                reader.resolved_objects.clear()
+            if on_page:
+                on_page(done, len(pages))
+        root = reader.trailer["/Root"]
+        for key in catalog_keys:
+            if key in root:
+                self.catalog_entries[deps.NameObject(key)] = self._copy(root.raw_get(key), ref_for)
+                drain()
+
+    def close(self):
+        kids = deps.ArrayObject(deps.IndirectObject(k, 0, None) for k in self.kids)
+        pages = deps.DictionaryObject({
+            deps.NameObject("/Type"): deps.NameObject("/Pages"),
+            deps.NameObject("/Kids"): kids,
+            deps.NameObject("/Count"): deps.NumberObject(len(self.kids)),
+        })
+        self._write_object(self.PAGES_ID, pages)
+        catalog = deps.DictionaryObject(self.catalog_entries)
+        catalog.update({
+            deps.NameObject("/Type"): deps.NameObject("/Catalog"),
+            deps.NameObject("/Pages"): deps.IndirectObject(self.PAGES_ID, 0, None),
+        })
+        self._write_object(self.CATALOG_ID, catalog)
+        xref_offset = self.file.tell()
+        self.file.write(f"xref\n0 {len(self.offsets)}\n0000000000 65535 f \n".encode())
+        for offset in self.offsets[1:]:
+            self.file.write(f"{offset:010d} 00000 n \n".encode())
+        self.file.write(
+            f"trailer\n<< /Size {len(self.offsets)} /Root {self.CATALOG_ID} 0 R >>\n"
+            f"startxref\n{xref_offset}\n%%EOF\n".encode()
+        )
+        self.bytes_written = self.file.tell()
+        if self.owns_file:
+            self.file.close()
+
+    def abort(self):
+        if self.owns_file:
+            self.file.close()
+            if os.path.exists(self.output_path):
+                os.remove(self.output_path)
+
+class TextPdfWriter(PdfStreamWriter):
+    # Lays plain text out in Courier, a page at a time, straight into the output.
+    # Only object offsets are kept between pages.
+    def __init__(self, output_path, font_size=9, page_size=(595, 842), margin=36):
+        super().__init__(output_path)
+        self.font_size = font_size
+        self.page_size = page_size
+        self.margin = margin
+        self.leading = font_size * 1.2
+        # Courier glyphs are 0.6 em wide
+        self.columns = int((page_size[0] - 2 * margin) / (font_size * 0.6))
+        self.rows = int((page_size[1] - 2 * margin) / self.leading)
+        self.font_id = self._allocate()
+        self._write_object(self.font_id, deps.DictionaryObject({
+            deps.NameObject("/Type"): deps.NameObject("/Font"),
+            deps.NameObject("/Subtype"): deps.NameObject("/Type1"),
+            deps.NameObject("/BaseFont"): deps.NameObject("/Courier"),
+            deps.NameObject("/Encoding"): deps.NameObject("/WinAnsiEncoding"),
+        }))
+
+    @property
+    def page_count(self):
+        return len(self.kids)
+
+    def add_page(self, rows):
+        top = self.page_size[1] - self.margin - self.font_size
+        head = f"BT /F1 {self.font_size} Tf {self.leading:.2f} TL {self.margin} {top:.2f} Td\n".encode()
+        # Rows never contain newlines, so the page is escaped in one go and split on them
+        text = "\n".join(rows).encode("cp1252", "replace")
+        text = text.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+        content = deps.DecodedStreamObject()
+        content.set_data(head + b"(" + text.replace(b"\n", b") Tj T*\n(") + b") Tj T*\nET")
+        content_id = self._allocate()
+        page_id = self._allocate()
+        self.kids.append(page_id)
+        self._write_object(content_id, content.flate_encode())
+        self._write_object(page_id, deps.DictionaryObject({
+            deps.NameObject("/Type"): deps.NameObject("/Page"),
+            deps.NameObject("/Parent"): deps.IndirectObject(self.PAGES_ID, 0, None),
+            deps.NameObject("/MediaBox"): deps.ArrayObject(deps.NumberObject(v) for v in (0, 0) + tuple(self.page_size)),
+            deps.NameObject("/Resources"): deps.DictionaryObject({
+                deps.NameObject("/Font"): deps.DictionaryObject({deps.NameObject("/F1"): deps.IndirectObject(self.font_id, 0, None)}),
+            }),
+            deps.NameObject("/Contents"): deps.IndirectObject(content_id, 0, None),
+        }))
+
+class PdfOptimizer(PdfStreamWriter):
+    # Writes identical objects once. Each object is keyed by a hash of its
+    # contents with the objects it points to hashed in place of their references,
+    # so two copies of a font (dictionary, widths and font file) collapse into one.
+    # Pages keep their identity. Streams stored uncompressed are deflated, and
+    # images in `images` (hash -> (JPEG data, width, height)) replace the originals.
+    CATALOG_KEYS = (
+        "/Outlines", "/Names", "/Dests", "/AcroForm", "/PageLabels", "/ViewerPreferences", "/PageMode",
+        "/PageLayout", "/OpenAction", "/Metadata", "/Lang", "/MarkInfo", "/StructTreeRoot", "/OCProperties",
+    )
+
+    def __init__(self, output_path, images=None):
+        super().__init__(output_path)
+        self.images = images or {}
+        self.digests = {}
+
+    @property
+    def duplicates(self):
+        # Source objects that were dropped as copies of another
+        return len(self.digests) - len(set(self.digests.values()))
+
+    def object_key(self, ref):
+        try:
+            return self._digest(ref, set())
+        except RecursionError:
+            return (ref.idnum, ref.generation)
+
+    def _digest(self, ref, active):
+        key = (ref.idnum, ref.generation)
+        if key in self.digests:
+            return self.digests[key]
+        if key in active:
+            # A reference cycle; fall back to identity so nothing is merged wrongly
+            return key
+        obj = ref.get_object()
+        if obj is None or (isinstance(obj, deps.DictionaryObject) and obj.get("/Type") in ("/Page", "/Pages")):
+            digest = key
+        else:
+            active.add(key)
+            h = hashlib.sha256()
+            self._feed(h, obj, active)
+            active.discard(key)
+            digest = h.digest()
+        self.digests[key] = digest
+        return digest
+
+    def _feed(self, h, obj, active):
+        if isinstance(obj, deps.IndirectObject):
+            digest = self._digest(obj, active)
+            h.update(b"R" + (digest if isinstance(digest, bytes) else repr(digest).encode()))
+        elif isinstance(obj, deps.DictionaryObject):
+            if isinstance(obj, deps.StreamObject):
+                h.update(b"S" + hashlib.sha256(obj._data).digest())
+            h.update(b"D%d" % len(obj))
+            for key in sorted(obj):
+                if key != "/Length":
+                    h.update(key.encode("utf-8", "surrogatepass") + b"\0")
+                    self._feed(h, obj.raw_get(key), active)
+        elif isinstance(obj, deps.ArrayObject):
+            h.update(b"A%d" % len(obj))
+            for item in obj:
+                self._feed(h, item, active)
+        else:
+            h.update(type(obj).__name__.encode() + repr(obj).encode("utf-8", "surrogatepass") + b"\0")
+
+    def replace_object(self, ref, obj):
+        if not isinstance(obj, deps.StreamObject):
+            return obj
+        image = self.images.get(self.object_key(ref))
+        if image is not None:
+            data, width, height = image
+            skip = ("/Length", "/Filter", "/DecodeParms", "/Width", "/Height")
+            filters = {deps.NameObject("/Filter"): deps.NameObject("/DCTDecode"), deps.NameObject("/Width"): deps.NumberObject(width), deps.NameObject("/Height"): deps.NumberObject(height)}
+        elif "/Filter" not in obj and len(obj._data) > 64:
+            data = zlib.compress(obj._data, 9)
+            skip = ("/Length",)
+            filters = {deps.NameObject("/Filter"): deps.NameObject("/FlateDecode")}
+        else:
+            return obj
+        new = deps.EncodedStreamObject()
+        new._data = data
+        for key, value in obj.items():
+            if key not in skip:
+                new[key] = value
+        new.update(filters)
+        return new
+
+def pdf_image_limits(reader, max_dpi):
+    # Every image XObject on the pages (and in forms they draw), with the most
+    # pixels its longer side needs: max_dpi across the longer side of the
+    # largest page it appears on, since an image cannot be drawn bigger than that.
+    found = {}
+    for page in reader.pages:
+        box = page.mediabox
+        limit = int(max_dpi * max(float(box.width), float(box.height)) / 72)
+        resources = [page.get("/Resources")]
+        seen = set()
+        while resources:
+            res = resources.pop()
+            res = res.get_object() if res is not None else None
+            if not isinstance(res, deps.DictionaryObject):
+                continue
+            xobjects = res.get("/XObject")
+            if not isinstance(xobjects, deps.DictionaryObject):
+                continue
+            for ref in xobjects.values():
+                if not isinstance(ref, deps.IndirectObject):
+                    continue
+                key = (ref.idnum, ref.generation)
+                obj = ref.get_object()
+                subtype = obj.get("/Subtype") if isinstance(obj, deps.DictionaryObject) else None
+                if subtype == "/Image":
+                    found[key] = (ref, max(limit, found.get(key, (None, 0))[1]))
+                elif subtype == "/Form" and key not in seen:
+                    seen.add(key)
+                    resources.append(obj.get("/Resources"))
+    return found
+
+def pdf_image_job(obj, quality, max_pixels):
+    # Arguments for recompress_pdf_image, or None for images it cannot take:
+    # only 8-bit gray or RGB that is JPEG or plain Flate data
+    if obj.get("/ImageMask") or obj.get("/Decode") is not None or obj.get("/BitsPerComponent") != 8:
+        return None
+    filters = obj.get("/Filter")
+    filters = list(filters) if isinstance(filters, deps.ArrayObject) else [filters]
+    if filters == ["/DCTDecode"]:
+        kind = "jpeg"
+    elif filters == ["/FlateDecode"] and obj.get("/DecodeParms") is None:
+        kind = "flate"
+    else:
+        return None
+    colorspace = obj.get("/ColorSpace")
+    components = {"/DeviceGray": 1, "/DeviceRGB": 3}.get(colorspace)
+    if isinstance(colorspace, deps.ArrayObject) and colorspace and colorspace[0] == "/ICCBased":
+        components = colorspace[1].get_object().get("/N")
+    mode = {1: "L", 3: "RGB"}.get(components)
+    if mode is None:
+        return None
+    return (bytes(obj._data), kind, mode, int(obj["/Width"]), int(obj["/Height"]), max_pixels, quality)
+
+def recompress_pdf_image(data, kind, mode, width, height, max_pixels, quality):
+    # Runs in a pool worker. Returns (JPEG data, width, height), or None when the
+    # result would not be meaningfully smaller than what the PDF already holds.
+    require("image")
+    if kind == "jpeg":
+        img = deps.Image.open(io.BytesIO(data))
+        if img.mode != mode:
+            return None
+        img.draft(mode, (max_pixels, max_pixels))
+    else:
+        img = deps.Image.frombytes(mode, (width, height), zlib.decompress(data))
+    if max(img.size) > max_pixels:
+        img.thumbnail((max_pixels, max_pixels), deps.Image.LANCZOS, reducing_gap=2.0)
+    buf = io.BytesIO()
+    img.save(buf, "JPEG", quality=int(quality), optimize=True)
+    if buf.tell() > len(data) * 0.9:
+        return None
+    return buf.getvalue(), img.width, img.height
+
+CONTROL_CHARS = re.compile("[\x00-\x08\x0b-\x1f\x7f]")
+
+def wrap_text_rows(lines, columns, tab_size=8):
+    # Yields rows of at most columns characters. lines may be pieces of a longer
+    # line (no trailing newline), as readline(limit) returns them.
+    carry = ""
+    for piece in lines:
+        ends = piece.endswith("\n")
+        text = carry + CONTROL_CHARS.sub("", piece.rstrip("\r\n").expandtabs(tab_size))
+        wrapped = False
+        while len(text) > columns:
+            yield text[:columns]
+            text = text[columns:]
+            wrapped = True
+        if ends:
+            if text or not wrapped:
+                yield text
+            carry = ""
+        else:
+            carry = text
+    if carry:
+        yield carry
+
+def text_pages(f, columns, rows_per_page, read_size=1 << 16):
+    # The text read from f, wrapped and cut into pages of rows. Reads at most
+    # read_size characters at a time; an empty file still gives one blank page.
+    rows = []
+    pages = 0
+    for row in wrap_text_rows(iter(lambda: f.readline(read_size), ""), columns):
+        rows.append(row)
+        if len(rows) == rows_per_page:
+            yield rows
+            rows = []
+            pages += 1
+    if rows or not pages:
+        yield rows
+
+def plan_pdf_chunks(input_path, page_count, ranges=None, pages_per_file=None, output_dir="."):
+    require("pdf")
+    # Returns (page indices, output path) for every file a split should produce
+    stem = os.path.splitext(os.path.basename(input_path))[0]
+    chunks = []
+    if pages_per_file:
+        width = len(str(page_count))
+        for start in range(0, page_count, pages_per_file):
+            end = min(start + pages_per_file, page_count)
+            if pages_per_file == 1:
+                name = f"{stem}_{start + 1:0{width}d}.pdf"
+            else:
+                name = f"{stem}_{start + 1:0{width}d}-{end:0{width}d}.pdf"
+            chunks.append((list(range(start, end)), os.path.join(output_dir, name)))
+    else:
+        for spec in ranges:
+            name = f"{stem}_{spec.replace(' ', '').replace(',', '_')}.pdf"
+            chunks.append((parse_page_ranges(spec, page_count), os.path.join(output_dir, name)))
+    return chunks
+
+def write_pdf_chunks(input_path, ranges=None, pages_per_file=None, output_dir=".", share=0, shares=1, on_chunk=None, stop_event=None):
+    # Writes this worker's contiguous share of the chunks from one parse of the
+    # input (the shared one when run in the calling process). If it is stopped or
+    # fails part way, the files it already wrote are removed.
+    outputs = []
+    try:
+        with open_pdf(input_path) as doc, doc.lock:
+            reader = doc.reader
+            chunks = plan_pdf_chunks(input_path, doc.page_count, ranges, pages_per_file, output_dir)
+            per_share = -(-len(chunks) // shares)
+            mine = chunks[share * per_share:(share + 1) * per_share]
+            for indices, output_path in mine:
+                if stop_event is not None and stop_event.is_set():
+                    raise JobCancelled("Operation cancelled.")
+                writer = PdfStreamWriter(output_path)
+                try:
+                    writer.add_pages(reader, indices)
+                    writer.close()
+                except BaseException:
+                    writer.abort()
+                    raise
+                outputs.append(output_path)
+                if on_chunk:
+                    on_chunk(len(outputs), len(mine), os.path.getsize(output_path))
+    except BaseException:
+        remove_files(outputs)
+        raise
+    return outputs
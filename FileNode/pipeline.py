@@ -0,0 +1,481 @@
+# Chained tool steps that pass values in memory
+
+import time
+import io
+import os
+import re
+import shlex
+import argparse
+import itertools
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from FileNode import deps
+from FileNode.deps import require
+from FileNode.files import copy_file, remove_files
+from FileNode.tracing import traced, tracer
+from FileNode.workers import submit_bounded, worker_context
+from FileNode.jobs import CancelToken
+from FileNode.workspace import Workspace
+from FileNode.documents import PdfDocument, _init_text_worker, extract_page_texts, open_pdf, parse_page_ranges
+from FileNode.pdf_writer import PdfStreamWriter, TextPdfWriter, text_pages
+from FileNode.office import DocxStreamWriter
+from FileNode.images import encode_image, encoder_options, image_format_choice, load_image, prepare_for_format
+from FileNode.tools import PDFTools, ToolBase, WordTools
+from FileNode.batch import add_tool_arguments, batch_options
+
+class PageSet:
+    # The pages a pipeline step hands on: (PdfDocument, page index) pairs in
+    # order. Cutting and merging only rearrange these pairs; pages are copied
+    # when the set is saved or a step needs it as one document.
+    suffix = ".pdf"
+
+    def __init__(self, pages):
+        self.pages = list(pages)
+
+    @classmethod
+    def of(cls, doc):
+        return cls((doc, i) for i in range(doc.page_count))
+
+    def select(self, spec):
+        return PageSet(self.pages[i] for i in parse_page_ranges(spec, len(self.pages)))
+
+    def whole_document(self):
+        # The document when the set is all of one, in order; otherwise None
+        doc = self.pages[0][0] if self.pages else None
+        if doc is None or any(page[0] is not doc for page in self.pages):
+            return None
+        if [index for _, index in self.pages] != list(range(doc.page_count)):
+            return None
+        return doc
+
+    def write_to(self, output):
+        # Copies the pages into output (a path or binary file), one run of pages
+        # from the same document at a time
+        writer = PdfStreamWriter(output)
+        try:
+            for doc, run in itertools.groupby(self.pages, key=lambda page: page[0]):
+                with doc.lock:
+                    writer.add_pages(doc.reader, [index for _, index in run])
+            writer.close()
+        except BaseException:
+            writer.abort()
+            raise
+
+    def document(self, name):
+        # The set as one PdfDocument, built in memory unless it already is one
+        doc = self.whole_document()
+        if doc is None:
+            buf = io.BytesIO()
+            self.write_to(buf)
+            doc = PdfDocument(name, buf.getvalue())
+        return doc
+
+    def save(self, path):
+        # A whole document goes out as it is, anything else page by page
+        doc = self.whole_document()
+        if doc is None:
+            self.write_to(path)
+        elif doc.file is None:
+            with open(path, "wb") as f:
+                f.write(doc.buffer.getbuffer())
+        else:
+            copy_file(doc.path, path)
+
+class Blob:
+    # A file a pipeline step hands on whole: bytes made in memory, or an input
+    # file read where it lies. suffix is the extension it is saved with.
+    def __init__(self, data=None, path=None, suffix=""):
+        self.data = data
+        self.path = path
+        self.suffix = suffix
+
+    def open(self):
+        return open(self.path, "rb") if self.data is None else io.BytesIO(self.data)
+
+    def save(self, path):
+        if self.data is None:
+            copy_file(self.path, path)
+        else:
+            with open(path, "wb") as f:
+                f.write(self.data)
+
+# input extension -> kind of value it loads as; any image Pillow opens is an "image"
+PIPELINE_KINDS = {".pdf": "pdf", ".docx": "docx", ".txt": "text", ".log": "text"}
+
+def pipeline_kind(path):
+    ext = os.path.splitext(path)[1].lower()
+    kind = PIPELINE_KINDS.get(ext)
+    if kind is None:
+        require("image")
+        if ext in deps.Image.registered_extensions():
+            kind = "image"
+    if kind is None:
+        raise ValueError(f"{os.path.basename(path)}: no pipeline step reads {ext or 'files without an extension'}.")
+    return kind
+
+def load_pipeline_input(path, opened):
+    # opened collects the shared documents taken, for the caller to release
+    if pipeline_kind(path) == "pdf":
+        doc = open_pdf(path)
+        opened.append(doc)
+        return PageSet.of(doc)
+    return Blob(path=path, suffix=os.path.splitext(path)[1].lower())
+
+def prefetch_page_texts(doc, indices, workers, token, batch_size=16):
+    # Extracts the text of the pages in indices that is not cached yet, in
+    # batches across worker processes that each open the file once
+    missing = sorted({index for index in indices if index not in doc.texts})
+    batches = []
+    for _, run in itertools.groupby(enumerate(missing), lambda item: item[1] - item[0]):
+        run = [index for _, index in run]
+        batches.extend((start, min(start + batch_size, run[-1] + 1)) for start in range(run[0], run[-1] + 1, batch_size))
+    workers = min(workers, len(batches))
+    if workers < 2:
+        return
+    with ProcessPoolExecutor(
+        max_workers=workers, mp_context=worker_context(),
+        initializer=_init_text_worker, initargs=(doc.path,),
+    ) as pool:
+        calls = ((start, extract_page_texts, (start, end)) for start, end in batches)
+        for start, future in submit_bounded(pool, calls, workers * 2):
+            token.check()
+            for index, text in enumerate(future.result(), start):
+                doc.texts[index] = text
+
+def _step_pages(step, values, token):
+    return values[0].select(step.options["pages"])
+
+def _step_merge(step, values, token):
+    return PageSet(page for pages in values for page in pages.pages)
+
+def _step_pdf_to_word(step, values, token):
+    pages = values[0]
+    workers = step.options.get("page_workers") or 1
+    if workers > 1:
+        documents = {}
+        for doc, index in pages.pages:
+            if doc.file is not None:
+                documents.setdefault(doc, []).append(index)
+        for doc, indices in documents.items():
+            prefetch_page_texts(doc, indices, workers, token)
+    buf = io.BytesIO()
+    writer = DocxStreamWriter(buf)
+    try:
+        for doc, index in pages.pages:
+            token.check()
+            text = doc.page_text(index)
+            if text:
+                writer.add_paragraph(text)
+        writer.close()
+    except BaseException:
+        writer.abort()
+        raise
+    return Blob(buf.getvalue(), suffix=".docx")
+
+def _step_optimize(step, values, token):
+    # The pages pass on unchanged when the rewrite comes out no smaller
+    doc = values[0].document(f"<{step.name}>")
+    quality = None if step.options.get("keep_images") else step.options.get("quality") or 75
+    buf = io.BytesIO()
+    with doc.lock:
+        # Steps already run side by side; recompress this one's images in-process
+        PDFTools(None, token).write_optimized(doc.reader, buf, quality, step.options.get("max_dpi") or 150, workers=1)
+    if buf.tell() >= doc.stamp[0]:
+        return values[0]
+    return PageSet.of(PdfDocument(f"<{step.name}>", buf.getvalue()))
+
+def _step_text_to_pdf(step, values, token):
+    buf = io.BytesIO()
+    writer = TextPdfWriter(buf)
+    with values[0].open() as raw, io.TextIOWrapper(raw, encoding="utf-8", errors="replace") as f:
+        for rows in text_pages(f, writer.columns, writer.rows):
+            token.check()
+            writer.add_page(rows)
+    writer.close()
+    return PageSet.of(PdfDocument(f"<{step.name}>", buf.getvalue()))
+
+def _step_docx_to_pdf(step, values, token):
+    # The converters only read and write files, so this step goes through a workspace
+    with Workspace() as workspace:
+        source = values[0].path
+        if source is None:
+            source = workspace.path_for("input.docx")
+            with open(source, "wb") as f:
+                f.write(values[0].data)
+        output = workspace.path_for("output.pdf")
+        WordTools(None, token).convert_docx_to_pdf(source, output, step.options.get("docx_backend"))
+        with open(output, "rb") as f:
+            data = f.read()
+    return PageSet.of(PdfDocument(f"<{step.name}>", data))
+
+def _step_reduce_image(step, values, token):
+    with values[0].open() as f:
+        img = load_image(f, step.options.get("max_dimension"))
+    token.check()
+    img = prepare_for_format(img, "JPEG")
+    return Blob(encode_image(img, "JPEG", step.options.get("quality") or 70), suffix=".jpg")
+
+def _step_convert_image(step, values, token):
+    fmt, ext = image_format_choice(step.options["format"])
+    save_options = encoder_options(fmt, step.options.get("quality"), step.options.get("lossless"), step.options.get("effort"))
+    with values[0].open() as f:
+        img = load_image(f, step.options.get("max_dimension"))
+    token.check()
+    img = prepare_for_format(img, fmt)
+    buf = io.BytesIO()
+    with tracer.span("encode", "image", format=fmt):
+        img.save(buf, fmt, **save_options)
+    return Blob(buf.getvalue(), suffix=ext)
+
+# step -> (function, kind it reads, kind it hands on, values it reads; None for one or more)
+PIPELINE_STEPS = {
+    "pages": (_step_pages, "pdf", "pdf", 1),
+    "merge": (_step_merge, "pdf", "pdf", None),
+    "pdf-to-word": (_step_pdf_to_word, "pdf", "docx", 1),
+    "optimize": (_step_optimize, "pdf", "pdf", 1),
+    "text-to-pdf": (_step_text_to_pdf, "text", "pdf", 1),
+    "docx-to-pdf": (_step_docx_to_pdf, "docx", "pdf", 1),
+    "reduce-image": (_step_reduce_image, "image", "image", 1),
+    "convert-image": (_step_convert_image, "image", "image", 1),
+}
+
+def pipeline_step_options(op, args):
+    # A step's options, written as the batch flags ("--pages 10-40").
+    # Raises ValueError with a message for the user.
+    parser = add_tool_arguments(argparse.ArgumentParser(prog=f"FileNode pipeline {op}", add_help=False, exit_on_error=False))
+    try:
+        parsed, extra = parser.parse_known_args(shlex.split(args or ""))
+    except argparse.ArgumentError as e:
+        raise ValueError(f"{op}: {e}") from None
+    if extra:
+        raise ValueError(f"{op}: unknown option {extra[0]}.")
+    if parsed.burst or parsed.max_pages or parsed.target_kb:
+        raise ValueError(f"{op}: --burst, --max-pages and --target-kb do not apply in a pipeline.")
+    if op == "pages":
+        if not parsed.pages or ";" in parsed.pages:
+            raise ValueError("pages needs one page range, e.g. --pages 10-40 or --pages 1-5,8.")
+        return {"pages": parsed.pages}
+    return batch_options(parsed, op)
+
+class PipelineStep:
+    def __init__(self, name, op, sources, args="", output=None):
+        self.name = name
+        self.op = op
+        self.sources = list(sources)
+        self.args = args or ""
+        self.output = output or None
+        self.options = pipeline_step_options(op, self.args)
+
+    def describe(self):
+        text = f"{self.name} = {self.op}({', '.join(self.sources)})"
+        if self.args:
+            text += f" {self.args}"
+        if self.output:
+            text += f" → {self.output}"
+        return text
+
+class Pipeline:
+    # A recipe: named inputs, given files when it runs, and steps that each read
+    # the values of inputs or earlier steps. Steps with an output are saved; the
+    # rest only feed later steps.
+    def __init__(self):
+        self.inputs = []
+        self.steps = OrderedDict()
+
+    @property
+    def names(self):
+        return set(self.inputs) | set(self.steps)
+
+    def unique_name(self, base):
+        base = re.sub(r"[^\w-]+", "_", base).strip("_") or "input"
+        name = base
+        n = 1
+        while name in self.names:
+            n += 1
+            name = f"{base}-{n}"
+        return name
+
+    def add_input(self, name):
+        if name in self.names:
+            raise ValueError(f"The name {name} is already used.")
+        self.inputs.append(name)
+        return name
+
+    def add_step(self, name, op, sources, args="", output=None):
+        # Raises ValueError with a message for the user
+        if isinstance(sources, str):
+            sources = [sources]
+        if name in self.names:
+            raise ValueError(f"The name {name} is already used.")
+        if op not in PIPELINE_STEPS:
+            raise ValueError(f"Unknown step {op}. Choose from: {', '.join(PIPELINE_STEPS)}.")
+        count = PIPELINE_STEPS[op][3]
+        if not sources or (count is not None and len(sources) != count):
+            raise ValueError(f"{op} reads {'one value' if count == 1 else 'one or more values'}.")
+        for source in sources:
+            if source not in self.names:
+                raise ValueError(f"{name} reads {source}, which is not an input or an earlier step.")
+        if output and output in (step.output for step in self.steps.values()):
+            raise ValueError(f"Two steps save to {output}.")
+        self.steps[name] = PipelineStep(name, op, sources, args, output)
+        return name
+
+    def remove_step(self, name):
+        readers = [step.name for step in self.steps.values() if name in step.sources]
+        if readers:
+            raise ValueError(f"{readers[0]} reads {name}; remove it first.")
+        del self.steps[name]
+
+    def kinds(self, input_kinds):
+        # The kind of value each input and step holds, from the inputs' kinds
+        # (missing ones are unknown and not checked). Raises ValueError where a
+        # step reads the wrong kind.
+        kinds = {name: input_kinds.get(name) for name in self.inputs}
+        for step in self.steps.values():
+            _, reads, gives, _ = PIPELINE_STEPS[step.op]
+            label = step.name if step.name == step.op else f"{step.name} ({step.op})"
+            for source in step.sources:
+                if kinds[source] not in (None, reads):
+                    raise ValueError(f"{label} needs {reads} input, but {source} gives {kinds[source]}.")
+            kinds[step.name] = gives
+        return kinds
+
+    def check(self, input_kinds):
+        self.kinds(input_kinds)
+        read = {source for step in self.steps.values() for source in step.sources}
+        if not any(step.output for step in self.steps.values()):
+            raise ValueError("Nothing is saved. Give at least one step an output.")
+        for step in self.steps.values():
+            if not step.output and step.name not in read:
+                raise ValueError(f"{step.name} is neither saved nor read by another step.")
+
+    def bind(self, tokens):
+        # Files for the inputs, from "name=path" tokens or plain paths in input order
+        files = {}
+        for token in tokens:
+            name, sep, path = token.partition("=")
+            if not sep or name not in self.inputs:
+                name = next((name for name in self.inputs if name not in files), None)
+                path = token
+                if name is None:
+                    raise ValueError(f"No input left for {token}.")
+            files[name] = path
+        missing = [name for name in self.inputs if name not in files]
+        if missing:
+            raise ValueError(f"No file for {', '.join(missing)}.")
+        return files
+
+    def to_recipe(self):
+        steps = []
+        for step in self.steps.values():
+            item = {"name": step.name, "op": step.op, "from": step.sources}
+            if step.args:
+                item["args"] = step.args
+            if step.output:
+                item["output"] = step.output
+            steps.append(item)
+        return {"inputs": list(self.inputs), "steps": steps}
+
+    @classmethod
+    def from_recipe(cls, recipe):
+        # Raises ValueError with a message for the user
+        pipeline = cls()
+        for name in recipe.get("inputs", []):
+            pipeline.add_input(name)
+        for item in recipe.get("steps", []):
+            try:
+                name = item.get("name") or pipeline.unique_name(item["op"])
+                pipeline.add_step(name, item["op"], item["from"], item.get("args", ""), item.get("output"))
+            except KeyError as e:
+                raise ValueError(f"A step has no {e.args[0]!r}.") from None
+        return pipeline
+
+class PipelineTools(ToolBase):
+    @traced
+    def run_pipeline(self, pipeline, files, output_dir=".", workers=None):
+        # files maps each input to a path. Inputs load and steps run on threads
+        # as soon as what they read is ready, up to `workers` at once, so
+        # independent branches overlap. Values stay in memory and are dropped once
+        # every step reading them has started; only outputs are written. If a
+        # step fails or the run is cancelled, outputs already written are removed.
+        # Returns a report per step.
+        self.begin()
+        pipeline.check({name: pipeline_kind(files[name]) for name in pipeline.inputs})
+        steps = list(pipeline.steps.values())
+        readers = {name: 0 for name in pipeline.inputs}
+        for step in steps:
+            readers[step.name] = 0
+            for source in step.sources:
+                readers[source] += 1
+        os.makedirs(output_dir, exist_ok=True)
+        workers = max(1, workers or os.cpu_count() or 1)
+        total = len(pipeline.inputs) + len(steps)
+        stop = CancelToken()
+        values = {}
+        reports = {}
+        outputs = []
+        opened = []
+
+        def load(name):
+            with tracer.span("load", "pipeline", input=files[name]):
+                return load_pipeline_input(files[name], opened)
+
+        def run(step, inputs):
+            start = time.perf_counter()
+            report = {"name": step.name, "op": step.op, "output": None, "bytes": 0}
+            with tracer.span(step.op, "pipeline", step=step.name):
+                value = PIPELINE_STEPS[step.op][0](step, inputs, stop)
+                if step.output:
+                    path = os.path.join(output_dir, step.output)
+                    if not os.path.splitext(path)[1]:
+                        path += value.suffix
+                    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+                    with tracer.span("save", "io", output=path), self.writing(path) as part_path:
+                        value.save(part_path)
+                    outputs.append(path)
+                    report["output"] = path
+                    report["bytes"] = os.path.getsize(path)
+            report["seconds"] = time.perf_counter() - start
+            reports[step.name] = report
+            return value
+
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                running = {pool.submit(load, name): name for name in pipeline.inputs}
+                waiting = list(steps)
+                try:
+                    while running:
+                        finished, _ = wait(running, timeout=0.05, return_when=FIRST_COMPLETED)
+                        self.check_cancelled()
+                        for future in finished:
+                            name = running.pop(future)
+                            value = future.result()
+                            if readers[name]:
+                                values[name] = value
+                            self.emit("running steps", total - len(running) - len(waiting), total)
+                        for step in [step for step in waiting if all(source in values for source in step.sources)]:
+                            waiting.remove(step)
+                            running[pool.submit(run, step, [values[source] for source in step.sources])] = step.name
+                            for source in step.sources:
+                                readers[source] -= 1
+                                if not readers[source]:
+                                    del values[source]
+                except BaseException:
+                    # Running steps stop at their next page; the pool waits for them
+                    stop.cancel()
+                    for future in running:
+                        future.cancel()
+                    raise
+        except BaseException:
+            remove_files(outputs)
+            raise
+        finally:
+            for doc in opened:
+                doc.release()
+        self.finish()
+        return {
+            "outputs": [reports[step.name]["output"] for step in steps if step.output],
+            "steps": [reports[step.name] for step in steps],
+            "seconds": time.perf_counter() - self.started,
+        }
@@ -0,0 +1,752 @@
+# The HTTP service behind the serve and load-test commands
+
+import time
+import os
+import re
+import shutil
+import argparse
+import threading
+import zipfile
+import json
+import urllib.parse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, BrokenExecutor
+
+from FileNode.files import app_cache_dir, remove_files
+from FileNode.workers import worker_context
+from FileNode.workspace import WorkspaceManager
+from FileNode.cache import RESULT_OPERATIONS
+from FileNode.batch import (
+    BATCH_OPERATIONS, TOOL_OPTIONS, _init_service_worker, batch_options, build_batch_jobs, result_detail_lines,
+    run_batch_job
+)
+from FileNode.watch import WATCH_EXTENSIONS
+from FileNode.bench import generate_bench_corpus
+
+class ServiceBusy(Exception):
+    # The service is at its limits (or shutting down); the client should retry later
+    pass
+
+def tool_options(operation, values):
+    # Tool options by name, as the batch flags without their dashes
+    # ({"burst": 4, "keep_images": true}), converted and checked as TOOL_OPTIONS
+    # describes them. Raises ValueError with a message for the client.
+    specs = {flag[2:].replace("-", "_"): (flag, spec) for flag, spec in TOOL_OPTIONS}
+    args = argparse.Namespace()
+    for name, (flag, spec) in specs.items():
+        setattr(args, name, spec.get("default", False if spec.get("action") == "store_true" else None))
+    for key, value in values.items():
+        name = key.replace("-", "_")
+        if name not in specs:
+            raise ValueError(f"Unknown option {key}.")
+        flag, spec = specs[name]
+        if spec.get("action") == "store_true":
+            value = value is True or str(value).lower() in ("", "1", "true", "yes")
+        elif value is not None:
+            try:
+                value = spec.get("type", str)(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"{flag} takes a {spec['type'].__name__}, not {value!r}.") from None
+            if "choices" in spec and value not in spec["choices"]:
+                allowed = spec.get("metavar") or ", ".join(map(str, spec["choices"]))
+                raise ValueError(f"{flag} must be one of {allowed}.")
+        setattr(args, name, value)
+    return batch_options(args, operation)
+
+def tool_option_schema():
+    # TOOL_OPTIONS as GET /operations describes them to clients
+    schema = {}
+    for flag, spec in TOOL_OPTIONS:
+        if spec.get("action") == "store_true":
+            kind = "boolean"
+        else:
+            kind = {int: "integer", float: "number"}.get(spec.get("type"), "string")
+        entry = {"type": kind, "help": spec["help"]}
+        if spec.get("default") is not None:
+            entry["default"] = spec["default"]
+        if "choices" in spec:
+            entry["choices"] = list(spec["choices"])
+        schema[flag[2:].replace("-", "_")] = entry
+    return schema
+
+def safe_file_name(name):
+    name = re.sub(r"[^\w.\- ]", "_", os.path.basename(name or "").strip())
+    if not name.strip(". "):
+        raise ValueError("Give the file a name, e.g. ?name=report.pdf.")
+    return name
+
+class ServiceJob:
+    def __init__(self, job_id, operation, uploads, options, workspace):
+        self.id = job_id
+        self.operation = operation
+        self.uploads = uploads
+        self.workspace = workspace
+        batch = build_batch_jobs(operation, [upload["path"] for upload in uploads], workspace.path, options)[0]
+        self.options = batch.options
+        self.output_path = batch.output_path
+        self.state = "queued"
+        self.progress = None
+        self.cancel_event = None
+        self.result = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+
+    def files(self):
+        # (name, path) of every output, relative to the job's output
+        if os.path.isfile(self.output_path):
+            return [(os.path.basename(self.output_path), self.output_path)]
+        found = []
+        for dirpath, _, filenames in os.walk(self.output_path):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                found.append((os.path.relpath(path, self.output_path).replace(os.sep, "/"), path))
+        return sorted(found)
+
+class FileService:
+    # What `serve` runs: uploads are spooled to disk as they arrive, jobs run
+    # through run_batch_job on a process pool, and outputs stay until `ttl`
+    # seconds after the job finishes. At most `workers` jobs run at once and
+    # max_queue more wait; beyond that new jobs are refused, so a burst of
+    # clients sees "try later" instead of a queue that grows without bound.
+    def __init__(self, root=None, workers=None, max_queue=64, max_upload_bytes=2 * 1024 ** 3, ttl=3600):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self.max_upload_bytes = max_upload_bytes
+        self.ttl = ttl
+        self.manager = WorkspaceManager(root)
+        self.spool = self.manager.create()
+        self.lock = threading.Lock()
+        self.uploads = {}
+        self.jobs = {}
+        self.queue = deque()
+        self.running = {}
+        self.closed = False
+        self.progress_queue = worker_context().Queue()
+        # Holds the jobs' cancel events, which the workers check as they go
+        self.sync = worker_context().Manager()
+        self.pool = self._new_pool()
+        threading.Thread(target=self._relay_progress, name="service-progress", daemon=True).start()
+        self.janitor = threading.Event()
+        threading.Thread(target=self._expire_loop, name="service-janitor", daemon=True).start()
+
+    def _new_pool(self):
+        return ProcessPoolExecutor(
+            max_workers=self.workers, mp_context=worker_context(),
+            initializer=_init_service_worker, initargs=(self.progress_queue,),
+        )
+
+    def stats(self):
+        with self.lock:
+            return {
+                "workers": self.workers,
+                "running": len(self.running),
+                "queued": len(self.queue),
+                "max_queue": self.max_queue,
+                "jobs": len(self.jobs),
+                "uploads": len(self.uploads),
+            }
+
+    def add_upload(self, name, stream, length=None):
+        # Copies stream to the spool in chunks, so memory use does not depend on
+        # the file size. length=None reads to the end of the stream.
+        name = safe_file_name(name)
+        upload_id = os.urandom(8).hex()
+        folder = os.path.join(self.spool.path, upload_id)
+        os.makedirs(folder)
+        path = os.path.join(folder, name)
+        part_path = path + ".part"
+        size = 0
+        try:
+            with open(part_path, "wb") as f:
+                while length is None or size < length:
+                    chunk = stream.read(min(1024 * 1024, length - size) if length is not None else 1024 * 1024)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > self.max_upload_bytes:
+                        raise OverflowError(f"Uploads are limited to {self.max_upload_bytes // 1_000_000} MB.")
+                    f.write(chunk)
+            if length is not None and size < length:
+                raise ConnectionError("The upload ended early.")
+            os.replace(part_path, path)
+        except BaseException:
+            shutil.rmtree(folder, ignore_errors=True)
+            raise
+        upload = {"id": upload_id, "name": name, "bytes": size, "path": path, "used": time.time()}
+        with self.lock:
+            self.uploads[upload_id] = upload
+        return upload
+
+    def remove_upload(self, upload_id):
+        with self.lock:
+            upload = self.uploads.get(upload_id)
+            if upload is None:
+                return False
+            if any(upload in job.uploads for job in self.jobs.values() if job.finished is None):
+                raise ValueError("A job still needs this upload.")
+            del self.uploads[upload_id]
+        shutil.rmtree(os.path.dirname(upload["path"]), ignore_errors=True)
+        return True
+
+    def submit(self, operation, upload_ids, options):
+        if operation not in BATCH_OPERATIONS:
+            raise ValueError(f"Unknown operation {operation}.")
+        if not upload_ids:
+            raise ValueError("Give at least one input.")
+        if operation != "merge" and len(upload_ids) != 1:
+            raise ValueError(f"{operation} takes one input per job.")
+        options = tool_options(operation, options)
+        with self.lock:
+            if self.closed:
+                raise ServiceBusy("The service is shutting down.")
+            if len(self.queue) >= self.max_queue:
+                raise ServiceBusy("The job queue is full.")
+            try:
+                uploads = [self.uploads[upload_id] for upload_id in upload_ids]
+            except KeyError as e:
+                raise LookupError(f"No upload {e.args[0]}.") from None
+            for upload in uploads:
+                upload["used"] = time.time()
+            job = ServiceJob(os.urandom(8).hex(), operation, uploads, options, self.manager.create())
+            self.jobs[job.id] = job
+            self.queue.append(job)
+            started = self._dispatch()
+        self._watch(started)
+        return job
+
+    def _dispatch(self):
+        # Called with the lock held. Jobs go to the pool only when a worker is
+        # free, so "queued" and "running" mean what they say. Returns the
+        # futures started, for the caller to _watch once it lets go of the lock.
+        started = []
+        while self.queue and len(self.running) < self.workers:
+            job = self.queue.popleft()
+            job.cancel_event = self.sync.Event()
+            args = (
+                job.operation, [upload["path"] for upload in job.uploads], job.output_path, job.options, job.id,
+                None, job.cancel_event,
+            )
+            try:
+                future = self.pool.submit(run_batch_job, *args)
+            except BrokenExecutor:
+                # A worker died; the pool cannot be used again
+                self.pool.shutdown(wait=False, cancel_futures=True)
+                self.pool = self._new_pool()
+                future = self.pool.submit(run_batch_job, *args)
+            job.state = "running"
+            job.started = time.time()
+            self.running[future] = job
+            started.append(future)
+        return started
+
+    def _watch(self, futures):
+        # A future that is already done runs its callback right here, and
+        # _job_done takes the lock, so this must run without it
+        for future in futures:
+            future.add_done_callback(self._job_done)
+
+    def _job_done(self, future):
+        started = []
+        with self.lock:
+            job = self.running.pop(future)
+            try:
+                job.result = future.result()
+            except Exception as e:
+                job.result = {"ok": False, "error": f"worker failed: {type(e).__name__}: {e}"}
+            job.finished = time.time()
+            if job.state == "cancelled":
+                remove_path(job.output_path)
+            else:
+                job.state = "done" if job.result["ok"] else "failed"
+            for upload in job.uploads:
+                upload["used"] = job.finished
+            if not self.closed:
+                started = self._dispatch()
+        self._watch(started)
+
+    def _relay_progress(self):
+        while True:
+            item = self.progress_queue.get()
+            if item is None:
+                return
+            job_id, event = item
+            job = self.jobs.get(job_id)
+            if job is not None:
+                job.progress = event
+
+    def status(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            position = self.queue.index(job) + 1 if job.state == "queued" else None
+        status = {
+            "id": job.id,
+            "operation": job.operation,
+            "state": job.state,
+            "inputs": [upload["name"] for upload in job.uploads],
+            "created": job.created,
+            "started": job.started,
+            "finished": job.finished,
+        }
+        if position:
+            status["queue_position"] = position
+        if job.progress is not None and job.state == "running":
+            status["progress"] = {"fraction": job.progress.fraction, "text": job.progress.describe()}
+        if job.result is not None:
+            status["seconds"] = job.result.get("seconds")
+            status["error"] = job.result.get("error")
+            status["cache"] = job.result.get("cache")
+            summary = result_detail_lines(job.result) if job.result.get("details") else []
+            for upload in job.uploads:
+                summary = [line.replace(upload["path"], upload["name"]) for line in summary]
+            status["summary"] = summary
+        if job.state == "done":
+            status["files"] = [
+                {"name": name, "bytes": os.path.getsize(path), "url": f"/jobs/{job.id}/files/{urllib.parse.quote(name)}"}
+                for name, path in job.files()
+            ]
+        return status
+
+    def job(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def cancel(self, job_id):
+        # Queued jobs never start. A running job stops at its next progress
+        # point and its output is dropped. Finished jobs are removed with their
+        # outputs.
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            if job.state == "queued":
+                self.queue.remove(job)
+                job.state = "cancelled"
+                job.finished = time.time()
+            elif job.state == "running":
+                job.state = "cancelled"
+                job.cancel_event.set()
+                return job
+            del self.jobs[job_id]
+        self.manager.release(job.workspace)
+        return job
+
+    def _expire_loop(self):
+        while not self.janitor.wait(min(60, self.ttl / 4)):
+            self.expire()
+
+    def expire(self):
+        cutoff = time.time() - self.ttl
+        with self.lock:
+            jobs = [job for job in self.jobs.values() if job.finished is not None and job.finished < cutoff]
+            for job in jobs:
+                del self.jobs[job.id]
+            active = {upload["id"] for job in self.jobs.values() if job.finished is None for upload in job.uploads}
+            uploads = [u for u in self.uploads.values() if u["id"] not in active and u["used"] < cutoff]
+            for upload in uploads:
+                del self.uploads[upload["id"]]
+        for job in jobs:
+            self.manager.release(job.workspace)
+        for upload in uploads:
+            shutil.rmtree(os.path.dirname(upload["path"]), ignore_errors=True)
+
+    def close(self):
+        # Queued jobs are dropped; running ones are waited for
+        with self.lock:
+            self.closed = True
+            for job in self.queue:
+                job.state = "cancelled"
+            self.queue.clear()
+        self.janitor.set()
+        self.pool.shutdown(wait=True, cancel_futures=True)
+        self.sync.shutdown()
+        self.progress_queue.put(None)
+        self.manager.release_all()
+
+def remove_path(path):
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        remove_files([path])
+
+class ChunkedWriter:
+    # HTTP/1.1 chunked transfer encoding over a response stream, for bodies
+    # whose length is not known up front (zips built while they are sent)
+    def __init__(self, wfile):
+        self.wfile = wfile
+
+    def write(self, data):
+        if data:
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        return len(data)
+
+    def flush(self):
+        self.wfile.flush()
+
+    def close(self):
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+class ChunkedReader:
+    # Reads a request body sent with chunked transfer encoding
+    def __init__(self, rfile):
+        self.rfile = rfile
+        self.left = 0
+        self.done = False
+
+    def read(self, size):
+        if self.done:
+            return b""
+        if not self.left:
+            line = self.rfile.readline(1024)
+            self.left = int(line.split(b";")[0].strip() or b"0", 16)
+            if not self.left:
+                # Trailers end with an empty line
+                while self.rfile.readline(1024).strip():
+                    pass
+                self.done = True
+                return b""
+        data = self.rfile.read(min(size, self.left))
+        if not data:
+            raise ConnectionError("The upload ended early.")
+        self.left -= len(data)
+        if not self.left:
+            self.rfile.readline(16)
+        return data
+
+def make_service_server(service, host="127.0.0.1", port=8765, token=None, max_uploads=8, quiet=False):
+    # http.server is imported here so the app does not pay for it at startup
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from urllib.parse import parse_qsl, unquote, urlsplit
+    import hmac
+
+    uploading = threading.BoundedSemaphore(max_uploads)
+
+    class ServiceHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        server_version = "FileNode"
+        # Headers and body go out in separate writes; without this, small
+        # responses wait on the client's delayed ACK
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            if not quiet:
+                super().log_message(format, *args)
+
+        def send_json(self, status, body, headers=()):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for key, value in headers:
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def send_error_json(self, status, message, headers=()):
+            # The body may not have been read; the connection cannot be reused
+            self.close_connection = True
+            self.send_json(status, {"error": message}, tuple(headers) + (("Connection", "close"),))
+
+        def body_stream(self):
+            if "chunked" in self.headers.get("Transfer-Encoding", "").lower():
+                return ChunkedReader(self.rfile), None
+            length = self.headers.get("Content-Length")
+            if length is None:
+                raise ValueError("Send a Content-Length or a chunked body.")
+            return self.rfile, int(length)
+
+        def read_json(self):
+            stream, length = self.body_stream()
+            if length is not None and length > 1024 * 1024:
+                raise ValueError("The request is too large.")
+            data = stream.read(length) if length is not None else b"".join(iter(lambda: stream.read(65536), b""))
+            try:
+                return json.loads(data or b"{}")
+            except ValueError:
+                raise ValueError("The request body is not valid JSON.") from None
+
+        def authorized(self):
+            if token is None:
+                return True
+            given = self.headers.get("Authorization", "")
+            if hmac.compare_digest(given.encode(), f"Bearer {token}".encode()):
+                return True
+            self.send_error_json(401, "Missing or wrong token.", [("WWW-Authenticate", "Bearer")])
+            return False
+
+        def route(self, method):
+            if not self.authorized():
+                return
+            url = urlsplit(self.path)
+            parts = [unquote(part) for part in url.path.strip("/").split("/") if part]
+            query = dict(parse_qsl(url.query, keep_blank_values=True))
+            try:
+                handler = self.routes(method, parts)
+                if handler is None:
+                    self.send_error_json(404, "No such endpoint.")
+                else:
+                    handler(parts, query)
+            except LookupError as e:
+                self.send_error_json(404, str(e.args[0]))
+            except ServiceBusy as e:
+                self.send_error_json(503, str(e), [("Retry-After", "2")])
+            except OverflowError as e:
+                self.send_error_json(413, str(e))
+            except ValueError as e:
+                self.send_error_json(400, str(e))
+            except (ConnectionError, BrokenPipeError):
+                self.close_connection = True
+
+        def routes(self, method, parts):
+            table = {
+                ("GET", 1, "health"): self.get_health,
+                ("GET", 1, "operations"): self.get_operations,
+                ("POST", 1, "uploads"): self.post_upload,
+                ("DELETE", 2, "uploads"): self.delete_upload,
+                ("POST", 1, "jobs"): self.post_job,
+                ("POST", 2, "jobs"): self.post_job_with_file,
+                ("GET", 2, "jobs"): self.get_job,
+                ("DELETE", 2, "jobs"): self.delete_job,
+                ("GET", 3, "jobs"): self.get_output,
+            }
+            if parts and len(parts) >= 4 and parts[0] == "jobs" and parts[2] == "files":
+                return self.get_file if method == "GET" else None
+            return table.get((method, len(parts), parts[0] if parts else ""))
+
+        def do_GET(self):
+            self.route("GET")
+
+        def do_POST(self):
+            self.route("POST")
+
+        def do_DELETE(self):
+            self.route("DELETE")
+
+        def get_health(self, parts, query):
+            self.send_json(200, dict(service.stats(), ok=True))
+
+        def get_operations(self, parts, query):
+            options = tool_option_schema()
+            self.send_json(200, {
+                operation: {
+                    "defaults": RESULT_OPERATIONS[operation][2], "inputs": WATCH_EXTENSIONS[operation], "options": options,
+                }
+                for operation in sorted(BATCH_OPERATIONS)
+            })
+
+        def upload(self, query):
+            if not uploading.acquire(blocking=False):
+                raise ServiceBusy("Too many uploads at once.")
+            try:
+                stream, length = self.body_stream()
+                if length is not None and length > service.max_upload_bytes:
+                    raise OverflowError(f"Uploads are limited to {service.max_upload_bytes // 1_000_000} MB.")
+                return service.add_upload(query.get("name"), stream, length)
+            finally:
+                uploading.release()
+
+        def post_upload(self, parts, query):
+            upload = self.upload(query)
+            self.send_json(201, {key: upload[key] for key in ("id", "name", "bytes")}, [("Location", f"/uploads/{upload['id']}")])
+
+        def delete_upload(self, parts, query):
+            if not service.remove_upload(parts[1]):
+                raise LookupError(f"No upload {parts[1]}.")
+            self.send_json(200, {"id": parts[1], "deleted": True})
+
+        def post_job(self, parts, query):
+            # {"operation": "split", "inputs": [upload ids], "options": {"burst": 4}}
+            request = self.read_json()
+            job = service.submit(request.get("operation"), request.get("inputs") or [], request.get("options") or {})
+            self.send_json(202, service.status(job.id), [("Location", f"/jobs/{job.id}")])
+
+        def post_job_with_file(self, parts, query):
+            # POST /jobs/<operation>?name=a.pdf&burst=4 with the file as the body
+            operation = parts[1]
+            if operation not in BATCH_OPERATIONS:
+                raise LookupError(f"Unknown operation {operation}.")
+            name = query.pop("name", None)
+            tool_options(operation, query)
+            upload = self.upload({"name": name})
+            try:
+                job = service.submit(operation, [upload["id"]], query)
+            except BaseException:
+                service.remove_upload(upload["id"])
+                raise
+            self.send_json(202, dict(service.status(job.id), upload=upload["id"]), [("Location", f"/jobs/{job.id}")])
+
+        def get_job(self, parts, query):
+            status = service.status(parts[1])
+            if status is None:
+                raise LookupError(f"No job {parts[1]}.")
+            self.send_json(200, status)
+
+        def delete_job(self, parts, query):
+            job = service.cancel(parts[1])
+            if job is None:
+                raise LookupError(f"No job {parts[1]}.")
+            self.send_json(200, {"id": job.id, "state": job.state})
+
+        def finished_job(self, job_id):
+            job = service.job(job_id)
+            if job is None:
+                raise LookupError(f"No job {job_id}.")
+            if job.state != "done":
+                raise LookupError(f"Job {job_id} has no output ({job.state}).")
+            return job
+
+        def get_output(self, parts, query):
+            # GET /jobs/<id>/output: the file, or a zip of a folder output
+            if parts[2] != "output":
+                raise LookupError("No such endpoint.")
+            job = self.finished_job(parts[1])
+            files = job.files()
+            if os.path.isfile(job.output_path):
+                self.send_file(files[0][1], files[0][0])
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "application/zip")
+            self.send_header("Content-Disposition", f'attachment; filename="{os.path.basename(job.output_path)}.zip"')
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            writer = ChunkedWriter(self.wfile)
+            with zipfile.ZipFile(writer, "w", zipfile.ZIP_STORED) as archive:
+                for name, path in files:
+                    archive.write(path, name)
+            writer.close()
+
+        def get_file(self, parts, query):
+            job = self.finished_job(parts[1])
+            name = "/".join(parts[3:])
+            for file_name, path in job.files():
+                if file_name == name:
+                    self.send_file(path, os.path.basename(name))
+                    return
+            raise LookupError(f"No file {name} in job {parts[1]}.")
+
+        def send_file(self, path, name):
+            with open(path, "rb") as f:
+                size = os.fstat(f.fileno()).st_size
+                self.send_response(200)
+                self.send_header("Content-Type", "application/octet-stream")
+                self.send_header("Content-Disposition", f'attachment; filename="{name}"')
+                self.send_header("Content-Length", str(size))
+                self.end_headers()
+                shutil.copyfileobj(f, self.wfile, 1024 * 1024)
+
+    server = ThreadingHTTPServer((host, port), ServiceHandler)
+    server.daemon_threads = True
+    return server
+
+def load_test_input(operation, corpus_dir=None):
+    # A small file from the bench corpus that operation accepts
+    corpus = generate_bench_corpus(corpus_dir or app_cache_dir("bench-corpus", "small"), "small")
+    if WATCH_EXTENSIONS[operation] is None:
+        return corpus["images"][0][0]
+    if ".pdf" in WATCH_EXTENSIONS[operation]:
+        return corpus["pdfs"][0][0]
+    if operation == "text-to-pdf":
+        return corpus["texts"][0][0]
+    raise ValueError(f"Give --file for {operation}.")
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+def run_load_test(url, path, operation, options, clients=4, requests=20, token=None, poll_interval=0.05):
+    # clients threads each send requests/clients jobs one after another over a
+    # kept-alive connection: upload the file with the job, poll its status,
+    # stream the output back, delete the job. Busy answers (503) are retried
+    # after the Retry-After the service gives. Returns one record per job.
+    import http.client
+    from urllib.parse import urlencode, urlsplit
+
+    target = urlsplit(url)
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    query = urlencode(dict(options, name=os.path.basename(path)))
+    size = os.path.getsize(path)
+    records = []
+    lock = threading.Lock()
+    counts = [requests // clients + (1 if i < requests % clients else 0) for i in range(clients)]
+
+    def call(conn, method, request_path, body=None, extra=None):
+        conn.request(method, request_path, body=body, headers=dict(headers, **(extra or {})))
+        response = conn.getresponse()
+        return response, response.read()
+
+    def client(count):
+        conn = http.client.HTTPConnection(target.hostname, target.port or 80, timeout=600)
+        try:
+            for _ in range(count):
+                record = {"ok": False, "busy": 0, "bytes_out": 0}
+                start = time.perf_counter()
+                try:
+                    while True:
+                        with open(path, "rb") as f:
+                            response, body = call(conn, "POST", f"/jobs/{operation}?{query}", f, {"Content-Length": str(size)})
+                        if response.status != 503:
+                            break
+                        record["busy"] += 1
+                        time.sleep(float(response.getheader("Retry-After") or 1))
+                    status = json.loads(body)
+                    if response.status != 202:
+                        raise RuntimeError(status.get("error") or f"HTTP {response.status}")
+                    record["submit"] = time.perf_counter() - start
+                    job_path = f"/jobs/{status['id']}"
+                    upload_path = f"/uploads/{status['upload']}"
+                    while status["state"] in ("queued", "running"):
+                        time.sleep(poll_interval)
+                        response, body = call(conn, "GET", job_path)
+                        status = json.loads(body)
+                    if status["state"] != "done":
+                        raise RuntimeError(status.get("error") or status["state"])
+                    record["queued"] = status["started"] - status["created"]
+                    record["run"] = status["finished"] - status["started"]
+                    download = time.perf_counter()
+                    conn.request("GET", f"{job_path}/output", headers=headers)
+                    response = conn.getresponse()
+                    for chunk in iter(lambda: response.read(1024 * 1024), b""):
+                        record["bytes_out"] += len(chunk)
+                    if response.status != 200:
+                        raise RuntimeError(f"download failed: HTTP {response.status}")
+                    record["download"] = time.perf_counter() - download
+                    call(conn, "DELETE", job_path)
+                    call(conn, "DELETE", upload_path)
+                    record["ok"] = True
+                except (OSError, ValueError, RuntimeError, http.client.HTTPException) as e:
+                    record["error"] = f"{type(e).__name__}: {e}"
+                    conn.close()
+                record["total"] = time.perf_counter() - start
+                with lock:
+                    records.append(record)
+        finally:
+            conn.close()
+
+    threads = [threading.Thread(target=client, args=(count,)) for count in counts if count]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return records
+
+def format_load_test(records, elapsed, clients):
+    ok = [r for r in records if r["ok"]]
+    failed = [r for r in records if not r["ok"]]
+    busy = sum(r["busy"] for r in records)
+    elapsed = max(elapsed, 1e-9)
+    lines = [
+        f"Jobs: {len(records)}  ok: {len(ok)}  failed: {len(failed)}  busy answers retried: {busy}",
+        f"Throughput: {len(ok) / elapsed:.2f} jobs/s over {elapsed:.1f}s with {clients} clients, "
+        f"{sum(r['bytes_out'] for r in ok) / 1_000_000 / elapsed:.2f} MB/s downloaded",
+    ]
+    if ok:
+        lines.append(f"{'seconds':<16}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}")
+        for key, label in (("submit", "upload+submit"), ("queued", "queued"), ("run", "run"), ("download", "download"), ("total", "total")):
+            values = [r[key] for r in ok]
+            lines.append(f"{label:<16}" + "".join(f"{percentile(values, q):>9.3f}" for q in (0.5, 0.95, 0.99, 1.0)))
+    for r in failed[:5]:
+        lines.append(f"  FAILED: {r['error']}")
+    return "\n".join(lines)
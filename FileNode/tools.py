@@ -0,0 +1,619 @@
+# The tools: what the window, the commands and the services all run
+
+import time
+import os
+import math
+import itertools
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from FileNode import deps
+from FileNode.deps import require
+from FileNode.files import copy_file, remove_files, unique_output_names
+from FileNode.tracing import traced, tracer
+from FileNode.workers import submit_bounded, worker_context
+from FileNode.jobs import JobCancelled
+from FileNode.documents import _init_text_worker, extract_page_texts, open_pdf, parse_page_ranges
+from FileNode.pdf_writer import (
+    PdfOptimizer, PdfStreamWriter, TextPdfWriter, pdf_image_job, pdf_image_limits, recompress_pdf_image, text_pages,
+    write_pdf_chunks
+)
+from FileNode.office import DocxStreamWriter, docx_converter_pool
+from FileNode.images import (
+    convert_image_file, encode_image, encoder_options, image_format_choice, image_format_for, load_image,
+    prepare_for_format
+)
+
+class ProgressEvent:
+    # One progress update from a tool method. done/total count the work units of
+    # the current stage (pages, inputs, bytes read); elapsed is since the call began.
+    # unit="bytes" marks done/total as byte counts, shown in MB with a rate.
+    def __init__(self, stage, done=0, total=0, bytes_written=0, elapsed=0.0, finished=False, unit=None):
+        self.stage = stage
+        self.done = done
+        self.total = total
+        self.bytes_written = bytes_written
+        self.elapsed = elapsed
+        self.finished = finished
+        self.unit = unit
+
+    @property
+    def fraction(self):
+        if self.finished:
+            return 1.0
+        if not self.total:
+            return 0.0
+        return min(1.0, self.done / self.total)
+
+    @property
+    def eta(self):
+        if self.finished or not self.done or not self.total:
+            return None
+        return self.elapsed * (self.total - self.done) / self.done
+
+    @property
+    def rate(self):
+        if self.unit != "bytes" or self.elapsed <= 0:
+            return None
+        return self.done / self.elapsed
+
+    def describe(self):
+        text = self.stage.capitalize()
+        if self.total and self.unit == "bytes":
+            text += f" {self.done / 1_000_000:.1f}/{self.total / 1_000_000:.1f} MB"
+            if self.rate is not None:
+                text += f" at {self.rate / 1_000_000:.1f} MB/s"
+        elif self.total:
+            text += f" {self.done}/{self.total}"
+        if self.eta is not None and self.elapsed > 1:
+            text += f", about {self.eta:.0f}s left"
+        return text
+
+class ToolBase:
+    # Tools take an optional progress callback that receives ProgressEvents, and an
+    # optional CancelToken. Every progress point is also a cancellation point.
+    # requires names the DEPENDENCIES a tool loads when it is created.
+    # While tracing, consecutive events of one stage become a single span.
+    requires = ()
+
+    def __init__(self, progress=None, cancel_token=None):
+        require(*self.requires)
+        self.progress = progress
+        self.cancel_token = cancel_token
+        self.started = time.perf_counter()
+        self.open_stage = None
+
+    def begin(self):
+        self.started = time.perf_counter()
+        self.end_stage()
+
+    def check_cancelled(self):
+        if self.cancel_token is not None:
+            self.cancel_token.check()
+
+    def emit(self, stage, done=0, total=0, bytes_written=0, finished=False, unit=None):
+        if not finished:
+            self.check_cancelled()
+        if tracer.enabled:
+            self.trace_stage(stage, done, total, bytes_written, finished, unit)
+        if self.progress:
+            self.progress(ProgressEvent(stage, done, total, bytes_written, time.perf_counter() - self.started, finished, unit))
+
+    def trace_stage(self, stage, done, total, bytes_written, finished, unit):
+        if self.open_stage is not None and (finished or stage != self.open_stage[0]):
+            self.end_stage()
+        if finished:
+            return
+        if self.open_stage is None:
+            self.open_stage = (stage, time.perf_counter_ns(), {})
+        args = self.open_stage[2]
+        args["done"] = done
+        args["total"] = total
+        if bytes_written:
+            args["bytes_written"] = bytes_written
+        if unit:
+            args["unit"] = unit
+
+    def end_stage(self):
+        if self.open_stage is not None:
+            stage, start, args = self.open_stage
+            self.open_stage = None
+            tracer.record(stage, "stage", start, time.perf_counter_ns(), args)
+
+    def finish(self, output_path=None):
+        bytes_written = 0
+        if output_path and os.path.isfile(output_path):
+            bytes_written = os.path.getsize(output_path)
+        self.emit("done", 1, 1, bytes_written, finished=True)
+
+    @contextmanager
+    def writing(self, output_path):
+        # Work goes to a .part file that only takes the real name once complete,
+        # so a failed or cancelled run never leaves a half-written output behind.
+        root, ext = os.path.splitext(output_path)
+        part_path = f"{root}.part{ext}"
+        try:
+            yield part_path
+            os.replace(part_path, output_path)
+        except BaseException:
+            remove_files([part_path])
+            raise
+
+class PDFTools(ToolBase):
+    requires = ("pdf",)
+
+    @traced
+    @traced
+    def merge_pdfs_streaming(self, inputs, output_path="merged_output.pdf"):
+        # inputs are paths or (path, page spec) pairs. Only one input is open at a
+        # time and its pages are written out before the next one is read.
+        # Returns per-input timing and bytes written.
+        self.begin()
+        report = []
+        root, ext = os.path.splitext(output_path)
+        part_path = f"{root}.part{ext}"
+        writer = PdfStreamWriter(part_path)
+        try:
+            for i, item in enumerate(inputs, 1):
+                path, spec = item if isinstance(item, tuple) else (item, None)
+                start = time.perf_counter()
+                before = writer.tell()
+                with open_pdf(path) as doc, doc.lock:
+                    page_count = doc.page_count
+                    indices = parse_page_ranges(spec, page_count) if spec else range(page_count)
+                    with tracer.span("copy pages", pages=len(indices)) as args:
+                        writer.add_pages(doc.reader, indices)
+                        args["bytes_written"] = writer.tell() - before
+                report.append({
+                    "input": path,
+                    "pages": len(indices),
+                    "seconds": time.perf_counter() - start,
+                    "bytes_written": writer.tell() - before,
+                })
+                self.emit("merging", i, len(inputs), writer.tell())
+            writer.close()
+            os.replace(part_path, output_path)
+        except BaseException:
+            writer.abort()
+            raise
+        self.finish(output_path)
+        return report
+
+    @traced
+    def split_pdf(self, input_path, start_page, end_page, output_path="split_output.pdf"):
+        self.begin()
+        writer = deps.PdfWriter()
+        with open_pdf(input_path) as doc, doc.lock:
+            # Raises ValueError for a range past the end of the document
+            indices = parse_page_ranges(f"{start_page}-{end_page}", doc.page_count)
+            total = len(indices)
+            for done, i in enumerate(indices, 1):
+                writer.add_page(doc.page(i))
+                self.emit("copying pages", done, total)
+            self.emit("writing")
+            with self.writing(output_path) as part_path:
+                with open(part_path, "wb") as f, tracer.span("write", pages=total) as args:
+                    writer.write(f)
+                    args["bytes_written"] = f.tell()
+        self.finish(output_path)
+        return output_path
+
+    @traced
+    def split_pdf_multi(self, input_path, ranges=None, pages_per_file=None, output_dir="split_output", workers=1):
+        # Cuts the document into one file per range spec ("1-5", "8,10-12"), or
+        # bursts it into files of pages_per_file pages. Each worker parses the
+        # input once and writes its share of the outputs, so the parse count
+        # depends on the worker count and not on the number of pieces.
+        if not ranges and not pages_per_file:
+            raise ValueError("Give page ranges or a burst size.")
+        self.begin()
+        os.makedirs(output_dir, exist_ok=True)
+        workers = max(1, workers or 1)
+        if workers == 1:
+            outputs = write_pdf_chunks(
+                input_path, ranges, pages_per_file, output_dir,
+                on_chunk=lambda done, total, size: self.emit("writing files", done, total, size),
+            )
+            self.finish()
+            return outputs
+        outputs = []
+        context = worker_context()
+        with context.Manager() as manager, ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            stop_event = manager.Event()
+            futures = [
+                pool.submit(write_pdf_chunks, input_path, ranges, pages_per_file, output_dir, share, workers, None, stop_event)
+                for share in range(workers)
+            ]
+            pending = set(futures)
+            try:
+                while pending:
+                    finished, pending = wait(pending, timeout=0.05, return_when=FIRST_COMPLETED)
+                    self.emit("writing files", len(futures) - len(pending), workers)
+                for future in futures:
+                    outputs.extend(future.result())
+            except BaseException:
+                # Stop the other workers at their next chunk and drop what finished shares wrote
+                stop_event.set()
+                for future in futures:
+                    try:
+                        remove_files(future.result())
+                    except BaseException:
+                        pass
+                raise
+        self.finish()
+        return outputs
+
+    @traced
+    def convert_pdf_to_word(self, input_path, output_path="converted_output.docx", workers=1, batch_size=16):
+        # Simple text extraction (not formatting). Pages are extracted in batches
+        # across up to `workers` processes and written to the document in page
+        # order as each batch arrives, so only a few batches are in memory at once.
+        # Text extracted before from the same document is reused.
+        self.begin()
+        with open_pdf(input_path) as pdf:
+            total = pdf.page_count
+            batches = [(start, min(start + batch_size, total)) for start in range(0, total, batch_size)]
+            missing = total - len(pdf.texts)
+            workers = max(1, min(workers or 1, -(-missing // batch_size)))
+            with self.writing(output_path) as part_path:
+                doc = DocxStreamWriter(part_path)
+                try:
+                    if workers == 1:
+                        for i in range(total):
+                            with tracer.span("extract page", page=i + 1) as args:
+                                text = pdf.page_text(i)
+                                if text:
+                                    doc.add_paragraph(text)
+                                args["chars"] = len(text)
+                            self.emit("extracting text", i + 1, total)
+                    else:
+                        self._extract_parallel(pdf, batches, workers, doc, total)
+                    doc.close()
+                except BaseException:
+                    doc.abort()
+                    raise
+        self.finish(output_path)
+        return output_path
+
+    def _extract_parallel(self, pdf, batches, workers, doc, total):
+        max_in_flight = workers * 2
+        with ProcessPoolExecutor(
+            max_workers=workers, mp_context=worker_context(),
+            initializer=_init_text_worker, initargs=(pdf.path,),
+        ) as pool:
+            in_flight = deque()
+            pending = iter(batches)
+            try:
+                for start, end in itertools.islice(pending, max_in_flight):
+                    in_flight.append((start, end, pool.submit(extract_page_texts, start, end)))
+                while in_flight:
+                    start, end, future = in_flight.popleft()
+                    # Time spent here is waiting on the workers plus writing their text
+                    with tracer.span("extract batch", end=end):
+                        for i, text in enumerate(future.result(), start):
+                            pdf.texts[i] = text
+                            if text:
+                                doc.add_paragraph(text)
+                    self.emit("extracting text", end, total)
+                    for start, end in itertools.islice(pending, 1):
+                        in_flight.append((start, end, pool.submit(extract_page_texts, start, end)))
+            except BaseException:
+                for _, _, future in in_flight:
+                    future.cancel()
+                raise
+
+    @traced
+    def optimize_pdf(self, input_path, output_path="optimized_output.pdf", image_quality=75, max_dpi=150, workers=None):
+        # Rewrites the document with identical objects stored once, uncompressed
+        # streams deflated, and images re-encoded as JPEG at image_quality and
+        # downsampled to max_dpi at page size, across up to `workers` processes.
+        # image_quality=None leaves images as they are. If the rewrite comes out
+        # no smaller, the output is a copy of the input. Returns a size report.
+        self.begin()
+        before = os.path.getsize(input_path)
+        root, ext = os.path.splitext(output_path)
+        part_path = f"{root}.part{ext}"
+        with open_pdf(input_path) as doc, doc.lock:
+            total = doc.page_count
+            report = self.write_optimized(doc.reader, part_path, image_quality, max_dpi, workers)
+        try:
+            after = report["bytes"]
+            kept_original = after >= before
+            if kept_original:
+                copy_file(input_path, part_path)
+                after = before
+            os.replace(part_path, output_path)
+        except BaseException:
+            remove_files([part_path])
+            raise
+        self.finish(output_path)
+        return {
+            "output": output_path,
+            "pages": total,
+            "bytes_before": before,
+            "bytes_after": after,
+            "duplicates": report["duplicates"],
+            "images": report["images"],
+            "images_recompressed": report["images_recompressed"],
+            "kept_original": kept_original,
+            "seconds": time.perf_counter() - self.started,
+        }
+
+    def write_optimized(self, reader, output, image_quality=75, max_dpi=150, workers=None):
+        # The rewrite behind optimize_pdf and the pipeline's optimize step: every
+        # page of reader into output (a path or binary file). The caller holds the
+        # document's lock. Returns the size written and what was merged or re-encoded.
+        total = len(reader.pages)
+        writer = PdfOptimizer(output)
+        images_found = 0
+        try:
+            if image_quality is not None:
+                limits = pdf_image_limits(reader, max_dpi)
+                images_found = len(limits)
+                writer.images = self._recompress_images(writer, limits, image_quality, workers)
+            with tracer.span("write", pages=total) as args:
+                writer.add_pages(reader, range(total), PdfOptimizer.CATALOG_KEYS, lambda done, count: self.emit("writing", done, count, writer.tell()))
+                writer.close()
+                args["bytes_written"] = writer.bytes_written
+        except BaseException:
+            writer.abort()
+            raise
+        return {
+            "bytes": writer.bytes_written,
+            "duplicates": writer.duplicates,
+            "images": images_found,
+            "images_recompressed": len(writer.images),
+        }
+
+    def _recompress_images(self, writer, limits, quality, workers):
+        # Each distinct image (by content hash) is recompressed once, in a process
+        # pool when there are several. Images that fail to decode stay as they are.
+        jobs = {}
+        for ref, max_pixels in limits.values():
+            args = pdf_image_job(ref.get_object(), quality, max_pixels)
+            if args is not None:
+                jobs[writer.object_key(ref)] = args
+        results = {}
+        workers = max(1, min(workers or os.cpu_count() or 1, len(jobs)))
+        self.emit("recompressing images", 0, len(jobs))
+        if workers == 1:
+            for done, (digest, args) in enumerate(jobs.items(), 1):
+                with tracer.span("recompress image", "image", width=args[3], height=args[4]):
+                    try:
+                        result = recompress_pdf_image(*args)
+                    except Exception:
+                        result = None
+                if result is not None:
+                    results[digest] = result
+                self.emit("recompressing images", done, len(jobs))
+            return results
+        with ProcessPoolExecutor(max_workers=workers, mp_context=worker_context()) as pool:
+            calls = ((digest, recompress_pdf_image, args) for digest, args in jobs.items())
+            for done, (digest, future) in enumerate(submit_bounded(pool, calls, workers * 2), 1):
+                try:
+                    result = future.result()
+                except Exception:
+                    result = None
+                if result is not None:
+                    results[digest] = result
+                self.emit("recompressing images", done, len(jobs))
+        return results
+
+class WordTools(ToolBase):
+    @traced
+    def convert_docx_to_pdf(self, input_path, output_path="converted_output.pdf", backend=None):
+        # backend names one of DOCX_BACKENDS; by default the first available
+        self.begin()
+        pool = docx_converter_pool(backend)
+        self.emit("converting", 0, 1)
+        with self.writing(output_path) as part_path:
+            pool.convert(input_path, part_path, self.cancel_token)
+        self.finish(output_path)
+        return output_path
+
+class ImageTools(ToolBase):
+    requires = ("image",)
+
+    @traced
+    def reduce_image_size(self, input_path, output_path, quality=70, max_dimension=None):
+        self.begin()
+        self.emit("decoding", 0, 2)
+        img = load_image(input_path, max_dimension)
+        img = prepare_for_format(img, image_format_for(output_path))
+        self.emit("encoding", 1, 2)
+        with self.writing(output_path) as part_path, tracer.span("encode", "image", quality=int(quality)):
+            img.save(part_path, quality=int(quality), optimize=True)
+        self.finish(output_path)
+        return output_path
+
+    @traced
+    def reduce_image_to_size(self, input_path, output_path, target_bytes, min_quality=10, max_quality=95, allow_scale=True, workers=None, max_dimension=None):
+        # Searches for the highest quality whose encode fits in target_bytes. Each
+        # round encodes one candidate per worker thread into memory (Pillow releases
+        # the GIL while encoding) and narrows the range around the fit/no-fit
+        # boundary. If even min_quality is too big, the image is scaled down and
+        # searched again. Only the winning encode is written.
+        self.begin()
+        fmt = image_format_for(output_path)
+        if fmt not in ("JPEG", "WEBP"):
+            raise ValueError("A target size needs a JPEG or WebP output.")
+        self.emit("decoding")
+        img = load_image(input_path, max_dimension)
+        img = prepare_for_format(img, fmt)
+        workers = max(1, workers or min(4, os.cpu_count() or 1))
+        expected_rounds = max(1, int(math.ceil(math.log(max_quality - min_quality + 1, workers + 1))))
+        encodes = 0
+        best = None
+        smallest = None
+        scale = 1.0
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for _ in range(4):
+                candidate = img
+                if scale < 1.0:
+                    size = (max(1, int(img.width * scale)), max(1, int(img.height * scale)))
+                    candidate = img.resize(size, deps.Image.LANCZOS)
+                lo, hi = min_quality, max_quality
+                rounds = 0
+                while lo <= hi:
+                    if hi - lo + 1 <= workers:
+                        probes = list(range(lo, hi + 1))
+                    else:
+                        probes = sorted({lo + (hi - lo) * (i + 1) // (workers + 1) for i in range(workers)})
+                    results = list(pool.map(lambda q: (q, encode_image(candidate, fmt, q)), probes))
+                    encodes += len(probes)
+                    rounds += 1
+                    self.emit("searching quality", min(rounds, expected_rounds), expected_rounds)
+                    fitting = [(q, data) for q, data in results if len(data) <= target_bytes]
+                    too_big = [q for q, data in results if len(data) > target_bytes]
+                    for q, data in results:
+                        if smallest is None or len(data) < len(smallest[1]):
+                            smallest = (q, data, scale)
+                    if fitting:
+                        q, data = max(fitting, key=lambda item: item[0])
+                        if best is None or best[2] < scale or q > best[0]:
+                            best = (q, data, scale)
+                        lo = q + 1
+                        hi = min([hi] + [t - 1 for t in too_big if t > q])
+                    else:
+                        hi = min(too_big) - 1
+                if best is not None or not allow_scale:
+                    break
+                # Even the lowest quality is too big: shrink by the area ratio, with some headroom
+                scale *= math.sqrt(target_bytes / len(smallest[1])) * 0.9
+        quality, data, scale = best if best is not None else smallest
+        with self.writing(output_path) as part_path:
+            with open(part_path, "wb") as f:
+                f.write(data)
+        self.finish(output_path)
+        return {
+            "output": output_path,
+            "quality": quality,
+            "scale": scale,
+            "size": len(data),
+            "target": target_bytes,
+            "met": len(data) <= target_bytes,
+            "encodes": encodes,
+        }
+
+    @traced
+    def convert_image_format(self, input_path, output_path, max_dimension=None, save_options=None):
+        self.begin()
+        self.emit("decoding", 0, 2)
+        fmt = image_format_for(output_path, None)
+        img = load_image(input_path, max_dimension)
+        img = prepare_for_format(img, fmt)
+        self.emit("encoding", 1, 2)
+        with self.writing(output_path) as part_path, tracer.span("encode", "image", format=fmt):
+            img.save(part_path, fmt, **(save_options or {}))
+        self.finish(output_path)
+        return output_path
+
+    @traced
+    def convert_images(self, inputs, output_dir, format_name, quality=None, lossless=False, effort=None, max_dimension=None, workers=None, max_in_flight=None):
+        # Converts every input into output_dir. Files go through a process pool so
+        # one file's decode overlaps another's encode; at most max_in_flight files
+        # are queued at a time. A file that fails is reported, not fatal.
+        # Returns one report per input, in input order.
+        self.begin()
+        fmt, ext = image_format_choice(format_name)
+        save_options = encoder_options(fmt, quality, lossless, effort)
+        os.makedirs(output_dir, exist_ok=True)
+        outputs = [os.path.join(output_dir, name) for name in unique_output_names(inputs, ext)]
+        workers = max(1, workers or os.cpu_count() or 1)
+        max_in_flight = max_in_flight or workers * 2
+        reports = [None] * len(inputs)
+        bytes_written = 0
+        self.emit("converting", 0, len(inputs))
+
+        def record(i, report):
+            nonlocal bytes_written
+            reports[i] = report
+            bytes_written += report["bytes_out"]
+            self.emit("converting", sum(1 for r in reports if r is not None), len(inputs), bytes_written)
+
+        def failed(i, e):
+            return {
+                "input": inputs[i], "output": None, "ok": False, "error": f"{type(e).__name__}: {e}",
+                "decode_seconds": 0.0, "encode_seconds": 0.0, "seconds": 0.0, "bytes_in": 0, "bytes_out": 0,
+            }
+
+        try:
+            if workers == 1:
+                for i, input_path in enumerate(inputs):
+                    try:
+                        report = convert_image_file(input_path, outputs[i], fmt, save_options, max_dimension)
+                    except Exception as e:
+                        report = failed(i, e)
+                    record(i, report)
+            else:
+                with ProcessPoolExecutor(max_workers=workers, mp_context=worker_context()) as pool:
+                    calls = ((i, convert_image_file, (path, outputs[i], fmt, save_options, max_dimension)) for i, path in enumerate(inputs))
+                    for i, future in submit_bounded(pool, calls, max_in_flight):
+                        try:
+                            report = future.result()
+                        except Exception as e:
+                            report = failed(i, e)
+                        record(i, report)
+        except JobCancelled:
+            # The pool has drained by now, so nothing else will land in output_dir
+            remove_files(outputs)
+            raise
+        self.finish()
+        return reports
+
+class TextTools(ToolBase):
+    @traced
+    def convert_text_to_pdf(self, input_path, output_path="converted_text.pdf", max_pages=None, font_size=9, read_size=1 << 16):
+        # Streams the text: it is read in pieces of at most read_size characters,
+        # wrapped to the page width and written a page at a time, so memory stays
+        # flat however large the input is. With max_pages, output_path is a folder
+        # that receives numbered PDFs of at most max_pages pages each.
+        self.begin()
+        total = os.path.getsize(input_path)
+        if max_pages:
+            os.makedirs(output_path, exist_ok=True)
+            stem = os.path.splitext(os.path.basename(input_path))[0]
+        outputs = []
+        writer = None
+        pages = 0
+
+        def open_writer():
+            if max_pages:
+                path = os.path.join(output_path, f"{stem}-{len(outputs) + 1:03d}.pdf")
+            else:
+                path = output_path
+            root, ext = os.path.splitext(path)
+            outputs.append(path)
+            return TextPdfWriter(f"{root}.part{ext}", font_size)
+
+        def close_writer(writer):
+            with tracer.span("write", output=outputs[-1], pages=writer.page_count):
+                writer.close()
+                os.replace(writer.output_path, outputs[-1])
+
+        try:
+            writer = open_writer()
+            with open(input_path, "r", encoding="utf-8", errors="replace") as f:
+                for rows in text_pages(f, writer.columns, writer.rows, read_size):
+                    if max_pages and writer.page_count == max_pages:
+                        close_writer(writer)
+                        writer = open_writer()
+                    writer.add_page(rows)
+                    pages += 1
+                    self.emit("laying out", f.buffer.tell(), total, unit="bytes")
+            close_writer(writer)
+        except BaseException:
+            if writer is not None:
+                writer.abort()
+            remove_files(outputs[:-1])
+            raise
+        seconds = time.perf_counter() - self.started
+        self.finish(output_path)
+        return {
+            "outputs": outputs,
+            "pages": pages,
+            "bytes_read": total,
+            "seconds": seconds,
+            "mb_per_s": total / 1_000_000 / max(seconds, 1e-9),
+        }
@@ -0,0 +1,187 @@
+# Chrome-trace spans and a sampling profiler for finding where time goes
+
+import time
+import os
+import sys
+import threading
+import platform
+import json
+import functools
+from collections import deque
+from contextlib import contextmanager, nullcontext
+
+from FileNode.files import write_atomic
+
+# Spans are recorded as Chrome trace events ("X" complete events, microseconds)
+# so a capture opens in chrome://tracing or ui.perfetto.dev. Tracing is off until
+# the GUI toggle, FILENODE_TRACE or batch --trace turns it on; a span while it
+# is off costs one attribute check.
+
+class Tracer:
+    def __init__(self, max_events=200_000):
+        self.enabled = False
+        self.events = deque(maxlen=max_events)
+        # (pid, tid) -> thread name, written out as metadata events
+        self.threads = {}
+
+    def clear(self):
+        self.events.clear()
+        self.threads.clear()
+
+    def span(self, name, cat="tool", **args):
+        # The yielded dict becomes the span's args, so counts known only at the
+        # end (bytes written, pages) can be filled in inside the block.
+        if not self.enabled:
+            return nullcontext(args)
+        return self._span(name, cat, args)
+
+    @contextmanager
+    def _span(self, name, cat, args):
+        start = time.perf_counter_ns()
+        try:
+            yield args
+        except BaseException as e:
+            args["error"] = type(e).__name__
+            raise
+        finally:
+            self.record(name, cat, start, time.perf_counter_ns(), args)
+
+    def record(self, name, cat, start_ns, end_ns, args=None):
+        # perf_counter is a system-wide monotonic clock, so spans from worker
+        # processes line up with the parent's
+        pid, tid = os.getpid(), threading.get_ident()
+        if (pid, tid) not in self.threads:
+            self.threads[(pid, tid)] = threading.current_thread().name
+        event = {"name": name, "cat": cat, "ph": "X", "ts": start_ns // 1000, "dur": (end_ns - start_ns) // 1000, "pid": pid, "tid": tid}
+        if args:
+            event["args"] = args
+        self.events.append(event)
+
+    def snapshot(self):
+        events = [
+            {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+            for (pid, tid), name in list(self.threads.items())
+        ]
+        return events + list(self.events)
+
+    def take_events(self):
+        # For pool workers: hands everything recorded so far to the parent
+        events = self.snapshot()
+        self.clear()
+        return events
+
+    def add_events(self, events):
+        for event in events:
+            if event["ph"] == "M":
+                self.threads[(event["pid"], event["tid"])] = event["args"]["name"]
+            else:
+                self.events.append(event)
+
+    def export(self, path, profiler=None):
+        trace = {
+            "traceEvents": self.snapshot(),
+            "displayTimeUnit": "ms",
+            "otherData": {"platform": platform.platform(), "python": platform.python_version(), "pid": os.getpid()},
+        }
+        if profiler is not None and profiler.samples:
+            profiler.add_to(trace)
+            write_atomic(os.path.splitext(os.path.abspath(path))[0] + ".folded", profiler.collapsed().encode("utf-8"))
+        write_atomic(os.path.abspath(path), json.dumps(trace).encode("utf-8"))
+        return path
+
+class SamplingProfiler:
+    # Samples every thread's Python stack each interval from a background thread.
+    # Exported inside the trace as Chrome "samples", and as collapsed stacks
+    # ("a;b;c count") that flame graph tools read.
+    def __init__(self, interval=0.005, max_samples=200_000):
+        self.interval = interval
+        self.samples = deque(maxlen=max_samples)
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def clear(self):
+        self.samples.clear()
+
+    def start(self):
+        if self.thread is not None:
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        if self.thread is not None:
+            self.stop_event.set()
+            self.thread.join()
+            self.thread = None
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self.stop_event.wait(self.interval):
+            now = time.perf_counter_ns() // 1000
+            for tid, frame in sys._current_frames().items():
+                if tid == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.reverse()
+                self.samples.append((now, tid, tuple(stack)))
+
+    def add_to(self, trace):
+        # Each sample points at the leaf of its stack in the shared stackFrames tree
+        frames = {}
+        ids = {}
+        samples = []
+        for ts, tid, stack in list(self.samples):
+            parent = None
+            for name in stack:
+                key = (parent, name)
+                if key not in ids:
+                    ids[key] = str(len(ids) + 1)
+                    frames[ids[key]] = {"name": name, "parent": parent} if parent else {"name": name}
+                parent = ids[key]
+            if parent:
+                samples.append({"cpu": 0, "tid": tid, "ts": ts, "name": "sample", "sf": parent, "weight": 1})
+        trace["stackFrames"] = frames
+        trace["samples"] = samples
+
+    def collapsed(self):
+        counts = {}
+        for _, _, stack in list(self.samples):
+            key = ";".join(stack)
+            counts[key] = counts.get(key, 0) + 1
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(counts.items()))
+
+tracer = Tracer()
+profiler = SamplingProfiler()
+
+def start_trace(profile=False):
+    tracer.clear()
+    tracer.enabled = True
+    if profile:
+        profiler.clear()
+        profiler.start()
+
+def stop_trace(path=None):
+    # Stops recording and, given a path, writes what was captured
+    tracer.enabled = False
+    profiler.stop()
+    if path:
+        return tracer.export(path, profiler)
+
+def traced(method):
+    # Wraps a tool method in a "Class.method" span and closes the span of
+    # whatever stage the method was in when it returned or raised.
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if not tracer.enabled:
+            return method(self, *args, **kwargs)
+        with tracer.span(f"{type(self).__name__}.{method.__name__}"):
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                self.end_stage()
+    return wrapper
@@ -0,0 +1,393 @@
+# Watch folders that run a tool on each file that lands in them
+
+import time
+import os
+import re
+import select
+import sys
+import struct
+import threading
+import json
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, BrokenExecutor, wait, FIRST_COMPLETED
+
+from FileNode import deps
+from FileNode.deps import require
+from FileNode.files import write_atomic
+from FileNode.workers import worker_context
+from FileNode.workspace import hold_lock, sweep_workspaces
+from FileNode.batch import BATCH_OPERATIONS, _init_service_worker, build_batch_jobs, run_batch_job
+
+# operation -> input extensions a watched folder passes to it; None means any
+# image Pillow can open
+WATCH_EXTENSIONS = {
+    "merge": (".pdf",),
+    "split": (".pdf",),
+    "pdf-to-word": (".pdf",),
+    "optimize": (".pdf",),
+    "docx-to-pdf": (".docx",),
+    "reduce-image": None,
+    "convert-image": None,
+    "text-to-pdf": (".txt", ".log"),
+}
+# Names that are still being written, or belong to other programs
+WATCH_IGNORED = re.compile(r"^[.~]|\.(part|tmp|crdownload|partial)$", re.IGNORECASE)
+
+class InotifyWatcher:
+    # Linux inotify through libc. wait() returns the paths that were created,
+    # closed after writing or moved into the watched directories.
+    IN_CLOSE_WRITE = 0x8
+    IN_MOVED_TO = 0x80
+    IN_CREATE = 0x100
+    IN_Q_OVERFLOW = 0x4000
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+    EVENT = struct.Struct("iIII")
+
+    def __init__(self, directories):
+        import ctypes
+        import ctypes.util
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.directories = {}
+        mask = self.IN_CLOSE_WRITE | self.IN_MOVED_TO | self.IN_CREATE
+        for directory in directories:
+            wd = libc.inotify_add_watch(self.fd, os.fsencode(directory), mask)
+            if wd < 0:
+                error = ctypes.get_errno()
+                os.close(self.fd)
+                raise OSError(error, f"Cannot watch {directory}")
+            self.directories[wd] = directory
+
+    def wait(self, timeout):
+        # The changed paths (possibly none), or None when the kernel dropped
+        # events and every folder has to be scanned again
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        paths = []
+        offset = 0
+        while offset + self.EVENT.size <= len(data):
+            wd, mask, _, length = self.EVENT.unpack_from(data, offset)
+            offset += self.EVENT.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            if mask & self.IN_Q_OVERFLOW:
+                return None
+            if wd in self.directories and name:
+                paths.append(os.path.join(self.directories[wd], os.fsdecode(name)))
+        return paths
+
+    def close(self):
+        os.close(self.fd)
+
+class PollingWatcher:
+    # For platforms without inotify and for network shares, whose remote writers
+    # inotify never hears about: every wait() asks for a full scan.
+    def __init__(self, interval):
+        self.interval = interval
+
+    def wait(self, timeout):
+        time.sleep(min(timeout, self.interval))
+        return None
+
+    def close(self):
+        pass
+
+def folder_watcher(directories, poll_interval, use_inotify=True):
+    if use_inotify and sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(directories)
+        except (OSError, AttributeError):
+            # Out of watches, or a libc without inotify
+            pass
+    return PollingWatcher(poll_interval)
+
+class WatchJournal:
+    # Append-only record of the files a watcher has taken on, keyed by path,
+    # size and mtime, so a restart neither runs finished files again nor skips
+    # new ones. A file is "queued" (with its output path) before its job starts
+    # and "done" or "failed" after; each line is fsynced before the watcher moves
+    # on. Opening the journal compacts it and takes a lock, so only one watcher
+    # uses it at a time.
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        try:
+            self.lock = hold_lock(path + ".lock")
+        except OSError:
+            raise RuntimeError(f"Another watcher is using {path}.") from None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # A line cut short by a crash
+                        continue
+                    self.entries[record["key"]] = record
+        except FileNotFoundError:
+            pass
+        # Forget files that are gone; they cannot come back with the same key
+        self.entries = {key: record for key, record in self.entries.items() if os.path.exists(record["path"])}
+        write_atomic(path, "".join(json.dumps(record) + "\n" for record in self.entries.values()).encode("utf-8"))
+        self.file = open(path, "a", encoding="utf-8")
+
+    @staticmethod
+    def key_for(path, stat):
+        return f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}"
+
+    def state(self, key):
+        record = self.entries.get(key)
+        return record["state"] if record else None
+
+    def output_for(self, key):
+        record = self.entries.get(key)
+        return record.get("output") if record else None
+
+    def record(self, key, path, state, **fields):
+        record = dict(fields, key=key, path=os.path.abspath(path), state=state, time=time.time())
+        self.file.write(json.dumps(record) + "\n")
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.entries[key] = record
+
+    def close(self):
+        self.file.close()
+        self.lock.close()
+
+class WatchedFolder:
+    # One input folder, the operation its files go through and where the
+    # outputs go. merge folders collect files into a batch that is merged once
+    # no new file has arrived for batch_window seconds.
+    def __init__(self, path, operation, output_dir, options, batch_window=10.0):
+        if operation not in BATCH_OPERATIONS:
+            raise ValueError(f"Unknown operation {operation}.")
+        self.path = os.path.abspath(path)
+        self.operation = operation
+        self.output_dir = os.path.abspath(output_dir)
+        if self.output_dir == self.path:
+            raise ValueError(f"Outputs for {path} must go to another folder.")
+        self.options = options
+        self.batch_window = batch_window
+        self.extensions = WATCH_EXTENSIONS[operation]
+        self.batch = []
+        self.last_arrival = 0.0
+
+    def accepts(self, name):
+        if WATCH_IGNORED.search(name):
+            return False
+        ext = os.path.splitext(name)[1].lower()
+        if self.extensions is None:
+            require("image")
+            return ext in deps.Image.registered_extensions()
+        return ext in self.extensions
+
+class HotFolderService:
+    # Watches folders and runs each file that arrives through its folder's
+    # operation on a process pool. A file is taken once its size and mtime have
+    # not changed for `settle` seconds. At most workers * 2 jobs are in flight;
+    # the rest wait as paths in a queue, so a flood of arrivals costs no more
+    # than their names. Every folder is scanned again each rescan_interval
+    # seconds (and on start) in case events were missed.
+    def __init__(self, folders, journal, workers=None, settle=2.0, poll_interval=2.0, rescan_interval=60.0,
+                 use_inotify=True, on_result=None):
+        self.folders = {folder.path: folder for folder in folders}
+        self.journal = journal
+        self.workers = workers or os.cpu_count() or 1
+        self.settle = settle
+        self.poll_interval = poll_interval
+        self.rescan_interval = rescan_interval
+        self.use_inotify = use_inotify
+        self.on_result = on_result
+        # path -> ((size, mtime), when that was first seen)
+        self.seen = {}
+        # Keys of files in a batch, the queue or the pool
+        self.taken = set()
+        self.ready = deque()
+        self.retry = deque()
+        self.in_flight = {}
+        self.reserved = set()
+        self.stop_event = threading.Event()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def idle(self):
+        return not (self.seen or self.taken)
+
+    def run(self, once=False):
+        # With once=True, handles what is in the folders now and returns
+        for folder in self.folders.values():
+            os.makedirs(folder.output_dir, exist_ok=True)
+            sweep_workspaces(folder.output_dir)
+        watcher = folder_watcher(list(self.folders), self.poll_interval, self.use_inotify)
+        pool = self._new_pool()
+        try:
+            self.scan()
+            next_rescan = time.monotonic() + self.rescan_interval
+            while not self.stop_event.is_set():
+                changed = watcher.wait(self.poll_interval if self.idle() else 0.25)
+                if changed is None or time.monotonic() >= next_rescan:
+                    self.scan()
+                    next_rescan = time.monotonic() + self.rescan_interval
+                else:
+                    for path in changed:
+                        self.note(path)
+                self.check_stable(flush_batches=once)
+                pool = self.submit(pool)
+                self.collect()
+                if once and self.idle():
+                    break
+            # Let running jobs finish; files still queued are taken again on the next start
+            while self.in_flight:
+                wait(list(self.in_flight), return_when=FIRST_COMPLETED)
+                self.collect(retry=False)
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+            watcher.close()
+
+    def _new_pool(self):
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=worker_context(), initializer=_init_service_worker)
+
+    def scan(self):
+        for folder in self.folders.values():
+            try:
+                entries = list(os.scandir(folder.path))
+            except FileNotFoundError:
+                continue
+            for entry in entries:
+                self.note(entry.path)
+
+    def note(self, path):
+        folder = self.folders.get(os.path.dirname(os.path.abspath(path)))
+        if folder is None or not folder.accepts(os.path.basename(path)):
+            return
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            self.seen.pop(path, None)
+            return
+        key = WatchJournal.key_for(path, stat)
+        if not os.path.isfile(path) or key in self.taken or self.journal.state(key) in ("done", "failed"):
+            return
+        signature = (stat.st_size, stat.st_mtime_ns)
+        previous = self.seen.get(path)
+        if previous is None or previous[0] != signature:
+            self.seen[path] = (signature, time.monotonic())
+
+    def check_stable(self, flush_batches=False):
+        now = time.monotonic()
+        for path, (signature, since) in list(self.seen.items()):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                del self.seen[path]
+                continue
+            if (stat.st_size, stat.st_mtime_ns) != signature:
+                self.seen[path] = ((stat.st_size, stat.st_mtime_ns), now)
+            elif now - since >= self.settle:
+                del self.seen[path]
+                self.take(path, stat)
+        for folder in self.folders.values():
+            if not folder.batch or any(os.path.dirname(path) == folder.path for path in self.seen):
+                continue
+            if flush_batches or now - folder.last_arrival >= folder.batch_window:
+                batch, folder.batch = sorted(folder.batch, key=lambda item: item[1]), []
+                self.ready.append((folder, batch))
+
+    def take(self, path, stat):
+        key = WatchJournal.key_for(path, stat)
+        if key in self.taken or self.journal.state(key) in ("done", "failed"):
+            return
+        self.taken.add(key)
+        folder = self.folders[os.path.dirname(path)]
+        if folder.operation == "merge":
+            folder.batch.append((key, path))
+            folder.last_arrival = time.monotonic()
+        else:
+            self.ready.append((folder, [(key, path)]))
+
+    def output_path(self, folder, items):
+        # A file taken on before a restart keeps the output it was given; new
+        # ones get a name that no earlier output or running job is using
+        earlier = self.journal.output_for(items[0][0])
+        if earlier:
+            return earlier
+        inputs = [path for _, path in items]
+        if folder.operation == "merge":
+            name = f"merged_{time.strftime('%Y%m%d-%H%M%S')}.pdf"
+            job = build_batch_jobs("merge", inputs, folder.output_dir, folder.options, os.path.join(folder.output_dir, name))[0]
+        else:
+            job = build_batch_jobs(folder.operation, inputs, folder.output_dir, folder.options)[0]
+        root, ext = os.path.splitext(job.output_path)
+        path, n = job.output_path, 1
+        while os.path.exists(path) or path in self.reserved:
+            n += 1
+            path = f"{root}-{n}{ext}"
+        return path
+
+    def submit(self, pool):
+        # Files whose worker died run again one at a time, so a file that kills
+        # the worker by itself fails without taking other files with it
+        if self.retry:
+            if not self.in_flight:
+                folder, items = self.retry.popleft()
+                pool = self.start(pool, folder, items, retried=True)
+            return pool
+        while self.ready and len(self.in_flight) < self.workers * 2:
+            folder, items = self.ready.popleft()
+            pool = self.start(pool, folder, items)
+        return pool
+
+    def start(self, pool, folder, items, retried=False):
+        output_path = self.output_path(folder, items)
+        self.reserved.add(output_path)
+        for key, path in items:
+            self.journal.record(key, path, "queued", output=output_path, operation=folder.operation)
+        args = (folder.operation, [path for _, path in items], output_path, folder.options)
+        try:
+            future = pool.submit(run_batch_job, *args)
+        except BrokenExecutor:
+            # A worker died earlier; the pool cannot be used again
+            pool.shutdown(wait=False, cancel_futures=True)
+            pool = self._new_pool()
+            future = pool.submit(run_batch_job, *args)
+        self.in_flight[future] = (folder, items, output_path, retried)
+        return pool
+
+    def collect(self, retry=True):
+        for future in [future for future in self.in_flight if future.done()]:
+            folder, items, output_path, retried = self.in_flight.pop(future)
+            self.reserved.discard(output_path)
+            try:
+                result = future.result()
+            except Exception as e:
+                if not retried:
+                    if retry:
+                        self.retry.append((folder, items))
+                    # When stopping, the files stay queued for the next start
+                    continue
+                result = {
+                    "operation": folder.operation,
+                    "inputs": [path for _, path in items],
+                    "output": output_path,
+                    "ok": False,
+                    "error": f"worker failed: {type(e).__name__}: {e}",
+                    "seconds": 0.0,
+                    "bytes_in": 0,
+                    "bytes_out": 0,
+                }
+            for key, path in items:
+                self.journal.record(key, path, "done" if result["ok"] else "failed", output=output_path,
+                                    operation=folder.operation, error=result["error"])
+                self.taken.discard(key)
+            if self.on_result:
+                self.on_result(result)
@@ -0,0 +1,43 @@
+# Process pool helpers shared by everything that fans work out to workers
+
+import itertools
+import multiprocessing
+from concurrent.futures import Future, BrokenExecutor, wait, FIRST_COMPLETED
+
+def submit_bounded(pool, calls, limit):
+    # Submits (key, func, args) calls with at most limit in flight and yields
+    # (key, future) as each completes, so a long input list never queues every
+    # job (and its result) in memory at once. Unstarted calls are cancelled if
+    # the consumer stops early.
+    calls = iter(calls)
+    pending = {}
+
+    def submit(func, args):
+        try:
+            return pool.submit(func, *args)
+        except BrokenExecutor as e:
+            # A worker died; every call still to come fails the same way
+            future = Future()
+            future.set_exception(e)
+            return future
+
+    try:
+        for key, func, args in itertools.islice(calls, limit):
+            pending[submit(func, args)] = key
+        while pending:
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                key = pending.pop(future)
+                for next_key, func, args in itertools.islice(calls, 1):
+                    pending[submit(func, args)] = next_key
+                yield key, future
+    finally:
+        for future in pending:
+            future.cancel()
+
+def worker_context():
+    # Process pools start their workers with spawn. A forked child gets a copy
+    # of every lock as it was at that moment, and one held by another thread
+    # is never released in it; spawned workers start clean and import the
+    # module themselves.
+    return multiprocessing.get_context("spawn")
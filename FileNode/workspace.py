@@ -0,0 +1,165 @@
+# Private work folders for jobs, and moving finished outputs into place
+
+import time
+import os
+import shutil
+import threading
+import tempfile
+import atexit
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+from FileNode.files import copy_file, remove_files
+from FileNode.tracing import tracer
+
+def save_output(src, dst, move=True):
+    # Puts a finished output at the chosen path: a rename when both are on the
+    # same filesystem, otherwise a copy into a .part file next to dst that takes
+    # its name once complete. Returns where the data lives now.
+    if os.path.abspath(src) == os.path.abspath(dst):
+        return dst
+    with tracer.span("save", "io", output=dst) as args:
+        if move:
+            try:
+                os.replace(src, dst)
+                args["method"] = "rename"
+                return dst
+            except OSError:
+                # Different filesystem (or drive)
+                pass
+        args["method"] = "copy"
+        root, ext = os.path.splitext(dst)
+        part_path = f"{root}.part{ext}"
+        try:
+            copy_file(src, part_path)
+            os.replace(part_path, dst)
+        except BaseException:
+            remove_files([part_path])
+            raise
+        if move:
+            remove_files([src])
+        return dst
+
+WORKSPACE_PREFIX = ".filenode-work-"
+
+def hold_lock(path):
+    # Opens path and takes an exclusive lock that lasts until the file is closed
+    # (or the process dies).
+    f = open(path, "a+b")
+    try:
+        if os.name == "nt":
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        raise
+    return f
+
+def lock_is_held(path):
+    try:
+        hold_lock(path).close()
+    except FileNotFoundError:
+        return False
+    except OSError:
+        return True
+    return False
+
+class Workspace:
+    # A private directory for one job's outputs, so jobs running side by side
+    # never write to the same name. A lock file stays held while the workspace
+    # is in use; sweep_workspaces removes the ones whose process has gone.
+    def __init__(self, root=None):
+        root = root or os.path.join(tempfile.gettempdir(), "FileNode")
+        os.makedirs(root, exist_ok=True)
+        self.path = tempfile.mkdtemp(prefix=WORKSPACE_PREFIX, dir=root)
+        self.lock = hold_lock(os.path.join(self.path, ".lock"))
+        self.outputs = []
+
+    def path_for(self, name):
+        path = os.path.join(self.path, name)
+        self.outputs.append(path)
+        return path
+
+    def cleanup(self):
+        if self.lock is not None:
+            self.lock.close()
+            self.lock = None
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cleanup()
+
+def sweep_workspaces(root=None, min_age=60):
+    # Removes workspaces left behind by a crash. Ones younger than min_age
+    # seconds are skipped, as their lock may not be taken yet.
+    root = root or os.path.join(tempfile.gettempdir(), "FileNode")
+    try:
+        entries = list(os.scandir(root))
+    except FileNotFoundError:
+        return
+    for entry in entries:
+        if not entry.name.startswith(WORKSPACE_PREFIX) or not entry.is_dir():
+            continue
+        try:
+            if time.time() - entry.stat().st_mtime < min_age:
+                continue
+        except OSError:
+            continue
+        if not lock_is_held(os.path.join(entry.path, ".lock")):
+            shutil.rmtree(entry.path, ignore_errors=True)
+
+class WorkspaceManager:
+    # Tracks the workspaces a process has open and removes them when released,
+    # and any still open at exit.
+    def __init__(self, root=None):
+        self.root = root
+        self.lock = threading.Lock()
+        self.workspaces = []
+        sweep_workspaces(root)
+        atexit.register(self.release_all)
+
+    def create(self):
+        workspace = Workspace(self.root)
+        with self.lock:
+            self.workspaces.append(workspace)
+        return workspace
+
+    def release(self, workspace):
+        with self.lock:
+            if workspace in self.workspaces:
+                self.workspaces.remove(workspace)
+        workspace.cleanup()
+
+    def release_all(self):
+        with self.lock:
+            workspaces, self.workspaces = self.workspaces, []
+        for workspace in workspaces:
+            workspace.cleanup()
+
+def publish_output(src, dst):
+    # Moves a finished output from a workspace to its final place. Folders are
+    # merged file by file into an existing folder of the same name.
+    if os.path.isdir(src):
+        os.makedirs(dst, exist_ok=True)
+        for entry in os.scandir(src):
+            os.replace(entry.path, os.path.join(dst, entry.name))
+        os.rmdir(src)
+    else:
+        os.replace(src, dst)
+
+def rebase_paths(value, old, new):
+    # Rewrites paths under old to point under new, in a tool's report
+    if isinstance(value, str):
+        return new + value[len(old):] if value == old or value.startswith(old + os.sep) else value
+    if isinstance(value, list):
+        return [rebase_paths(item, old, new) for item in value]
+    if isinstance(value, dict):
+        return {key: rebase_paths(item, old, new) for key, item in value.items()}
+    return value
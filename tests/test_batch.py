@@ -0,0 +1,79 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from FileNode.batch import BatchRunner, build_batch_jobs
+
+class BatchTestCase(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def write_text(self, name, lines=20):
+        path = os.path.join(self.root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("".join(f"line {n}\n" for n in range(lines)))
+        return path
+
+class BuildJobsTest(BatchTestCase):
+    def test_one_job_per_input(self):
+        inputs = [self.write_text("a.txt"), self.write_text("b.txt")]
+        jobs = build_batch_jobs("text-to-pdf", inputs, "out", {})
+        self.assertEqual([job.inputs for job in jobs], [[inputs[0]], [inputs[1]]])
+        self.assertEqual([job.output_path for job in jobs], [os.path.join("out", "a.pdf"), os.path.join("out", "b.pdf")])
+
+    def test_same_names_get_numbered(self):
+        inputs = [self.write_text("x/notes.txt"), self.write_text("y/notes.txt")]
+        jobs = build_batch_jobs("text-to-pdf", inputs, "out", {})
+        self.assertEqual([os.path.basename(job.output_path) for job in jobs], ["notes.pdf", "notes-2.pdf"])
+
+    def test_merge_is_one_job(self):
+        inputs = [os.path.join(self.root, "a.pdf"), os.path.join(self.root, "b.pdf")]
+        jobs = build_batch_jobs("merge", inputs, "out", {}, output="merged.pdf")
+        self.assertEqual(len(jobs), 1)
+        self.assertEqual(jobs[0].output_path, "merged.pdf")
+
+class RunnerTest(BatchTestCase):
+    def run_jobs(self, inputs, workers):
+        output_dir = os.path.join(self.root, "out")
+        os.makedirs(output_dir)
+        jobs = build_batch_jobs("text-to-pdf", inputs, output_dir, {"cache": False})
+        seen = []
+        results = BatchRunner(workers, lambda result, done, total: seen.append((done, total))).run(jobs)
+        self.assertEqual(seen, [(n, len(jobs)) for n in range(1, len(jobs) + 1)])
+        return results
+
+    def test_pool_runs_every_job(self):
+        inputs = [self.write_text("a.txt"), self.write_text("b.txt"), self.write_text("c.txt")]
+        results = self.run_jobs(inputs, workers=2)
+        self.assertTrue(all(r["ok"] for r in results), [r["error"] for r in results])
+        for r in results:
+            with open(r["output"], "rb") as f:
+                self.assertEqual(f.read(5), b"%PDF-")
+
+    def test_progress_from_the_workers(self):
+        inputs = [self.write_text("a.txt"), self.write_text("b.txt")]
+        output_dir = os.path.join(self.root, "out")
+        os.makedirs(output_dir)
+        jobs = build_batch_jobs("text-to-pdf", inputs, output_dir, {"cache": False})
+        events = []
+        results = BatchRunner(2, None, lambda job_index, event: events.append((job_index, event))).run(jobs)
+        self.assertTrue(all(r["ok"] for r in results))
+        # Every job reports its last event as finished
+        finished = {job_index for job_index, event in events if event.finished}
+        self.assertEqual(finished, {0, 1})
+
+    def test_failure_is_a_result(self):
+        inputs = [self.write_text("a.txt"), os.path.join(self.root, "missing.txt")]
+        results = self.run_jobs(inputs, workers=2)
+        by_input = {r["inputs"][0]: r for r in results}
+        self.assertTrue(by_input[inputs[0]]["ok"])
+        self.assertFalse(by_input[inputs[1]]["ok"])
+        self.assertIn("FileNotFoundError", by_input[inputs[1]]["error"])
+
+if __name__ == "__main__":
+    unittest.main()
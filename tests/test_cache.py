@@ -0,0 +1,89 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from FileNode.cache import ResultCache
+
+class ResultCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.cache_root = os.path.join(self.root, "cache")
+        os.makedirs(self.cache_root)
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def write(self, name, data):
+        path = os.path.join(self.root, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def compute_into(self, output_path, data, calls):
+        def compute():
+            calls.append(output_path)
+            with open(output_path, "wb") as f:
+                f.write(data)
+            return output_path
+        return compute
+
+    def test_second_run_is_a_hit(self):
+        cache = ResultCache(self.cache_root)
+        source = self.write("in.txt", b"text")
+        calls = []
+        first = os.path.join(self.root, "first.pdf")
+        second = os.path.join(self.root, "second.pdf")
+        self.assertEqual(cache.run("text-to-pdf", [source], {}, first, self.compute_into(first, b"pdf", calls)), (first, False))
+        details, hit = cache.run("text-to-pdf", [source], {}, second, self.compute_into(second, b"pdf", calls))
+        self.assertTrue(hit)
+        # The report points at the new output, not where it was first written
+        self.assertEqual(details, second)
+        self.assertEqual(calls, [first])
+        with open(second, "rb") as f:
+            self.assertEqual(f.read(), b"pdf")
+
+    def test_options_and_contents_change_the_key(self):
+        cache = ResultCache(self.cache_root)
+        source = self.write("in.txt", b"text")
+        key = cache.key_for("text-to-pdf", [source], {}, "out.pdf")
+        self.assertNotEqual(key, cache.key_for("text-to-pdf", [source], {"max_pages": 5}, "out.pdf"))
+        # Options the operation does not use are ignored
+        self.assertEqual(key, cache.key_for("text-to-pdf", [source], {"quality": 5}, "out.pdf"))
+        time.sleep(0.01)
+        self.write("in.txt", b"other text")
+        self.assertNotEqual(key, cache.key_for("text-to-pdf", [source], {}, "out.pdf"))
+
+    def test_eviction_drops_least_recently_used(self):
+        cache = ResultCache(self.cache_root, max_bytes=2500)
+        keys = []
+        for n in range(3):
+            output = self.write(f"out{n}.pdf", os.urandom(1000))
+            key = f"{n:02d}" * 32
+            cache.store(key, output, output)
+            keys.append(key)
+            # Older entries look older, whatever the filesystem's mtime resolution
+            os.utime(os.path.join(cache.path_for(key), "meta.json"), (1000 + n, 1000 + n))
+            if n == 1:
+                # A hit on the first entry makes the second the oldest
+                self.assertIsNotNone(cache.restore(keys[0], os.path.join(self.root, "restored.pdf")))
+        remaining = {os.path.basename(path) for _, _, path in cache.entries()}
+        self.assertEqual(remaining, {keys[0], keys[2]})
+        self.assertLessEqual(cache.size, 2500)
+
+    def test_failed_items_are_not_stored(self):
+        cache = ResultCache(self.cache_root)
+        output = self.write("out.pdf", b"pdf")
+        cache.store("ab" * 32, output, [{"output": output, "ok": True}, {"output": None, "ok": False}])
+        self.assertEqual(cache.entries(), [])
+
+    def test_damaged_entry_is_a_miss(self):
+        cache = ResultCache(self.cache_root)
+        output = self.write("out.pdf", b"pdf")
+        cache.store("ab" * 32, output, output)
+        os.remove(os.path.join(cache.path_for("ab" * 32), "0"))
+        self.assertIsNone(cache.restore("ab" * 32, os.path.join(self.root, "restored.pdf")))
+
+if __name__ == "__main__":
+    unittest.main()
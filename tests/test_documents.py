@@ -0,0 +1,101 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from PyPDF2 import PdfWriter
+
+from FileNode.documents import DocumentCache, parse_page_ranges, split_page_spec
+
+class PageRangesTest(unittest.TestCase):
+    def test_pages_and_ranges_in_the_order_given(self):
+        self.assertEqual(parse_page_ranges("4-5, 1", 10), [3, 4, 0])
+
+    def test_open_ends(self):
+        self.assertEqual(parse_page_ranges("8-", 10), [7, 8, 9])
+        self.assertEqual(parse_page_ranges("-2", 10), [0, 1])
+
+    def test_outside_the_document(self):
+        with self.assertRaises(ValueError):
+            parse_page_ranges("9-11", 10)
+        with self.assertRaises(ValueError):
+            parse_page_ranges("0", 10)
+
+    def test_reversed_range(self):
+        with self.assertRaisesRegex(ValueError, "3-1 is reversed"):
+            parse_page_ranges("3-1", 10)
+
+    def test_page_listed_twice(self):
+        with self.assertRaisesRegex(ValueError, "Page 1 is listed more than once"):
+            parse_page_ranges("1,1", 10)
+        with self.assertRaisesRegex(ValueError, "Page 2 is listed more than once"):
+            parse_page_ranges("1-3,2", 10)
+
+    def test_empty(self):
+        with self.assertRaises(ValueError):
+            parse_page_ranges(" , ", 10)
+
+class PageSpecTest(unittest.TestCase):
+    def test_path_with_pages(self):
+        self.assertEqual(split_page_spec("report.pdf:1-5,8"), ("report.pdf", "1-5,8"))
+
+    def test_plain_path(self):
+        self.assertEqual(split_page_spec("report.pdf"), ("report.pdf", None))
+
+    def test_drive_letter(self):
+        self.assertEqual(split_page_spec("C:\\scans\\report.pdf"), ("C:\\scans\\report.pdf", None))
+        self.assertEqual(split_page_spec("C:\\scans\\report.pdf:2"), ("C:\\scans\\report.pdf", "2"))
+
+class DocumentCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.cache = DocumentCache(max_open=2)
+
+    def tearDown(self):
+        self.cache.clear()
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def write_pdf(self, name, pages=1):
+        writer = PdfWriter()
+        for _ in range(pages):
+            writer.add_blank_page(100, 200)
+        path = os.path.join(self.root, name)
+        with open(path, "wb") as f:
+            writer.write(f)
+        return path
+
+    def test_unchanged_file_shares_one_document(self):
+        path = self.write_pdf("a.pdf")
+        with self.cache.open(path) as first, self.cache.open(path) as second:
+            self.assertIs(first, second)
+            self.assertEqual(first.users, 2)
+        self.assertEqual(first.users, 0)
+        self.assertFalse(first.closed)
+
+    def test_changed_file_gets_a_fresh_document(self):
+        path = self.write_pdf("a.pdf")
+        with self.cache.open(path) as old:
+            self.assertEqual(old.page_count, 1)
+        self.write_pdf("a.pdf", pages=3)
+        os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 10 ** 9))
+        with self.cache.open(path) as new:
+            self.assertEqual(new.page_count, 3)
+        self.assertTrue(old.closed)
+
+    def test_evicted_documents_close_once_unused(self):
+        paths = [self.write_pdf(f"{n}.pdf") for n in range(3)]
+        held = self.cache.open(paths[0])
+        with self.cache.open(paths[1]) as unused:
+            pass
+        # Opening a third pushes the first out while it is still in use
+        with self.cache.open(paths[2]):
+            pass
+        self.assertTrue(held.evicted)
+        self.assertFalse(held.closed)
+        self.assertEqual(held.page_count, 1)
+        held.release()
+        self.assertTrue(held.closed)
+        self.assertFalse(unused.closed)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from docx import Document
+from PyPDF2 import PdfReader
+
+from FileNode.office import DocxStreamWriter, close_docx_pools, docx_text_rows
+from FileNode.tools import PDFTools, TextTools, WordTools
+
+class DocxTestCase(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+class StreamWriterTest(DocxTestCase):
+    def test_paragraphs_round_trip(self):
+        path = os.path.join(self.root, "out.docx")
+        doc = DocxStreamWriter(path)
+        doc.add_paragraph("first")
+        doc.add_paragraph("a\tb\nc")
+        doc.add_paragraph("<tags> & \x07bell")
+        doc.close()
+        paragraphs = [p.text for p in Document(path).paragraphs]
+        self.assertEqual(paragraphs[-3:], ["first", "a\tb\nc", "<tags> & bell"])
+
+    def test_abort_leaves_no_document_xml(self):
+        path = os.path.join(self.root, "out.docx")
+        doc = DocxStreamWriter(path)
+        doc.add_paragraph("partial")
+        doc.abort()
+        with self.assertRaises(Exception):
+            Document(path)
+
+class PdfToWordTest(DocxTestCase):
+    def write_text_pdf(self, lines):
+        text_path = os.path.join(self.root, "in.txt")
+        with open(text_path, "w", encoding="utf-8") as f:
+            f.write("".join(f"line {n}\n" for n in range(lines)))
+        return TextTools().convert_text_to_pdf(text_path, os.path.join(self.root, "in.pdf"))["outputs"][0]
+
+    def convert(self, pdf_path, name, **kwargs):
+        output = PDFTools().convert_pdf_to_word(pdf_path, os.path.join(self.root, name), **kwargs)
+        return [p.text for p in Document(output).paragraphs if p.text]
+
+    def test_parallel_matches_serial(self):
+        # Enough lines for several pages, extracted one page per batch
+        pdf_path = self.write_text_pdf(90)
+        serial = self.convert(pdf_path, "serial.docx")
+        parallel = self.convert(pdf_path, "parallel.docx", workers=2, batch_size=1)
+        self.assertGreater(len(serial), 1)
+        self.assertEqual(parallel, serial)
+        self.assertIn("line 89", serial[-1])
+
+class DocxToPdfTest(DocxTestCase):
+    def write_docx(self):
+        doc = Document()
+        doc.add_heading("Report", level=1)
+        doc.add_paragraph("First point", style="List Bullet")
+        table = doc.add_table(rows=1, cols=2)
+        table.rows[0].cells[0].text = "left"
+        table.rows[0].cells[1].text = "right"
+        doc.add_page_break()
+        doc.add_paragraph("Second page")
+        path = os.path.join(self.root, "in.docx")
+        doc.save(path)
+        return path
+
+    def test_text_rows_follow_the_document(self):
+        rows = list(docx_text_rows(Document(self.write_docx()), 40))
+        text = [row for row in rows if row]
+        self.assertEqual(text[:4], ["Report", "======", "\u2022 First point", "left | right"])
+        self.assertIn(None, rows)
+        self.assertEqual(text[-1], "Second page")
+
+    def test_text_backend_writes_a_page_per_break(self):
+        try:
+            output = WordTools().convert_docx_to_pdf(self.write_docx(), os.path.join(self.root, "out.pdf"), backend="text")
+        finally:
+            close_docx_pools()
+        pages = PdfReader(output).pages
+        self.assertEqual(len(pages), 2)
+        self.assertIn("Second page", pages[1].extract_text())
+
+if __name__ == "__main__":
+    unittest.main()
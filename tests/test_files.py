@@ -0,0 +1,59 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from FileNode.files import copy_file
+from FileNode.workspace import save_output
+
+class FilesTestCase(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def write(self, name, data):
+        path = os.path.join(self.root, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def read(self, path):
+        with open(path, "rb") as f:
+            return f.read()
+
+class CopyFileTest(FilesTestCase):
+    def test_copy_matches_source(self):
+        data = os.urandom(3 * 1024 * 1024 + 17)
+        dst = os.path.join(self.root, "copy.bin")
+        copy_file(self.write("src.bin", data), dst)
+        self.assertEqual(self.read(dst), data)
+
+    def test_empty_file(self):
+        dst = os.path.join(self.root, "copy.bin")
+        copy_file(self.write("src.bin", b""), dst)
+        self.assertEqual(self.read(dst), b"")
+
+class SaveOutputTest(FilesTestCase):
+    def test_move_renames(self):
+        src = self.write("out.pdf", b"data")
+        dst = os.path.join(self.root, "saved.pdf")
+        self.assertEqual(save_output(src, dst), dst)
+        self.assertFalse(os.path.exists(src))
+        self.assertEqual(self.read(dst), b"data")
+
+    def test_copy_keeps_source_and_leaves_no_part_file(self):
+        src = self.write("out.pdf", b"data")
+        dst = os.path.join(self.root, "saved.pdf")
+        save_output(src, dst, move=False)
+        self.assertEqual(self.read(src), b"data")
+        self.assertEqual(sorted(os.listdir(self.root)), ["out.pdf", "saved.pdf"])
+
+    def test_same_path_is_a_no_op(self):
+        src = self.write("out.pdf", b"data")
+        self.assertEqual(save_output(src, src), src)
+        self.assertEqual(self.read(src), b"data")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+from PIL import Image
+
+from FileNode.images import encode_image, load_image
+from FileNode.tools import ImageTools
+
+class ImageTestCase(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def write_image(self, name, size=(160, 120), mode="RGB"):
+        # Noise, so quality makes a real difference to the encoded size
+        rng = random.Random(7)
+        img = Image.frombytes(mode, size, bytes(rng.randrange(256) for _ in range(size[0] * size[1] * len(mode))))
+        path = os.path.join(self.root, name)
+        img.save(path)
+        return path
+
+class LoadImageTest(ImageTestCase):
+    def test_max_dimension_keeps_aspect(self):
+        for name in ("in.jpg", "in.png"):
+            img = load_image(self.write_image(name, size=(400, 200)), max_dimension=100)
+            self.assertEqual(img.size, (100, 50))
+
+    def test_small_images_are_left_alone(self):
+        img = load_image(self.write_image("in.png", size=(40, 20)), max_dimension=100)
+        self.assertEqual(img.size, (40, 20))
+
+class ReduceToSizeTest(ImageTestCase):
+    def test_highest_quality_that_fits(self):
+        path = self.write_image("in.png")
+        img = Image.open(path)
+        target = len(encode_image(img, "JPEG", 50))
+        result = ImageTools().reduce_image_to_size(path, os.path.join(self.root, "out.jpg"), target, workers=2)
+        self.assertTrue(result["met"])
+        self.assertEqual(result["scale"], 1.0)
+        self.assertLessEqual(os.path.getsize(result["output"]), target)
+        self.assertGreaterEqual(result["quality"], 50)
+        self.assertGreater(len(encode_image(img, "JPEG", result["quality"] + 1)), target)
+
+    def test_scales_down_when_min_quality_is_too_big(self):
+        path = self.write_image("in.png")
+        target = len(encode_image(Image.open(path), "JPEG", 10)) // 3
+        result = ImageTools().reduce_image_to_size(path, os.path.join(self.root, "out.jpg"), target, workers=2)
+        self.assertTrue(result["met"])
+        self.assertLess(result["scale"], 1.0)
+        self.assertLessEqual(result["size"], target)
+
+    def test_alpha_is_flattened_for_jpeg(self):
+        path = self.write_image("in.png", mode="RGBA")
+        result = ImageTools().reduce_image_to_size(path, os.path.join(self.root, "out.jpg"), 20000, workers=1)
+        self.assertEqual(Image.open(result["output"]).mode, "RGB")
+
+    def test_lossless_output_is_refused(self):
+        path = self.write_image("in.png")
+        with self.assertRaises(ValueError):
+            ImageTools().reduce_image_to_size(path, os.path.join(self.root, "out.png"), 10000)
+
+class ConvertImagesTest(ImageTestCase):
+    def test_pool_converts_every_file_in_order(self):
+        inputs = [self.write_image("a.png"), self.write_image("b.png"), os.path.join(self.root, "missing.png")]
+        output_dir = os.path.join(self.root, "out")
+        reports = ImageTools().convert_images(inputs, output_dir, "webp", quality=60, workers=2)
+        self.assertEqual([r["input"] for r in reports], inputs)
+        self.assertEqual([r["ok"] for r in reports], [True, True, False])
+        for r in reports[:2]:
+            self.assertEqual(Image.open(r["output"]).format, "WEBP")
+
+if __name__ == "__main__":
+    unittest.main()
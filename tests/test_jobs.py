@@ -0,0 +1,53 @@
+import threading
+import unittest
+
+from FileNode.jobs import JobScheduler, PRIORITY_BULK, PRIORITY_INTERACTIVE
+
+class SchedulerTest(unittest.TestCase):
+    def setUp(self):
+        # One worker, held busy until the test has queued what it needs
+        self.scheduler = JobScheduler(workers=1)
+        self.gate = threading.Event()
+        self.blocker = self.scheduler.submit(lambda job: self.gate.wait(5))
+
+    def test_interactive_runs_before_bulk(self):
+        order = []
+        bulk = self.scheduler.submit(lambda job: order.append("bulk"), priority=PRIORITY_BULK)
+        interactive = self.scheduler.submit(lambda job: order.append("interactive"), priority=PRIORITY_INTERACTIVE)
+        self.gate.set()
+        self.assertTrue(bulk.finished.wait(5) and interactive.finished.wait(5))
+        self.assertEqual(order, ["interactive", "bulk"])
+
+    def test_cancelled_before_start_never_runs(self):
+        ran = []
+        job = self.scheduler.submit(lambda job: ran.append(True))
+        self.scheduler.cancel(job.id)
+        self.gate.set()
+        self.assertTrue(job.finished.wait(5))
+        self.assertEqual(job.state, "cancelled")
+        self.assertEqual(ran, [])
+
+    def test_running_job_stops_at_its_check(self):
+        started = threading.Event()
+        def work(job):
+            started.set()
+            job.token.event.wait(5)
+            job.token.check()
+        self.gate.set()
+        job = self.scheduler.submit(work)
+        self.assertTrue(started.wait(5))
+        self.scheduler.cancel(job.id)
+        self.assertTrue(job.finished.wait(5))
+        self.assertEqual(job.state, "cancelled")
+
+    def test_failure_is_recorded(self):
+        def work(job):
+            raise RuntimeError("boom")
+        self.gate.set()
+        job = self.scheduler.submit(work)
+        self.assertTrue(job.finished.wait(5))
+        self.assertEqual(job.state, "failed")
+        self.assertIsInstance(job.error, RuntimeError)
+
+if __name__ == "__main__":
+    unittest.main()
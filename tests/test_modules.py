@@ -0,0 +1,19 @@
+import subprocess
+import sys
+import unittest
+
+HEADLESS = ['deps', 'files', 'tracing', 'workers', 'jobs', 'workspace', 'documents', 'pdf_writer', 'office', 'images', 'tools', 'cache', 'batch', 'pipeline', 'watch', 'bench', 'service', 'cli']
+
+class HeadlessImportTest(unittest.TestCase):
+    def test_headless_modules_leave_the_window_unloaded(self):
+        # In a fresh interpreter, since this one may have imported the window already
+        code = (
+            "import sys\n"
+            f"for name in {HEADLESS!r}: __import__('FileNode.' + name)\n"
+            "print(' '.join(m for m in ('tkinter', 'customtkinter', 'PIL', 'PyPDF2', 'docx',) if m in sys.modules))\n"
+        )
+        loaded = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout.split()
+        self.assertEqual(loaded, [])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+import os
+import shutil
+import tempfile
+import unittest
+import zlib
+
+from PyPDF2 import PdfReader, PdfWriter
+from PyPDF2.generic import DecodedStreamObject, DictionaryObject, NameObject, NumberObject
+
+from FileNode.tools import PDFTools
+
+SIDE = 64
+
+def noise(seed):
+    # Does not deflate, so a JPEG of it is always much smaller
+    return bytes((seed * 7919 + i * 104729 + (i * i) % 251) % 256 for i in range(SIDE * SIDE * 3))
+
+def write_image_pdf(path, images):
+    # One page per image, each drawing its own image XObject
+    writer = PdfWriter()
+    for raw in images:
+        writer.add_blank_page(200, 200)
+        page = writer.pages[-1]
+        image = DecodedStreamObject()
+        image._data = zlib.compress(raw)
+        image.update({
+            NameObject("/Type"): NameObject("/XObject"),
+            NameObject("/Subtype"): NameObject("/Image"),
+            NameObject("/Width"): NumberObject(SIDE),
+            NameObject("/Height"): NumberObject(SIDE),
+            NameObject("/ColorSpace"): NameObject("/DeviceRGB"),
+            NameObject("/BitsPerComponent"): NumberObject(8),
+            NameObject("/Filter"): NameObject("/FlateDecode"),
+        })
+        content = DecodedStreamObject()
+        # Long enough to be worth deflating
+        content.set_data(b"q 200 0 0 200 0 0 cm /Im0 Do Q\n" * 4)
+        page[NameObject("/Resources")] = DictionaryObject({
+            NameObject("/XObject"): DictionaryObject({NameObject("/Im0"): writer._add_object(image)}),
+        })
+        page[NameObject("/Contents")] = writer._add_object(content)
+    with open(path, "wb") as f:
+        writer.write(f)
+    return path
+
+def page_image(page):
+    return page["/Resources"]["/XObject"].raw_get("/Im0")
+
+class OptimizeTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_identical_images_are_stored_once(self):
+        source = write_image_pdf(os.path.join(self.root, "in.pdf"), [noise(1), noise(1)])
+        output = os.path.join(self.root, "out.pdf")
+        report = PDFTools().optimize_pdf(source, output, image_quality=None)
+        self.assertGreaterEqual(report["duplicates"], 1)
+        self.assertLess(report["bytes_after"], report["bytes_before"])
+        pages = PdfReader(output).pages
+        self.assertEqual(len(pages), 2)
+        self.assertEqual(page_image(pages[0]).idnum, page_image(pages[1]).idnum)
+        self.assertEqual(pages[0]["/Contents"].get_object().get("/Filter"), "/FlateDecode")
+
+    def test_images_are_recompressed_in_the_pool(self):
+        source = write_image_pdf(os.path.join(self.root, "in.pdf"), [noise(1), noise(2)])
+        output = os.path.join(self.root, "out.pdf")
+        report = PDFTools().optimize_pdf(source, output, image_quality=50, workers=2)
+        self.assertEqual((report["images"], report["images_recompressed"]), (2, 2))
+        self.assertFalse(report["kept_original"])
+        for page in PdfReader(output).pages:
+            self.assertEqual(page_image(page).get_object()["/Filter"], "/DCTDecode")
+
+    def test_never_larger_than_the_input(self):
+        source = write_image_pdf(os.path.join(self.root, "in.pdf"), [noise(1)])
+        output = os.path.join(self.root, "out.pdf")
+        report = PDFTools().optimize_pdf(source, output, image_quality=None)
+        self.assertLessEqual(os.path.getsize(output), os.path.getsize(source))
+        if report["kept_original"]:
+            with open(source, "rb") as a, open(output, "rb") as b:
+                self.assertEqual(a.read(), b.read())
+
+if __name__ == "__main__":
+    unittest.main()
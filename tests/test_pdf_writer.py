@@ -0,0 +1,98 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from PyPDF2 import PdfReader, PdfWriter
+
+from FileNode.pdf_writer import PdfStreamWriter
+from FileNode.tools import PDFTools
+
+def write_pdf(path, widths):
+    # One blank page per width, so a page can be told apart by its size
+    writer = PdfWriter()
+    for width in widths:
+        writer.add_blank_page(width, 200)
+    with open(path, "wb") as f:
+        writer.write(f)
+    return path
+
+def page_widths(path):
+    return [int(page.mediabox.width) for page in PdfReader(path).pages]
+
+class PdfTestCase(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def path(self, name):
+        return os.path.join(self.root, name)
+
+class StreamWriterTest(PdfTestCase):
+    def test_pages_from_several_sources_in_order(self):
+        first = write_pdf(self.path("first.pdf"), [101, 102, 103])
+        second = write_pdf(self.path("second.pdf"), [201, 202])
+        writer = PdfStreamWriter(self.path("out.pdf"))
+        writer.add_pages(PdfReader(first), [2, 0])
+        writer.add_pages(PdfReader(second), [1])
+        writer.close()
+        self.assertEqual(page_widths(self.path("out.pdf")), [103, 101, 202])
+
+    def test_page_tree_is_rebuilt(self):
+        source = write_pdf(self.path("source.pdf"), [101, 102])
+        writer = PdfStreamWriter(self.path("out.pdf"))
+        writer.add_pages(PdfReader(source), [1])
+        writer.close()
+        reader = PdfReader(self.path("out.pdf"))
+        root = reader.trailer["/Root"]
+        self.assertEqual(root["/Pages"]["/Count"], 1)
+        self.assertEqual(reader.pages[0]["/Parent"].get_object()["/Type"], "/Pages")
+
+    def test_abort_removes_the_output(self):
+        source = write_pdf(self.path("source.pdf"), [101])
+        writer = PdfStreamWriter(self.path("out.pdf"))
+        writer.add_pages(PdfReader(source), [0])
+        writer.abort()
+        self.assertFalse(os.path.exists(self.path("out.pdf")))
+
+class StreamingMergeTest(PdfTestCase):
+    def test_merge_with_page_specs(self):
+        first = write_pdf(self.path("first.pdf"), [101, 102, 103])
+        second = write_pdf(self.path("second.pdf"), [201, 202])
+        report = PDFTools().merge_pdfs_streaming([(first, "3,1"), second], self.path("merged.pdf"))
+        self.assertEqual(page_widths(self.path("merged.pdf")), [103, 101, 201, 202])
+        self.assertEqual([item["pages"] for item in report], [2, 2])
+        self.assertTrue(all(item["bytes_written"] > 0 for item in report))
+
+    def test_failed_merge_leaves_no_output(self):
+        first = write_pdf(self.path("first.pdf"), [101])
+        with self.assertRaises(ValueError):
+            PDFTools().merge_pdfs_streaming([first, (first, "5")], self.path("merged.pdf"))
+        self.assertFalse(os.path.exists(self.path("merged.pdf")))
+
+class SplitTest(PdfTestCase):
+    def test_split_range(self):
+        source = write_pdf(self.path("source.pdf"), [101, 102, 103, 104])
+        PDFTools().split_pdf(source, 2, 3, self.path("out.pdf"))
+        self.assertEqual(page_widths(self.path("out.pdf")), [102, 103])
+
+    def test_split_range_past_the_end(self):
+        source = write_pdf(self.path("source.pdf"), [101, 102])
+        with self.assertRaisesRegex(ValueError, "outside 1-2"):
+            PDFTools().split_pdf(source, 2, 5, self.path("out.pdf"))
+
+    def test_one_file_per_range(self):
+        source = write_pdf(self.path("source.pdf"), [101, 102, 103, 104, 105])
+        outputs = PDFTools().split_pdf_multi(source, ["1-2", "4,5"], output_dir=self.path("parts"), workers=2)
+        self.assertEqual([os.path.basename(p) for p in outputs], ["source_1-2.pdf", "source_4_5.pdf"])
+        self.assertEqual([page_widths(p) for p in outputs], [[101, 102], [104, 105]])
+
+    def test_burst(self):
+        source = write_pdf(self.path("source.pdf"), [101, 102, 103, 104, 105])
+        outputs = PDFTools().split_pdf_multi(source, pages_per_file=2, output_dir=self.path("parts"))
+        self.assertEqual([page_widths(p) for p in outputs], [[101, 102], [103, 104], [105]])
+
+if __name__ == "__main__":
+    unittest.main()
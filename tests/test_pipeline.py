@@ -0,0 +1,126 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from docx import Document
+from PyPDF2 import PdfReader
+
+from FileNode.jobs import CancelToken, JobCancelled
+from FileNode.documents import pdf_documents
+from FileNode.pipeline import Pipeline, PipelineTools
+
+class PipelineTestCase(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        pdf_documents.clear()
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def write_text(self, name, lines):
+        path = os.path.join(self.root, name)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("".join(f"{name} line {n}\n" for n in range(lines)))
+        return path
+
+class RecipeTest(PipelineTestCase):
+    def build(self):
+        pipeline = Pipeline()
+        pipeline.add_input("notes")
+        pipeline.add_step("pdf", "text-to-pdf", "notes")
+        pipeline.add_step("intro", "pages", "pdf", "--pages 1-2", output="intro.pdf")
+        return pipeline
+
+    def test_recipe_round_trip(self):
+        recipe = self.build().to_recipe()
+        self.assertEqual(Pipeline.from_recipe(recipe).to_recipe(), recipe)
+
+    def test_steps_read_earlier_values_only(self):
+        pipeline = self.build()
+        with self.assertRaises(ValueError):
+            pipeline.add_step("late", "optimize", "later")
+        with self.assertRaises(ValueError):
+            pipeline.add_step("pdf", "optimize", "intro")
+        with self.assertRaises(ValueError):
+            pipeline.add_step("both", "optimize", ["pdf", "intro"])
+        with self.assertRaises(ValueError):
+            pipeline.add_step("bad", "pages", "pdf", "--pages 1-2;4")
+
+    def test_kinds_are_checked(self):
+        pipeline = self.build()
+        pipeline.add_step("word", "pdf-to-word", "intro")
+        pipeline.add_step("again", "optimize", "word", output="again.pdf")
+        with self.assertRaises(ValueError):
+            pipeline.check({"notes": "text"})
+
+    def test_unused_steps_are_refused(self):
+        pipeline = self.build()
+        pipeline.add_step("spare", "optimize", "pdf")
+        with self.assertRaises(ValueError):
+            pipeline.check({"notes": "text"})
+
+    def test_remove_step_keeps_readers_whole(self):
+        pipeline = self.build()
+        with self.assertRaises(ValueError):
+            pipeline.remove_step("pdf")
+        pipeline.remove_step("intro")
+        self.assertEqual(list(pipeline.steps), ["pdf"])
+
+    def test_bind_by_name_or_order(self):
+        pipeline = Pipeline()
+        pipeline.add_input("a")
+        pipeline.add_input("b")
+        self.assertEqual(pipeline.bind(["b=y.txt", "x.txt"]), {"b": "y.txt", "a": "x.txt"})
+        with self.assertRaises(ValueError):
+            pipeline.bind(["x.txt"])
+
+class RunTest(PipelineTestCase):
+    def test_branches_run_to_their_outputs(self):
+        pipeline = Pipeline()
+        pipeline.add_input("a")
+        pipeline.add_input("b")
+        pipeline.add_step("pdf_a", "text-to-pdf", "a")
+        pipeline.add_step("pdf_b", "text-to-pdf", "b")
+        pipeline.add_step("first", "pages", "pdf_a", "--pages 1")
+        pipeline.add_step("both", "merge", ["first", "pdf_b"], output="both")
+        pipeline.add_step("small", "optimize", "both", "--keep-images", output="small.pdf")
+        pipeline.add_step("word", "pdf-to-word", "both", output="both.docx")
+        files = {"a": self.write_text("a.txt", 120), "b": self.write_text("b.txt", 10)}
+        output_dir = os.path.join(self.root, "out")
+        result = PipelineTools().run_pipeline(pipeline, files, output_dir, workers=2)
+        self.assertEqual([os.path.basename(path) for path in result["outputs"]], ["both.pdf", "small.pdf", "both.docx"])
+        pages = PdfReader(os.path.join(output_dir, "both.pdf")).pages
+        self.assertEqual(len(pages), 2)
+        self.assertIn("a.txt line 0", pages[0].extract_text())
+        self.assertIn("b.txt line 9", pages[1].extract_text())
+        self.assertEqual(len(PdfReader(os.path.join(output_dir, "small.pdf")).pages), 2)
+        text = [p.text for p in Document(os.path.join(output_dir, "both.docx")).paragraphs if p.text]
+        self.assertIn("b.txt line 9", text[-1])
+
+    def test_cancelled_run_leaves_no_outputs(self):
+        pipeline = Pipeline()
+        pipeline.add_input("a")
+        pipeline.add_step("pdf", "text-to-pdf", "a", output="a.pdf")
+        token = CancelToken()
+        token.cancel()
+        output_dir = os.path.join(self.root, "out")
+        with self.assertRaises(JobCancelled):
+            PipelineTools(None, token).run_pipeline(pipeline, {"a": self.write_text("a.txt", 10)}, output_dir)
+        self.assertEqual(os.listdir(output_dir), [])
+
+    def test_input_documents_are_released(self):
+        path = os.path.join(self.root, "in.pdf")
+        pipeline = Pipeline()
+        pipeline.add_input("a")
+        pipeline.add_step("pdf", "text-to-pdf", "a", output=path)
+        PipelineTools().run_pipeline(pipeline, {"a": self.write_text("a.txt", 10)}, self.root)
+        pipeline = Pipeline()
+        pipeline.add_input("doc")
+        pipeline.add_step("copy", "pages", "doc", "--pages 1", output="copy.pdf")
+        PipelineTools().run_pipeline(pipeline, {"doc": path}, self.root)
+        doc = pdf_documents.items[next(iter(pdf_documents.items))]
+        self.assertEqual(doc.users, 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,232 @@
+import io
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from FileNode.workers import worker_context
+from FileNode.batch import run_batch_job
+from FileNode.service import FileService, ServiceBusy, tool_option_schema, tool_options
+
+class ImmediatePool:
+    # Runs each call as it is submitted, so every future is done before
+    # add_done_callback is reached
+    def submit(self, fn, *args):
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+class HeldPool:
+    # Futures stay pending until the test finishes them
+    def __init__(self):
+        self.futures = []
+
+    def submit(self, fn, *args):
+        future = Future()
+        future.set_running_or_notify_cancel()
+        self.futures.append((future, args))
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+class ImmediateService(FileService):
+    def _new_pool(self):
+        return ImmediatePool()
+
+class HeldService(FileService):
+    def _new_pool(self):
+        return HeldPool()
+
+class ToolOptionsTest(unittest.TestCase):
+    def test_values_are_converted_like_the_flags(self):
+        options = tool_options("split", {"burst": "4", "keep-images": "true", "no_cache": True})
+        self.assertEqual(options["pages_per_file"], 4)
+        self.assertTrue(options["keep_images"])
+        self.assertFalse(options["cache"])
+        self.assertEqual(options["page_workers"], 1)
+
+    def test_schema_lists_every_flag(self):
+        schema = tool_option_schema()
+        self.assertEqual(schema["burst"]["type"], "integer")
+        self.assertEqual(schema["keep_images"]["type"], "boolean")
+        self.assertEqual(schema["effort"]["choices"], list(range(7)))
+        self.assertEqual(schema["page_workers"]["default"], 1)
+
+    def test_bad_values(self):
+        with self.assertRaises(ValueError):
+            tool_options("split", {"burst": "many"})
+        with self.assertRaises(ValueError):
+            tool_options("convert-image", {"effort": 9})
+        with self.assertRaises(ValueError):
+            tool_options("split", {"pages": "1-5", "shred": True})
+        with self.assertRaises(ValueError):
+            tool_options("split", {})
+
+class ServiceTestCase(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.services = []
+
+    def tearDown(self):
+        for service in self.services:
+            service.close()
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def service(self, cls=FileService, **kwargs):
+        kwargs.setdefault("workers", 1)
+        service = cls(root=self.root, **kwargs)
+        self.services.append(service)
+        return service
+
+    def upload_text(self, service, name="notes.txt"):
+        return service.add_upload(name, io.BytesIO(b"line one\nline two\n" * 50))
+
+    def wait_for(self, service, job, states=("done", "failed"), timeout=60):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            status = service.status(job.id)
+            if status["state"] in states:
+                return status
+            time.sleep(0.05)
+        self.fail(f"job stayed {status['state']}")
+
+class SubmitTest(ServiceTestCase):
+    def test_job_runs_to_done(self):
+        service = self.service()
+        upload = self.upload_text(service)
+        job = service.submit("text-to-pdf", [upload["id"]], {})
+        status = self.wait_for(service, job)
+        self.assertEqual(status["state"], "done", status.get("error"))
+        self.assertEqual([f["name"] for f in status["files"]], ["notes.pdf"])
+        with open(job.output_path, "rb") as f:
+            self.assertEqual(f.read(5), b"%PDF-")
+
+    def test_failing_job(self):
+        service = self.service()
+        upload = service.add_upload("broken.pdf", io.BytesIO(b"not a pdf"))
+        job = service.submit("pdf-to-word", [upload["id"]], {})
+        status = self.wait_for(service, job)
+        self.assertEqual(status["state"], "failed")
+        self.assertTrue(status["error"])
+        self.assertNotIn("files", status)
+
+    def test_job_done_before_callback_is_attached(self):
+        # The callback of an already finished job runs inside submit; it must
+        # not wait for the lock submit holds
+        service = self.service(ImmediateService)
+        upload = service.add_upload("broken.pdf", io.BytesIO(b"not a pdf"))
+        jobs = []
+        thread = threading.Thread(
+            target=lambda: jobs.extend(service.submit("pdf-to-word", [upload["id"]], {}) for _ in range(3)),
+            daemon=True,
+        )
+        thread.start()
+        thread.join(10)
+        if thread.is_alive():
+            # close() would wait on the same lock
+            self.services.remove(service)
+            self.fail("submit deadlocked")
+        self.assertEqual([service.status(job.id)["state"] for job in jobs], ["failed"] * 3)
+
+    def test_bad_requests(self):
+        service = self.service(HeldService)
+        upload = self.upload_text(service)
+        with self.assertRaises(ValueError):
+            service.submit("shred", [upload["id"]], {})
+        with self.assertRaises(ValueError):
+            service.submit("text-to-pdf", [], {})
+        with self.assertRaises(ValueError):
+            service.submit("text-to-pdf", [upload["id"]], {"no_such_option": 1})
+        with self.assertRaises(LookupError):
+            service.submit("text-to-pdf", ["missing"], {})
+
+    def test_queue_full(self):
+        service = self.service(HeldService, max_queue=1)
+        upload = self.upload_text(service)
+        running = service.submit("text-to-pdf", [upload["id"]], {})
+        queued = service.submit("text-to-pdf", [upload["id"]], {})
+        self.assertEqual(service.status(running.id)["state"], "running")
+        self.assertEqual(service.status(queued.id)["queue_position"], 1)
+        with self.assertRaises(ServiceBusy):
+            service.submit("text-to-pdf", [upload["id"]], {})
+
+class CancelTest(ServiceTestCase):
+    def test_cancel_queued(self):
+        service = self.service(HeldService)
+        upload = self.upload_text(service)
+        service.submit("text-to-pdf", [upload["id"]], {})
+        queued = service.submit("text-to-pdf", [upload["id"]], {})
+        self.assertEqual(service.cancel(queued.id).state, "cancelled")
+        self.assertIsNone(service.status(queued.id))
+        self.assertFalse(os.path.exists(queued.workspace.path))
+        self.assertEqual(len(service.pool.futures), 1)
+
+    def test_cancel_running_drops_output(self):
+        service = self.service(HeldService)
+        upload = self.upload_text(service)
+        running = service.submit("text-to-pdf", [upload["id"]], {})
+        queued = service.submit("text-to-pdf", [upload["id"]], {})
+        self.assertEqual(service.cancel(running.id).state, "cancelled")
+        with open(running.output_path, "wb") as f:
+            f.write(b"%PDF-")
+        future, args = service.pool.futures[0]
+        # The worker sees the cancel through the job's event
+        self.assertTrue(args[-1].is_set())
+        future.set_result({"ok": True, "error": None, "seconds": 0.0})
+        self.assertFalse(os.path.exists(running.output_path))
+        self.assertEqual(service.status(running.id)["state"], "cancelled")
+        # The freed worker takes the next job
+        self.assertEqual(service.status(queued.id)["state"], "running")
+
+    def test_cancel_event_stops_a_worker(self):
+        path = os.path.join(self.root, "notes.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("line\n" * 500)
+        context = worker_context()
+        with context.Manager() as sync, ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            event = sync.Event()
+            event.set()
+            output_path = os.path.join(self.root, "notes.pdf")
+            result = pool.submit(run_batch_job, "text-to-pdf", [path], output_path, {"cache": False}, None, None, event).result()
+        self.assertFalse(result["ok"])
+        self.assertIn("JobCancelled", result["error"])
+        self.assertFalse(os.path.exists(output_path))
+
+    def test_cancel_unknown(self):
+        service = self.service(HeldService)
+        self.assertIsNone(service.cancel("missing"))
+
+class ExpireTest(ServiceTestCase):
+    def test_finished_jobs_and_uploads_expire(self):
+        service = self.service(HeldService, ttl=60)
+        upload = self.upload_text(service)
+        job = service.submit("text-to-pdf", [upload["id"]], {})
+        service.expire()
+        # Running jobs and the uploads they use are kept whatever their age
+        upload["used"] -= 120
+        service.expire()
+        self.assertIsNotNone(service.status(job.id))
+        future, _ = service.pool.futures[0]
+        future.set_result({"ok": True, "error": None, "seconds": 0.0})
+        service.expire()
+        self.assertEqual(service.status(job.id)["state"], "done")
+        job.finished -= 120
+        upload["used"] -= 120
+        service.expire()
+        self.assertIsNone(service.status(job.id))
+        self.assertFalse(os.path.exists(job.workspace.path))
+        self.assertFalse(os.path.exists(upload["path"]))
+        self.assertEqual(service.stats()["uploads"], 0)
+
+if __name__ == "__main__":
+    unittest.main()
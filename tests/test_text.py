@@ -0,0 +1,95 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from PyPDF2 import PdfReader
+
+from FileNode.pdf_writer import TextPdfWriter, text_pages, wrap_text_rows
+from FileNode.tools import TextTools
+
+class WrapTextRowsTest(unittest.TestCase):
+    def test_long_lines_wrap_without_an_empty_row(self):
+        self.assertEqual(list(wrap_text_rows(["abcdef\n", "abcdefg\n"], 3)), ["abc", "def", "abc", "def", "g"])
+
+    def test_blank_lines_are_kept(self):
+        self.assertEqual(list(wrap_text_rows(["a\n", "\n", "b\r\n"], 10)), ["a", "", "b"])
+
+    def test_pieces_of_one_line_are_joined(self):
+        # readline(limit) hands a long line over in pieces without a newline
+        self.assertEqual(list(wrap_text_rows(["ab", "cdefg\n", "end"], 3)), ["abc", "def", "g", "end"])
+
+    def test_tabs_expand_and_control_characters_go(self):
+        self.assertEqual(list(wrap_text_rows(["a\tb\x07c\n"], 20, tab_size=4)), ["a   bc"])
+
+class TextPagesTest(unittest.TestCase):
+    def test_rows_are_cut_into_pages(self):
+        pages = list(text_pages(io.StringIO("".join(f"{n}\n" for n in range(5))), 10, 2))
+        self.assertEqual(pages, [["0", "1"], ["2", "3"], ["4"]])
+
+    def test_exactly_full_pages_add_no_blank_one(self):
+        self.assertEqual(list(text_pages(io.StringIO("a\nb\n"), 10, 2)), [["a", "b"]])
+
+    def test_empty_text_is_one_blank_page(self):
+        self.assertEqual(list(text_pages(io.StringIO(""), 10, 2)), [[]])
+
+    def test_long_lines_are_read_in_pieces(self):
+        pages = list(text_pages(io.StringIO("x" * 25 + "\n"), 10, 5, read_size=4))
+        self.assertEqual(pages, [["x" * 10, "x" * 10, "x" * 5]])
+
+class TextPdfTestCase(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def write_text(self, lines):
+        path = os.path.join(self.root, "in.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("".join(line + "\n" for line in lines))
+        return path
+
+class TextPdfWriterTest(TextPdfTestCase):
+    def test_pages_hold_the_escaped_text(self):
+        path = os.path.join(self.root, "out.pdf")
+        writer = TextPdfWriter(path)
+        writer.add_page(["f(x) = \\y", "second row"])
+        writer.add_page(["café"])
+        writer.close()
+        pages = PdfReader(path).pages
+        self.assertEqual(len(pages), 2)
+        self.assertIn("f(x) = \\y", pages[0].extract_text())
+        self.assertIn("second row", pages[0].extract_text())
+        self.assertIn("café", pages[1].extract_text())
+
+class TextToPdfTest(TextPdfTestCase):
+    def test_rows_fill_pages(self):
+        input_path = self.write_text([f"line {n}" for n in range(200)])
+        output = os.path.join(self.root, "out.pdf")
+        result = TextTools().convert_text_to_pdf(input_path, output)
+        probe = TextPdfWriter(os.path.join(self.root, "probe.pdf"))
+        rows = probe.rows
+        probe.abort()
+        self.assertEqual(result["outputs"], [output])
+        self.assertEqual(result["pages"], -(-200 // rows))
+        self.assertEqual(len(PdfReader(output).pages), result["pages"])
+
+    def test_max_pages_splits_into_numbered_files(self):
+        input_path = self.write_text([f"line {n}" for n in range(500)])
+        output_dir = os.path.join(self.root, "out")
+        result = TextTools().convert_text_to_pdf(input_path, output_dir, max_pages=2)
+        names = [os.path.basename(path) for path in result["outputs"]]
+        self.assertEqual(names, [f"in-{n:03d}.pdf" for n in range(1, len(names) + 1)])
+        self.assertEqual(sorted(os.listdir(output_dir)), names)
+        counts = [len(PdfReader(path).pages) for path in result["outputs"]]
+        self.assertTrue(all(count <= 2 for count in counts))
+        self.assertEqual(sum(counts), result["pages"])
+
+    def test_empty_file_gives_one_blank_page(self):
+        result = TextTools().convert_text_to_pdf(self.write_text([]), os.path.join(self.root, "out.pdf"))
+        self.assertEqual(result["pages"], 1)
+
+if __name__ == "__main__":
+    unittest.main()
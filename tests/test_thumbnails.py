@@ -0,0 +1,64 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from PIL import Image
+
+from FileNode.cache import ThumbnailStore
+from FileNode.FileNode import consecutive_runs
+
+def noise(size=(50, 50)):
+    # Does not compress, so every entry is about the same size on disk
+    return Image.frombytes("RGB", size, os.urandom(size[0] * size[1] * 3))
+
+class ThumbnailStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_round_trip(self):
+        store = ThumbnailStore(self.root)
+        img = noise()
+        store.put("ab" * 32, 3, (50, None), img)
+        self.assertEqual(store.get("ab" * 32, 3, (50, None)).tobytes(), img.tobytes())
+        self.assertIsNone(store.get("ab" * 32, 4, (50, None)))
+        self.assertIsNone(store.get("ab" * 32, 3, (80, None)))
+
+    def test_damaged_entry_is_dropped(self):
+        store = ThumbnailStore(self.root)
+        store.put("ab" * 32, 0, (50, None), noise())
+        path = store.path_for("ab" * 32, 0, (50, None))
+        with open(path, "wb") as f:
+            f.write(b"not a png")
+        self.assertIsNone(store.get("ab" * 32, 0, (50, None)))
+        self.assertFalse(os.path.exists(path))
+
+    def test_evicts_least_recently_used(self):
+        entry_size = len(noise().tobytes())
+        store = ThumbnailStore(self.root, max_bytes=int(entry_size * 2.5))
+        store.put("aa" * 32, 0, (50, None), noise())
+        store.put("bb" * 32, 0, (50, None), noise())
+        now = time.time()
+        os.utime(store.path_for("aa" * 32, 0, (50, None)), (now - 100, now - 100))
+        os.utime(store.path_for("bb" * 32, 0, (50, None)), (now - 50, now - 50))
+        # A hit makes the older entry the most recently used
+        self.assertIsNotNone(store.get("aa" * 32, 0, (50, None)))
+        store.put("cc" * 32, 0, (50, None), noise())
+        self.assertIsNone(store.get("bb" * 32, 0, (50, None)))
+        self.assertIsNotNone(store.get("aa" * 32, 0, (50, None)))
+        self.assertIsNotNone(store.get("cc" * 32, 0, (50, None)))
+        self.assertLessEqual(store.size, store.max_bytes)
+
+class RenderRunsTest(unittest.TestCase):
+    def test_store_hits_split_the_run(self):
+        self.assertEqual(consecutive_runs([1, 2, 3, 7, 8, 10]), [[1, 2, 3], [7, 8], [10]])
+
+    def test_nothing_to_render(self):
+        self.assertEqual(consecutive_runs([]), [])
+
+if __name__ == "__main__":
+    unittest.main()
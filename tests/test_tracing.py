@@ -0,0 +1,49 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from FileNode.tracing import start_trace, stop_trace, tracer
+from FileNode.batch import BatchRunner, build_batch_jobs
+
+class TracingTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        stop_trace()
+        tracer.clear()
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def write_text(self, name):
+        path = os.path.join(self.root, name)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("".join(f"line {n}\n" for n in range(100)))
+        return path
+
+    def test_off_records_nothing(self):
+        with tracer.span("parse") as args:
+            args["pages"] = 1
+        self.assertEqual(tracer.snapshot(), [])
+
+    def test_batch_workers_send_their_spans_back(self):
+        inputs = [self.write_text("a.txt"), self.write_text("b.txt")]
+        output_dir = os.path.join(self.root, "out")
+        os.makedirs(output_dir)
+        start_trace()
+        results = BatchRunner(2).run(build_batch_jobs("text-to-pdf", inputs, output_dir, {"cache": False}))
+        path = stop_trace(os.path.join(self.root, "trace.json"))
+        self.assertTrue(all(r["ok"] for r in results))
+        with open(path, encoding="utf-8") as f:
+            events = json.load(f)["traceEvents"]
+        spans = [e for e in events if e["ph"] == "X"]
+        tool_spans = [e for e in spans if e["name"] == "TextTools.convert_text_to_pdf"]
+        self.assertEqual(len(tool_spans), 2)
+        self.assertTrue(all(e["pid"] != os.getpid() for e in tool_spans))
+        # Every worker thread that recorded a span is named in the metadata
+        named = {(e["pid"], e["tid"]) for e in events if e["ph"] == "M"}
+        self.assertTrue({(e["pid"], e["tid"]) for e in spans} <= named)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from FileNode.watch import HotFolderService, WatchJournal, WatchedFolder
+
+class WatchTestCase(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.journal_path = os.path.join(self.root, "state", "journal.jsonl")
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def write_text(self, path, text="line\n"):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        return path
+
+    def key(self, path):
+        return WatchJournal.key_for(path, os.stat(path))
+
+class JournalTest(WatchTestCase):
+    def test_states_survive_a_reopen(self):
+        path = self.write_text(os.path.join(self.root, "in", "a.txt"))
+        journal = WatchJournal(self.journal_path)
+        journal.record(self.key(path), path, "queued", output="out/a.pdf")
+        journal.record(self.key(path), path, "done")
+        journal.close()
+        journal = WatchJournal(self.journal_path)
+        self.assertEqual(journal.state(self.key(path)), "done")
+        journal.close()
+
+    def test_queued_files_keep_their_output(self):
+        path = self.write_text(os.path.join(self.root, "in", "a.txt"))
+        journal = WatchJournal(self.journal_path)
+        journal.record(self.key(path), path, "queued", output="out/a.pdf")
+        journal.close()
+        journal = WatchJournal(self.journal_path)
+        self.assertEqual(journal.output_for(self.key(path)), "out/a.pdf")
+        journal.close()
+
+    def test_open_drops_missing_files_and_torn_lines(self):
+        kept = self.write_text(os.path.join(self.root, "in", "a.txt"))
+        gone = self.write_text(os.path.join(self.root, "in", "b.txt"))
+        journal = WatchJournal(self.journal_path)
+        journal.record(self.key(kept), kept, "done")
+        journal.record(self.key(gone), gone, "done")
+        journal.file.write('{"key": "cut sh')
+        journal.close()
+        os.remove(gone)
+        journal = WatchJournal(self.journal_path)
+        self.assertEqual(list(journal.entries), [self.key(kept)])
+        journal.close()
+        with open(self.journal_path, encoding="utf-8") as f:
+            self.assertEqual(len(f.readlines()), 1)
+
+    def test_one_watcher_per_journal(self):
+        journal = WatchJournal(self.journal_path)
+        try:
+            with self.assertRaises(RuntimeError):
+                WatchJournal(self.journal_path)
+        finally:
+            journal.close()
+
+class FolderTest(WatchTestCase):
+    def test_accepts_only_the_operation_inputs(self):
+        folder = WatchedFolder(os.path.join(self.root, "in"), "text-to-pdf", os.path.join(self.root, "out"), {})
+        self.assertTrue(folder.accepts("notes.txt"))
+        self.assertFalse(folder.accepts("notes.pdf"))
+        self.assertFalse(folder.accepts("notes.txt.part"))
+        self.assertFalse(folder.accepts(".hidden.txt"))
+        images = WatchedFolder(os.path.join(self.root, "in"), "convert-image", os.path.join(self.root, "out"), {})
+        self.assertTrue(images.accepts("photo.JPG"))
+
+    def test_output_folder_must_differ(self):
+        with self.assertRaises(ValueError):
+            WatchedFolder(os.path.join(self.root, "in"), "text-to-pdf", os.path.join(self.root, "in"), {})
+
+class ServiceTest(WatchTestCase):
+    def run_once(self):
+        folder = WatchedFolder(os.path.join(self.root, "in"), "text-to-pdf", os.path.join(self.root, "out"), {"cache": False})
+        journal = WatchJournal(self.journal_path)
+        results = []
+        try:
+            HotFolderService(
+                [folder], journal, workers=1, settle=0, poll_interval=0.05, use_inotify=False,
+                on_result=results.append,
+            ).run(once=True)
+        finally:
+            journal.close()
+        return results
+
+    def test_files_run_once_across_restarts(self):
+        self.write_text(os.path.join(self.root, "in", "a.txt"))
+        self.write_text(os.path.join(self.root, "in", "b.txt"))
+        results = self.run_once()
+        self.assertEqual(sorted(os.path.basename(r["output"]) for r in results if r["ok"]), ["a.pdf", "b.pdf"])
+        self.assertEqual(sorted(os.listdir(os.path.join(self.root, "out"))), ["a.pdf", "b.pdf"])
+        self.write_text(os.path.join(self.root, "in", "c.txt"))
+        results = self.run_once()
+        self.assertEqual([os.path.basename(r["output"]) for r in results], ["c.pdf"])
+
+if __name__ == "__main__":
+    unittest.main()
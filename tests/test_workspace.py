@@ -0,0 +1,48 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from FileNode.workspace import Workspace, publish_output, sweep_workspaces
+
+class WorkspaceTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_sweep_keeps_held_workspaces(self):
+        held = Workspace(self.root)
+        left = Workspace(self.root)
+        # A crashed process releases its lock but leaves the directory behind
+        left.lock.close()
+        left.lock = None
+        sweep_workspaces(self.root, min_age=0)
+        self.assertTrue(os.path.isdir(held.path))
+        self.assertFalse(os.path.exists(left.path))
+        held.cleanup()
+        self.assertFalse(os.path.exists(held.path))
+
+    def test_sweep_skips_young_workspaces(self):
+        workspace = Workspace(self.root)
+        workspace.lock.close()
+        workspace.lock = None
+        sweep_workspaces(self.root, min_age=60)
+        self.assertTrue(os.path.isdir(workspace.path))
+
+    def test_publish_merges_folders(self):
+        with Workspace(self.root) as workspace:
+            src = workspace.path_for("pages")
+            os.makedirs(src)
+            for name in ("a.pdf", "b.pdf"):
+                open(os.path.join(src, name), "w").close()
+            dst = os.path.join(self.root, "pages")
+            os.makedirs(dst)
+            open(os.path.join(dst, "old.pdf"), "w").close()
+            publish_output(src, dst)
+            self.assertEqual(sorted(os.listdir(dst)), ["a.pdf", "b.pdf", "old.pdf"])
+            self.assertFalse(os.path.exists(src))
+
+if __name__ == "__main__":
+    unittest.main()